@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時の import 時間のベンチマーク
+
+モジュールごとに新しい Python プロセスで `python -X importtime -c "import <module>"` を
+繰り返し実行し、import にかかった時間（中央値）と、import 後に読み込まれていた
+重いモジュール、時間のかかった依存モジュールを表示する。
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --json import.json
+    python benchmarks/bench_import.py --baseline import.json --tolerance 0.2
+
+--baseline を指定すると、基準より tolerance 以上遅くなったモジュールを表示して
+終了コード1で終了する（bench_market.py と同じ形式）。
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = "stock_web_app,stock_asgi_app,stock_code_scrayping,stock_data_fetcher"
+
+# 起動時に読み込まれていないことを確認する重いモジュール
+HEAVY_MODULES = ("pandas", "numpy", "yfinance", "bs4")
+
+# -X importtime の1行: "import time: self [us] | cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+_PROBE = (
+    "import sys; import {module}; "
+    "print(','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+
+def measure_import(module, repeat):
+    """
+    module を repeat 回、新しいプロセスで import し、所要時間と読み込まれた重いモジュールを返す
+    """
+    totals = []
+    slowest = {}
+    loaded = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{module} の import に失敗しました:\n{proc.stderr[-2000:]}")
+        total = None
+        for match in _IMPORTTIME_LINE.finditer(proc.stderr):
+            cumulative, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+            if name == module and depth == 1:
+                total = cumulative
+            elif depth == 3:
+                # module から直接読み込まれた（1段下の）モジュールの累積時間
+                slowest[name] = max(slowest.get(name, 0), cumulative)
+        totals.append((total or 0) / 1000)
+        loaded = [m for m in proc.stdout.strip().split(",") if m]
+
+    top = sorted(slowest.items(), key=lambda item: -item[1])[:5]
+    return {
+        "module": module,
+        "import_ms": statistics.median(totals),
+        "min_ms": min(totals),
+        "heavy_loaded": loaded,
+        "slowest": [{"module": name, "ms": us / 1000} for name, us in top],
+    }
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """基準より遅くなったモジュールの説明のリストを返す"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["module"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["module"])
+        if base and base["import_ms"] > 0 and r["import_ms"] > base["import_ms"] * (1 + tolerance):
+            regressions.append(f"{r['module']}: import_ms {base['import_ms']:.1f} -> {r['import_ms']:.1f}")
+        newly_loaded = set(r["heavy_loaded"]) - set(base["heavy_loaded"]) if base else set()
+        if newly_loaded:
+            regressions.append(f"{r['module']}: 起動時に読み込まれるようになった: {', '.join(sorted(newly_loaded))}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時の import 時間を計測します")
+    parser.add_argument("--modules", default=DEFAULT_MODULES, help="計測するモジュール（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=5, help="モジュールごとの計測回数")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", help="比較する基準のJSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回帰とみなす悪化の割合")
+    args = parser.parse_args()
+
+    modules = [m.strip() for m in args.modules.split(",") if m.strip()]
+    results = [measure_import(module, max(1, args.repeat)) for module in modules]
+
+    print(f"{'モジュール':<22}{'中央値 ms':>10}{'最小 ms':>10}  起動時に読み込まれた重いモジュール")
+    for r in results:
+        print(f"{r['module']:<24}{r['import_ms']:>10.1f}{r['min_ms']:>10.1f}  {', '.join(r['heavy_loaded']) or '-'}")
+        slowest = ", ".join(f"{s['module']} {s['ms']:.0f}ms" for s in r["slowest"])
+        print(f"{'':<24}時間のかかった依存: {slowest}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "python": sys.version, "results": results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print("回帰を検出しました:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("基準からの回帰はありません")
+
+
+if __name__ == "__main__":
+    main()
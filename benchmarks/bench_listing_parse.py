@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+銘柄一覧ページの解析ベンチマーク
+
+保存済みのページ（例: curl -o listing.html https://nikkeiyosoku.com/stock/all/）を
+指定すると、そのページでBeautifulSoup版とlxml版の解析時間を比較する。
+ページを指定しない場合は同じ構造の合成ページを生成して使う。
+
+    python benchmarks/bench_listing_parse.py listing.html --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stock_code_scrayping import parse_stock_listing  # noqa: E402
+
+MARKETS = ["東証プライム", "東証スタンダード", "東証グロース", "東証REIT"]
+SECTORS = ["水産・農林業", "建設業", "食料品", "電気機器", "情報・通信業", "不動産業"]
+
+
+def build_listing_html(rows):
+    """nikkeiyosoku.comの一覧ページと同じ列構成の合成HTMLを生成する"""
+    lines = ["<html><head><title>東証 全銘柄一覧</title></head><body><table>",
+             "<tr><th>コード</th><th>銘柄名</th><th>業種</th><th>市場</th></tr>"]
+    for i in range(rows):
+        code = str(1301 + i) if i % 50 else f"{130 + i % 9}A"
+        lines.append(
+            f'<tr><td><a href="/stock/{code}/">{code}</a></td>'
+            f'<td><a href="/stock/{code}/">銘柄{i}</a></td>'
+            f"<td>{SECTORS[i % len(SECTORS)]}</td><td>{MARKETS[i % len(MARKETS)]}</td></tr>"
+        )
+    lines.append("</table></body></html>")
+    return "\n".join(lines)
+
+
+def measure(html, backend, repeat):
+    """最良の経過時間（秒）、ピークメモリ（バイト）、抽出行数を返す"""
+    best = float("inf")
+    rows = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = parse_stock_listing(html, backend=backend)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse_stock_listing(html, backend=backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="銘柄一覧ページ解析のベンチマーク")
+    parser.add_argument("html_path", nargs="?", help="保存済みの一覧ページ（省略時は合成ページ）")
+    parser.add_argument("--rows", type=int, default=4000, help="合成ページの行数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    args = parser.parse_args()
+
+    if args.html_path:
+        with open(args.html_path, encoding="utf-8") as f:
+            html = f.read()
+        source = args.html_path
+    else:
+        html = build_listing_html(args.rows)
+        source = f"合成ページ（{args.rows} 行）"
+
+    print(f"入力: {source} / {len(html) / 1024:.0f} KiB")
+    results = {}
+    for backend in ("bs4", "lxml"):
+        try:
+            results[backend] = measure(html, backend, args.repeat)
+        except ImportError:
+            print(f"{backend}: 未インストールのためスキップ")
+            continue
+        elapsed, peak, rows = results[backend]
+        print(f"{backend:>5}: {elapsed * 1000:8.1f} ms  ピークメモリ {peak / 1024 / 1024:6.1f} MiB  {len(rows)} 行")
+
+    if len(results) == 2:
+        if results["bs4"][2] != results["lxml"][2]:
+            print("警告: バックエンド間で抽出結果が一致しません")
+        print(f"速度比: {results['bs4'][0] / results['lxml'][0]:.1f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スクレイピング・価格抽出・一括取得のオフラインベンチマーク
+
+fake_market.FakeMarket を使い、ネットワークに出ずに本番と同じ関数を計測する。
+ワークロードごとにスループット、p50 / p99 レイテンシ、ピークメモリを表示する。
+
+    python benchmarks/bench_market.py --latency 0.02 --failure-rate 0.01
+    python benchmarks/bench_market.py --json result.json
+    python benchmarks/bench_market.py --baseline result.json --tolerance 0.2
+
+--baseline を指定すると、基準より tolerance 以上遅い（またはメモリが多い）
+ワークロードを表示して終了コード1で終了する（デプロイ前の回帰検出用）。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# ローカルストアに残ったデータで計測結果が変わらないよう、取得データは保存しない
+os.environ["STOCK_OHLCV_STORE"] = "off"
+
+import stock_data_fetcher  # noqa: E402
+import stock_fetch_policy  # noqa: E402
+from fake_market import FakeMarket  # noqa: E402
+from stock_code_scrayping import (  # noqa: E402
+    fetch_latest_close, filter_valid_codes, scrape_stock_codes, select_codes_by_price,
+)
+
+LISTING_URL = "https://nikkeiyosoku.com/stock/all/"
+
+
+class Timings:
+    """1操作ごとの所要時間を集める（複数スレッドから呼ばれる）"""
+
+    def __init__(self):
+        self.samples = []
+
+    @contextlib.contextmanager
+    def measure(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # list.append はスレッドセーフ
+            self.samples.append(time.perf_counter() - started)
+
+
+def run_workload(name, func, memory=True):
+    """
+    func(timings) を実行し、スループット・レイテンシ・ピークメモリを返す
+
+    tracemalloc は計測対象を大きく遅くするため、時間の計測とピークメモリの計測は別々に実行する。
+    """
+    timings = Timings()
+    # 取得処理の進捗表示は計測の邪魔になるため捨てる
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        func(timings)
+        elapsed = time.perf_counter() - started
+
+        peak = None
+        if memory:
+            tracemalloc.start()
+            func(Timings())
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    samples = np.array(timings.samples) if timings.samples else np.array([elapsed])
+    return {
+        "workload": name,
+        "ops": len(timings.samples),
+        "seconds": elapsed,
+        "ops_per_sec": len(timings.samples) / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p99_ms": float(np.percentile(samples, 99) * 1000),
+        "peak_mib": peak / 1024 / 1024 if peak is not None else 0.0,
+    }
+
+
+def scrape_workload(repeat):
+    """一覧ページの取得と解析（scrape_stock_codes）"""
+    def run(timings):
+        for _ in range(repeat):
+            with timings.measure():
+                filter_valid_codes(scrape_stock_codes(LISTING_URL))
+    return run
+
+
+def screen_workload(codes, repeat, count, min_price, max_price, workers):
+    """価格帯での抽出（select_codes_by_price、既定のバッチ取得経路）"""
+    def run(timings):
+        for seed in range(repeat):
+            with timings.measure():
+                select_codes_by_price(codes, count, min_price, max_price, workers=workers, seed=seed)
+    return run
+
+
+def latest_close_workload(codes, workers):
+    """1銘柄ずつの直近終値の取得（fetch_latest_close）"""
+    def run(timings):
+        def one(code):
+            with timings.measure():
+                fetch_latest_close(code)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(one, codes))
+    return run
+
+
+def export_workload(tickers, start_date, end_date, workers, fmt, cpu_workers=0):
+    """複数銘柄の取得と保存（bulk_export、1銘柄ごとの所要時間を計測）"""
+    def run(timings):
+        original = stock_data_fetcher._export_one
+
+        def timed_export(*args, **kwargs):
+            with timings.measure():
+                return original(*args, **kwargs)
+
+        stock_data_fetcher._export_one = timed_export
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                stock_data_fetcher.bulk_export(
+                    tickers, start_date, end_date, output_dir=output_dir,
+                    workers=workers, resume=False, fmt=fmt, cpu_workers=cpu_workers,
+                )
+        finally:
+            stock_data_fetcher._export_one = original
+    return run
+
+
+def print_report(results, market):
+    print(f"{'ワークロード':<14}{'件数':>6}{'件/秒':>10}{'p50 ms':>10}{'p99 ms':>10}{'ピークMiB':>11}")
+    for r in results:
+        print(f"{r['workload']:<16}{r['ops']:>6}{r['ops_per_sec']:>11.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['peak_mib']:>11.1f}")
+    print(f"合成市場へのリクエスト数: {market.requests}")
+    method_stats = stock_fetch_policy.get_fetch_policy().stats.format()
+    if method_stats:
+        print("取得方法ごとの結果:")
+        print(method_stats)
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """基準より悪化したワークロードの説明のリストを返す"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["workload"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["workload"])
+        if base is None:
+            continue
+        for key in ("p50_ms", "p99_ms", "peak_mib"):
+            if base[key] > 0 and r[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{r['workload']}: {key} {base[key]:.1f} -> {r[key]:.1f}")
+        if base["ops_per_sec"] > 0 and r["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{r['workload']}: ops_per_sec {base['ops_per_sec']:.1f} -> {r['ops_per_sec']:.1f}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成市場を使ったオフラインベンチマーク")
+    parser.add_argument("--listing", help="保存済みの一覧ページ（省略時は合成ページ）")
+    parser.add_argument("--rows", type=int, default=4000, help="合成一覧ページの行数")
+    parser.add_argument("--latency", type=float, default=0.0, help="1リクエストあたりの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える揺らぎの幅（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="接続エラーを注入する確率")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="HTTP 429 を注入する確率")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="データのない銘柄の割合")
+    parser.add_argument("--backoff", type=float, default=0.0, help="再試行の基準待ち時間（秒、既定は待たない）")
+    parser.add_argument("--workers", type=int, default=4, help="並行数")
+    parser.add_argument("--repeat", type=int, default=5, help="scrape / screen の繰り返し回数")
+    parser.add_argument("--closes", type=int, default=200, help="latest_close で取得する銘柄数")
+    parser.add_argument("--export", type=int, default=50, help="export で取得する銘柄数")
+    parser.add_argument("--format", default="csv", help="export の出力形式")
+    parser.add_argument("--cpu-workers", type=int, default=0, help="export の変換・保存を行うプロセス数")
+    parser.add_argument("--workloads", default="scrape,screen,latest_close,export", help="実行するワークロード")
+    parser.add_argument("--no-memory", action="store_true", help="ピークメモリを計測しない（実行時間が半分になる）")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", help="比較する基準のJSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回帰とみなす悪化の割合")
+    args = parser.parse_args()
+
+    listing_html = None
+    if args.listing:
+        with open(args.listing, encoding="utf-8") as f:
+            listing_html = f.read()
+    market = FakeMarket(
+        listing_html=listing_html, rows=args.rows, latency=args.latency, jitter=args.jitter,
+        failure_rate=args.failure_rate, throttle_rate=args.throttle_rate, missing_rate=args.missing_rate,
+    )
+    # 計測ごとに集計を分けるため、取得ポリシーを作り直す
+    stock_fetch_policy._default_policy = stock_fetch_policy.FetchPolicy(base_delay=args.backoff)
+
+    selected = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    results = []
+    with market.install():
+        codes = filter_valid_codes(scrape_stock_codes(LISTING_URL))
+        numeric_codes = [c for c in codes if c.isdigit()]
+        workloads = {
+            "scrape": lambda: scrape_workload(args.repeat),
+            "screen": lambda: screen_workload(codes, args.repeat, 30, 100, 500, args.workers),
+            "latest_close": lambda: latest_close_workload(codes[:args.closes], args.workers),
+            "export": lambda: export_workload(
+                numeric_codes[:args.export], "2024-01-01", "2024-12-31", args.workers, args.format,
+                args.cpu_workers,
+            ),
+        }
+        for name in selected:
+            if name not in workloads:
+                parser.error(f"未対応のワークロードです: {name}")
+            results.append(run_workload(name, workloads[name](), memory=not args.no_memory))
+
+    print(f"一覧: {len(codes)} 銘柄 / 遅延 {args.latency * 1000:.0f} ms / "
+          f"失敗率 {args.failure_rate:.1%} / 429 {args.throttle_rate:.1%}")
+    print_report(results, market)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print("回帰を検出しました:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("基準からの回帰はありません")
+
+
+if __name__ == "__main__":
+    main()
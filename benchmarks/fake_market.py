@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク用のオフライン市場バックエンド
+
+nikkeiyosoku.com の一覧ページと Yahoo Finance の代わりに、保存済み（または合成）の
+一覧ページと、銘柄ごとに再現性のある合成OHLCVを返す。install() の間は
+requests.get（共有セッション経由を含む）/ yf.Ticker / yf.download が置き換わるため、scrape_stock_codes、
+fetch_latest_close、fetch_stock_data などは本番と同じ経路のまま動作する。
+
+    with FakeMarket(latency=0.05, failure_rate=0.01).install():
+        fetch_stock_data("7203", "2024-01-01", "2024-12-31")
+"""
+
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+
+from bench_listing_parse import build_listing_html
+
+# period 指定時に返す営業日数
+_PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252, "2y": 504, "5y": 1260}
+
+# 合成データの最終日（実行日によって結果が変わらないよう固定する）
+_LAST_DATE = pd.Timestamp("2025-12-30")
+
+
+class FakeResponse:
+    """requests.Response の代わりに使う最小限の応答。"""
+
+    def __init__(self, text: str, status_code: int = 200, headers: Optional[dict] = None):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeMarket:
+    """
+    遅延と失敗を注入できる合成市場
+
+    Parameters:
+    listing_html (str): 一覧ページのHTML（None=合成ページ）
+    rows (int): 合成ページの行数
+    latency (float): 1リクエストあたりの遅延（秒）
+    jitter (float): 遅延に加える一様乱数の幅（秒）
+    failure_rate (float): 接続エラーを送出する確率
+    throttle_rate (float): HTTP 429 相当のエラーを送出する確率
+    missing_rate (float): データのない銘柄（空の結果）の割合
+    seed (int): 遅延・失敗の乱数シード
+    """
+
+    def __init__(self, listing_html: Optional[str] = None, rows: int = 4000, latency: float = 0.0,
+                 jitter: float = 0.0, failure_rate: float = 0.0, throttle_rate: float = 0.0,
+                 missing_rate: float = 0.0, seed: int = 0):
+        self.listing_html = listing_html if listing_html is not None else build_listing_html(rows)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.missing_rate = missing_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _request(self) -> None:
+        """1リクエスト分の遅延と失敗の注入"""
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if roll < self.throttle_rate:
+            raise Exception("429 Client Error: Too Many Requests")
+        if roll < self.throttle_rate + self.failure_rate:
+            raise ConnectionError("Connection reset by peer (injected)")
+
+    def is_missing(self, ticker: str) -> bool:
+        return (zlib.crc32(ticker.encode()) % 10000) / 10000 < self.missing_rate
+
+    def ohlcv(self, ticker: str, start=None, end=None, period: Optional[str] = None) -> pd.DataFrame:
+        """銘柄ごとに同じ値を返す合成日足（英語カラム名、日付インデックス）"""
+        if self.is_missing(ticker):
+            return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Adj Close", "Volume"])
+
+        if start is not None:
+            dates = pd.bdate_range(start, pd.Timestamp(end or _LAST_DATE) - pd.Timedelta(days=1))
+        else:
+            dates = pd.bdate_range(end=_LAST_DATE, periods=_PERIOD_DAYS.get(period or "1mo", 21))
+        # 期間によらず同じ日には同じ値になるよう、日付と銘柄から値を決める
+        day_numbers = (dates - pd.Timestamp("2000-01-01")).days.to_numpy()
+        seed = zlib.crc32(ticker.encode())
+        base = 100 + seed % 4900
+        noise = np.sin(day_numbers * 0.05 + seed % 97) * 0.1 + np.cos(day_numbers * 0.013 + seed % 13) * 0.2
+        close = base * (1 + noise)
+        spread = base * 0.01
+        frame = pd.DataFrame({
+            "Open": close - spread / 2,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": (1000 + (day_numbers * seed) % 100000).astype("int64"),
+        }, index=pd.DatetimeIndex(dates, name="Date"))
+        return frame
+
+    # --- requests / yfinance の置き換え ---
+
+    def get(self, url: str, headers: Optional[dict] = None, **kwargs) -> FakeResponse:
+        self._request()
+        return FakeResponse(self.listing_html, headers={"ETag": '"fake-listing"'})
+
+    def ticker(self, ticker: str, session=None) -> "FakeTicker":
+        return FakeTicker(self, ticker)
+
+    def download(self, tickers: Union[str, Sequence[str]], start=None, end=None,
+                 period: Optional[str] = None, **kwargs) -> pd.DataFrame:
+        self._request()
+        if isinstance(tickers, str):
+            return self.ohlcv(tickers, start, end, period)
+        frames = {t: self.ohlcv(t, start, end, period) for t in tickers}
+        frames = {t: f for t, f in frames.items() if not f.empty}
+        if not frames:
+            return pd.DataFrame()
+        # 複数銘柄の場合は yf.download と同じ (項目, ティッカー) の2段カラムにする
+        combined = pd.concat(frames, axis=1)
+        return combined.swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+    @contextmanager
+    def install(self) -> Iterator["FakeMarket"]:
+        """この間だけ requests.get / requests.Session.get / yf.Ticker / yf.download を合成市場に差し替える"""
+        originals = (requests.get, requests.Session.get, yf.Ticker, yf.download)
+        market = self
+        requests.get = self.get
+        # 共有セッション（stock_http）経由の取得も差し替える
+        requests.Session.get = lambda session, url, **kwargs: market.get(url, **kwargs)
+        yf.Ticker = self.ticker
+        yf.download = self.download
+        try:
+            yield self
+        finally:
+            requests.get, requests.Session.get, yf.Ticker, yf.download = originals
+
+
+class FakeTicker:
+    """yf.Ticker の代わりに使う銘柄オブジェクト"""
+
+    def __init__(self, market: FakeMarket, ticker: str):
+        self.market = market
+        self.ticker = ticker
+
+    def history(self, period: Optional[str] = None, start=None, end=None, **kwargs) -> pd.DataFrame:
+        self.market._request()
+        return self.market.ohlcv(self.ticker, start, end, period)
+
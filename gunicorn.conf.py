@@ -0,0 +1,21 @@
+# gunicorn stock_web_app:app で起動したときに読み込まれる設定
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# SSEと状態確認のリクエストがワーカーを占有しないよう、スレッドで並行に処理する
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# アプリを親プロセスで1回だけ読み込み、各ワーカーはそれを fork で引き継ぐ
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").strip().lower() not in ("0", "false", "off", "no")
+
+# 親プロセスで読み込んでおくモジュール（アプリ側では初めて使うときまで読み込みを遅らせている）
+PRELOAD_MODULES = [m.strip() for m in os.getenv("STOCK_PRELOAD_MODULES", "numpy,pandas,yfinance").split(",") if m.strip()]
+
+
+def on_starting(server):
+    """ワーカーを fork する前に重いモジュールを読み込み、起動直後の最初のリクエストで待たせない"""
+    from stock_lazy import preload
+    loaded = preload(PRELOAD_MODULES)
+    server.log.info("preloaded modules: %s", ", ".join(loaded))
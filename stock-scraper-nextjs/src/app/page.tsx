@@ -13,11 +13,13 @@ interface StockResult {
 }
 
 interface ScrapingStatus {
+  job_id?: string;
   is_running: boolean;
   progress: number;
   status_message: string;
   results: StockResult[];
   error?: string;
+  next_cursor?: number;
 }
 
 export default function Home() {
@@ -66,10 +68,11 @@ export default function Home() {
   };
 
   // ステータスチェック
-  const checkStatus = async () => {
+  const checkStatus = async (jobId?: string) => {
     try {
       console.log('Fetching status from API...');
-      const response = await fetch(`${API_BASE_URL}/api/status`, {
+      const query = jobId ? `?job_id=${encodeURIComponent(jobId)}` : '';
+      const response = await fetch(`${API_BASE_URL}/api/status${query}`, {
         method: 'GET',
         headers: {
           'Accept': 'application/json',
@@ -110,6 +113,87 @@ export default function Home() {
     return null;
   };
 
+  // ステータスポーリング（SSEが使えない場合のフォールバック）
+  // 前回以降に見つかった結果だけを cursor で受け取り、変化がなければ304で本文を省略する
+  const pollStatus = (jobId?: string) => {
+    let cursor = 0;
+    let etag: string | null = null;
+    setStatus(prev => ({ ...prev, results: [] }));
+
+    const interval = setInterval(async () => {
+      try {
+        const params = new URLSearchParams({ cursor: String(cursor) });
+        if (jobId) {
+          params.set('job_id', jobId);
+        }
+        const headers: Record<string, string> = { 'Accept': 'application/json' };
+        if (etag) {
+          headers['If-None-Match'] = etag;
+        }
+        const response = await fetch(`${API_BASE_URL}/api/status?${params}`, { headers, cache: 'no-store' });
+        if (response.status === 304) {
+          return;
+        }
+        if (!response.ok) {
+          console.error('Status check failed with status:', response.status);
+          return;
+        }
+        etag = response.headers.get('ETag');
+        const statusData: ScrapingStatus = await response.json();
+        cursor = statusData.next_cursor ?? cursor;
+        setStatus(prev => ({
+          ...statusData,
+          results: [...(prev.results || []), ...(statusData.results || [])]
+        }));
+        if (!statusData.is_running) {
+          clearInterval(interval);
+          setIsLoading(false);
+        }
+      } catch (error) {
+        console.error('Status check failed:', error);
+      }
+    }, 1000);
+  };
+
+  // SSEで進行状況の差分と見つかった銘柄を逐次受け取る
+  const streamStatus = (jobId: string) => {
+    let finished = false;
+    const source = new EventSource(`${API_BASE_URL}/api/jobs/${encodeURIComponent(jobId)}/events`);
+
+    setStatus(prev => ({ ...prev, job_id: jobId, results: [] }));
+
+    source.addEventListener('progress', (e) => {
+      const progress = JSON.parse((e as MessageEvent).data);
+      setStatus(prev => ({
+        ...prev,
+        is_running: progress.is_running,
+        progress: progress.progress,
+        status_message: progress.status_message,
+        error: progress.error ?? undefined
+      }));
+    });
+
+    source.addEventListener('result', (e) => {
+      const row: StockResult = JSON.parse((e as MessageEvent).data);
+      setStatus(prev => ({ ...prev, results: [...(prev.results || []), row] }));
+    });
+
+    source.addEventListener('done', () => {
+      finished = true;
+      source.close();
+      setIsLoading(false);
+    });
+
+    source.onerror = () => {
+      if (finished) {
+        return;
+      }
+      console.error('Event stream failed, falling back to polling');
+      source.close();
+      pollStatus(jobId);
+    };
+  };
+
   // スクレイピング開始
   const startScraping = async () => {
     // null値のチェック
@@ -164,14 +248,11 @@ export default function Home() {
 
       const result = await response.json();
 
-      // ステータスポーリング開始
-      const interval = setInterval(async () => {
-        const statusData = await checkStatus();
-        if (statusData && !statusData.is_running) {
-          clearInterval(interval);
-          setIsLoading(false);
-        }
-      }, 1000);
+      if (result.job_id && typeof window !== 'undefined' && 'EventSource' in window) {
+        streamStatus(result.job_id);
+      } else {
+        pollStatus(result.job_id);
+      }
 
     } catch (error) {
       console.error('Scraping failed:', error);
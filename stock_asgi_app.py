@@ -0,0 +1,487 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+
+# 設定・ジョブの保存先・キャッシュ・メトリクスはFlask版と共有し、同じ /api/* の仕様で応答する
+from stock_web_app import (
+    CORS_ORIGINS,
+    JOBS_BY_PATH,
+    LISTING_URL,
+    SCRAPE_JOB_QUEUE,
+    SCRAPE_JOB_WORKERS,
+    SCRAPE_RATE_LIMIT,
+    SSE_HEARTBEAT,
+    SSE_POLL_INTERVAL,
+    build_snapshot_in_background,
+    compress_body,
+    find_cached_result,
+    is_degraded_run,
+    job_store,
+    load_status,
+    parse_scrape_params,
+    parse_status_query,
+    parse_versions_limit,
+    result_cache,
+    snapshot_info,
+    sse_event,
+    universe_info,
+)
+from stock_code_scrayping import aiter_codes_by_price
+from stock_http import DEFAULT_TIMEOUT, USER_AGENT
+from stock_jobs import AsyncJobHandle, AsyncJobManager, JobQueueFull
+from stock_market_snapshot import current_trading_date, get_snapshot_store, is_market_open
+from stock_metrics import REGISTRY, SCREEN_HITS, SpanRecorder, span
+from stock_price_source import AsyncYahooChartPriceSource
+from stock_universe_cache import get_code_universe
+from stock_universe_history import get_universe_history
+
+# 1件のジョブ内で同時に送る価格取得リクエスト数
+SCRAPE_ASYNC_CONCURRENCY = int(os.getenv("SCRAPE_ASYNC_CONCURRENCY", "32"))
+
+_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# 起動中に共有する非同期HTTPクライアントとジョブ管理（lifespan で作成・破棄する）
+_client: Optional[httpx.AsyncClient] = None
+job_manager: Optional[AsyncJobManager] = None
+
+
+def create_async_client(pool_size: int = SCRAPE_ASYNC_CONCURRENCY) -> httpx.AsyncClient:
+    """価格取得用の非同期HTTPクライアント（keep-alive接続を pool_size 本まで再利用する）。"""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0]),
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        headers={"User-Agent": USER_AGENT},
+    )
+
+
+async def scrape_job(job: AsyncJobHandle, count: int, min_price: float, max_price: float,
+                     seed: Optional[int] = None, trading_date: Optional[str] = None,
+                     markets: Optional[List[str]] = None, sectors: Optional[List[str]] = None):
+    """scrape_in_background の asyncio 版（価格は非同期HTTPクライアントで並行取得する）"""
+    timings = SpanRecorder()
+    filtered = bool(markets or sectors)
+
+    with span("snapshot_lookup", timings):
+        snapshot = await asyncio.to_thread(get_snapshot_store().get, trading_date)
+    if snapshot is not None:
+        JOBS_BY_PATH.inc(path="snapshot")
+        with span("snapshot_screen", timings):
+            within = None
+            if filtered:
+                universe = await asyncio.to_thread(get_code_universe, LISTING_URL)
+                within = universe.select(markets, sectors)
+            results = snapshot.screen(count, min_price, max_price, seed=seed, within=within)
+        SCREEN_HITS.inc(len(results), source="snapshot")
+        await job.add_results(results)
+        await job.update(
+            state="done",
+            progress=100,
+            status_message=(
+                f"{len(results)} 件の銘柄を抽出完了 "
+                f"(スナップショット {snapshot.trading_date}, 有効銘柄: {len(snapshot)} 件)"
+            ),
+            error=None,
+            timings=timings.as_dict()
+        )
+        return
+
+    JOBS_BY_PATH.inc(path="live")
+    await job.update(progress=0, status_message="銘柄コードを取得中...")
+
+    try:
+        await job.update(progress=20, status_message="銘柄コードをスクレイピング中...")
+
+        # 一覧ページの取得・解析とキャッシュはスレッド側（requests）で行う
+        with span("code_universe", timings):
+            universe = await asyncio.to_thread(get_code_universe, LISTING_URL)
+        with span("filter_codes", timings):
+            valid_codes = universe.select(markets, sectors)
+
+        if not valid_codes:
+            await job.update(
+                state="error",
+                error="条件に合う銘柄が見つかりませんでした" if filtered else "有効な銘柄コードが見つかりませんでした",
+                status_message="エラーが発生しました",
+                timings=timings.as_dict()
+            )
+            return
+
+        await job.update(progress=50, status_message=f"価格情報を取得中... (有効銘柄: {len(valid_codes)} 件)")
+
+        price_source = AsyncYahooChartPriceSource(_client, concurrency=SCRAPE_ASYNC_CONCURRENCY)
+        found = 0
+        last = None
+        with span("price_screen", timings):
+            async for event in aiter_codes_by_price(
+                valid_codes, count, min_price, max_price,
+                price_source=price_source, rate_limit=SCRAPE_RATE_LIMIT, seed=seed
+            ):
+                last = event
+                with span("job_store_write", timings):
+                    if event.code is not None:
+                        found = event.hits
+                        await job.add_results([(str(event.code), float(event.price))])
+
+                    ratio = max(event.hits / count, event.scanned / max(event.total, 1))
+                    await job.update(
+                        progress=50 + int(49 * ratio),
+                        status_message=(
+                            f"価格情報を取得中... ({event.scanned}/{event.total} 件確認, "
+                            f"{event.hits} 件一致, 取得失敗 {event.failures} 件)"
+                        )
+                    )
+
+        await job.update(
+            state="done",
+            progress=100,
+            status_message=f"{found} 件の銘柄を抽出完了 (有効銘柄: {len(valid_codes)} 件)",
+            error=None,
+            timings=timings.as_dict(),
+            degraded=is_degraded_run(last, count)
+        )
+
+    except Exception as exc:
+        await job.update(
+            state="error",
+            error=f"スクレイピングに失敗しました: {str(exc)}",
+            status_message="エラーが発生しました",
+            progress=0,
+            timings=timings.as_dict()
+        )
+
+
+# --- HTTP応答 ---
+
+def _cors_headers(scope: Scope) -> List[Tuple[bytes, bytes]]:
+    """/api/* への許可されたオリジンからのリクエストにCORSヘッダーを返す（Flask版と同じ規則）"""
+    if not scope["path"].startswith("/api/"):
+        return []
+    origin = _header(scope, "origin")
+    if not origin:
+        return []
+    for allowed in CORS_ORIGINS:
+        if (allowed.fullmatch(origin) if isinstance(allowed, re.Pattern) else allowed == origin):
+            return [
+                (b"access-control-allow-origin", origin.encode("latin-1")),
+                (b"access-control-allow-credentials", b"true"),
+                (b"vary", b"Origin"),
+                (b"access-control-expose-headers", b"ETag"),
+            ]
+    return []
+
+
+def _header(scope: Scope, name: str) -> str:
+    target = name.lower().encode("latin-1")
+    for key, value in scope.get("headers", []):
+        if key.lower() == target:
+            return value.decode("latin-1")
+    return ""
+
+
+async def _respond(send: Send, scope: Scope, status: int, body: bytes, content_type: str,
+                   headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    all_headers = [(b"content-type", content_type.encode("latin-1")),
+                   (b"content-length", str(len(body)).encode("latin-1"))]
+    all_headers += _cors_headers(scope) + (headers or [])
+    await send({"type": "http.response.start", "status": status, "headers": all_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _json(send: Send, scope: Scope, data: Any, status: int = 200) -> None:
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await _respond(send, scope, status, body, "application/json")
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+# --- ルート ---
+
+async def index(scope: Scope, receive: Receive, send: Send) -> None:
+    """メインページを表示"""
+    with open(_TEMPLATE_PATH, "rb") as f:
+        await _respond(send, scope, 200, f.read(), "text/html; charset=utf-8")
+
+
+async def start_scraping(scope: Scope, receive: Receive, send: Send) -> None:
+    """スクレイピングを開始するAPI（Flask版の start_scraping と同じ応答）"""
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    try:
+        params = parse_scrape_params(data)
+    except ValueError as exc:
+        await _json(send, scope, {"error": str(exc)}, 400)
+        return
+    params["trading_date"] = current_trading_date()
+
+    if data.get("refresh"):
+        result_cache.invalidate(params)
+    else:
+        job_id = await asyncio.to_thread(find_cached_result, params)
+        if job_id is not None:
+            await _json(send, scope, {
+                "message": "同じ条件の抽出結果を再利用しました",
+                "job_id": job_id,
+                "coalesced": False,
+                "cached": True
+            })
+            return
+
+    try:
+        job_id, coalesced = await job_manager.submit(params)
+    except JobQueueFull as exc:
+        await _json(send, scope, {"error": str(exc)}, 429)
+        return
+
+    message = "実行中の同じ条件のスクレイピングに合流しました" if coalesced else "スクレイピングを開始しました"
+    await _json(send, scope, {"message": message, "job_id": job_id, "coalesced": coalesced, "cached": False})
+
+
+async def list_jobs(scope: Scope, receive: Receive, send: Send) -> None:
+    """最近のジョブの一覧を取得するAPI"""
+    try:
+        limit = int(_query(scope).get("limit", "20"))
+    except ValueError:
+        limit = 20
+    jobs = await asyncio.to_thread(job_store.list_jobs, max(1, min(limit, 100)))
+    await _json(send, scope, {"jobs": jobs})
+
+
+async def get_job(scope: Scope, receive: Receive, send: Send, job_id: str) -> None:
+    """ジョブごとの状態と結果を取得するAPI"""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        await _json(send, scope, {"error": "ジョブが見つかりません"}, 404)
+        return
+    await _json(send, scope, job)
+
+
+async def get_status(scope: Scope, receive: Receive, send: Send) -> None:
+    """スクレイピングの状態を取得するAPI（ETag・cursor・圧縮の扱いはFlask版と同じ）"""
+    try:
+        job_id, cursor, limit = parse_status_query(_query(scope))
+    except ValueError as exc:
+        await _json(send, scope, {"error": str(exc)}, 400)
+        return
+    status, body, etag = await asyncio.to_thread(
+        load_status, job_id, cursor, limit, _header(scope, "if-none-match")
+    )
+
+    headers = [(b"cache-control", b"no-cache"), (b"vary", b"Accept-Encoding")]
+    if etag:
+        headers.append((b"etag", etag.encode("latin-1")))
+    if body is None:
+        await send({"type": "http.response.start", "status": 304, "headers": _cors_headers(scope) + headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    data, encoding = compress_body(
+        json.dumps(body, ensure_ascii=False).encode("utf-8"), _header(scope, "accept-encoding")
+    )
+    if encoding:
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+    await _respond(send, scope, status, data, "application/json", headers)
+
+
+async def job_events(scope: Scope, receive: Receive, send: Send, job_id: str) -> None:
+    """ジョブの進行状況と結果をServer-Sent Eventsで配信するAPI（イベントはFlask版と同じ）"""
+    if await asyncio.to_thread(job_store.get_summary, job_id) is None:
+        await _json(send, scope, {"error": "ジョブが見つかりません"}, 404)
+        return
+
+    last_event_id = _header(scope, "last-event-id")
+    next_seq = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+
+    headers = [(b"content-type", b"text/event-stream; charset=utf-8"),
+               (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+    await send({"type": "http.response.start", "status": 200, "headers": headers + _cors_headers(scope)})
+
+    async def write(text: str) -> None:
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    last_state = None
+    last_heartbeat = time.monotonic()
+    # 待機はスレッドを占有しないため、接続数だけワーカーを用意する必要はない
+    while True:
+        job = await asyncio.to_thread(job_store.get_summary, job_id)
+        if job is None:
+            await write(sse_event("error", {"error": "ジョブが見つかりません"}))
+            break
+
+        for row in await asyncio.to_thread(job_store.results_since, job_id, next_seq):
+            await write(sse_event("result", {"code": row["code"], "price": row["price"]}, event_id=row["seq"]))
+            next_seq = row["seq"] + 1
+
+        state = (job["state"], job["progress"], job["status_message"], job["error"])
+        if state != last_state:
+            last_state = state
+            await write(sse_event("progress", {key: job[key] for key in (
+                "job_id", "state", "is_running", "progress", "status_message", "error", "result_count"
+            )}))
+
+        if not job["is_running"]:
+            await write(sse_event("done", {"job_id": job_id, "state": job["state"], "result_count": job["result_count"]}))
+            break
+
+        if time.monotonic() - last_heartbeat >= SSE_HEARTBEAT:
+            last_heartbeat = time.monotonic()
+            await write(": keep-alive\n\n")
+        await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def metrics(scope: Scope, receive: Receive, send: Send) -> None:
+    """Prometheusのテキスト形式でメトリクスを返す（値はこのプロセス内の集計）"""
+    body = REGISTRY.render().encode("utf-8")
+    await _respond(send, scope, 200, body, "text/plain; version=0.0.4; charset=utf-8")
+
+
+async def market_snapshot(scope: Scope, receive: Receive, send: Send) -> None:
+    """スナップショットの状態を取得する（POSTの場合は作成を開始する）API"""
+    if scope["method"] == "POST":
+        if get_snapshot_store().is_building:
+            await _json(send, scope, {"message": "スナップショットは作成中です", **snapshot_info()}, 409)
+            return
+        if is_market_open():
+            message = "取引時間中はスナップショットを作成できません（大引け後に作成してください）"
+            await _json(send, scope, {"message": message, **snapshot_info()}, 409)
+            return
+        threading.Thread(target=build_snapshot_in_background, daemon=True).start()
+        await _json(send, scope, {"message": "スナップショットの作成を開始しました", **snapshot_info()}, 202)
+        return
+    await _json(send, scope, await asyncio.to_thread(snapshot_info))
+
+
+async def code_universe(scope: Scope, receive: Receive, send: Send) -> None:
+    """抽出対象の銘柄一覧の概要を返すAPI（markets / sectors に指定できる値と件数）"""
+    try:
+        info = await asyncio.to_thread(universe_info)
+    except Exception as exc:
+        await _json(send, scope, {"error": f"銘柄一覧の取得に失敗しました: {str(exc)}"}, 502)
+        return
+    await _json(send, scope, info)
+
+
+async def list_universe_versions(scope: Scope, receive: Receive, send: Send) -> None:
+    """銘柄一覧の版を新しい順に返すAPI（新規上場・上場廃止・市場変更の件数を含む）"""
+    history = get_universe_history()
+    if history is None:
+        await _json(send, scope, {"error": "銘柄一覧の履歴は無効です"}, 404)
+        return
+    limit = parse_versions_limit(_query(scope).get("limit"))
+    versions = await asyncio.to_thread(history.versions, LISTING_URL, limit)
+    await _json(send, scope, {"versions": versions})
+
+
+async def get_universe_diff(scope: Scope, receive: Receive, send: Send, version: str) -> None:
+    """指定した版と直前の版との差分（added / removed / market_changed）を返すAPI"""
+    history = get_universe_history()
+    diff = await asyncio.to_thread(history.diff, int(version)) if history is not None else None
+    if diff is None:
+        await _json(send, scope, {"error": "指定した版が見つかりません"}, 404)
+        return
+    await _json(send, scope, diff.as_dict())
+
+
+def _query(scope: Scope) -> Dict[str, str]:
+    return {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+
+
+_ROUTES = [
+    (re.compile(r"/"), ("GET",), index),
+    (re.compile(r"/api/scrape"), ("POST",), start_scraping),
+    (re.compile(r"/api/jobs"), ("POST",), start_scraping),
+    (re.compile(r"/api/jobs"), ("GET",), list_jobs),
+    (re.compile(r"/api/jobs/([^/]+)"), ("GET",), get_job),
+    (re.compile(r"/api/jobs/([^/]+)/events"), ("GET",), job_events),
+    (re.compile(r"/api/status"), ("GET",), get_status),
+    (re.compile(r"/api/snapshot"), ("GET", "POST"), market_snapshot),
+    (re.compile(r"/api/universe"), ("GET",), code_universe),
+    (re.compile(r"/api/universe/versions"), ("GET",), list_universe_versions),
+    (re.compile(r"/api/universe/versions/(\d+)"), ("GET",), get_universe_diff),
+    (re.compile(r"/metrics"), ("GET",), metrics),
+]
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    global _client, job_manager
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            _client = create_async_client()
+            job_manager = AsyncJobManager(
+                job_store, lambda job, params: scrape_job(job, **params),
+                max_workers=SCRAPE_JOB_WORKERS, max_pending=SCRAPE_JOB_QUEUE,
+            )
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await job_manager.shutdown()
+            await _client.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    """
+    ASGIアプリケーション本体
+
+        uvicorn stock_asgi_app:app --host 0.0.0.0 --port 5000
+    """
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip("/") or "/"
+    method = scope["method"]
+    if method == "OPTIONS" and path.startswith("/api/"):
+        # CORSのプリフライト
+        headers = _cors_headers(scope)
+        if headers:
+            headers += [
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers",
+                 _header(scope, "access-control-request-headers").encode("latin-1") or b"Content-Type"),
+            ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    path_matched = False
+    for pattern, methods, handler in _ROUTES:
+        match = pattern.fullmatch(path)
+        if match is None:
+            continue
+        path_matched = True
+        if method in methods or (method == "HEAD" and "GET" in methods):
+            await handler(scope, receive, send, *match.groups())
+            return
+    if path_matched:
+        await _json(send, scope, {"error": "許可されていないメソッドです"}, 405)
+    else:
+        await _json(send, scope, {"error": "見つかりません"}, 404)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", "5000")))
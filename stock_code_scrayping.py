@@ -1,47 +1,168 @@
 import requests
-from bs4 import BeautifulSoup
+import argparse
+import asyncio
+import io
 import re
 import random
-from typing import List, Optional, Tuple
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
-import yfinance as yf
+from stock_fetch_policy import ThrottledError, checked_yf_call, get_fetch_policy
+from stock_http import configure_http, get_yf_session, http_get
+from stock_lazy import lazy_import
+from stock_metrics import PRICE_FETCHES, SCREEN_HITS, SCREEN_SCANNED, span, timed
+from stock_price_source import AsyncPriceSource, PriceSource, YFinancePriceSource, get_rate_limiter
 
-def scrape_stock_codes(url):
+# 読み込みに時間のかかるモジュールは、価格の取得などで初めて使うときに読み込む
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+
+# 1回のリクエストで終値をまとめて取得する銘柄数
+DEFAULT_BATCH_SIZE = 50
+
+@timed("listing_fetch")
+def fetch_listing_page(
+    url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+) -> requests.Response:
     """
-    指定されたURLから東証の全銘柄コードをスクレイピングする。
-    ページ内のテーブルから銘柄コード、銘柄名、市場情報を抽出し、
-    REITを除外した銘柄のみを返す。
+    銘柄一覧ページを取得する。
+    etag / last_modified を指定すると条件付きリクエストを送り、
+    変更がなければステータス304のレスポンスが返る。
     """
-    response = requests.get(url)
-    if response.status_code != 200:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    # 共有の接続プールを使い、タイムアウトを設定して取得する
+    response = http_get(url, headers=headers)
+    if response.status_code not in (200, 304):
         raise Exception("ページの取得に失敗しました。")
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    codes = []
+    return response
+
+
+_CODE_HREF_PATTERN = re.compile(r'/stock/([0-9]+[A-Z]*)')
+
+# (銘柄コード, 銘柄名, 業種, 市場)
+ListingRow = Tuple[str, str, str, str]
+# ListingRow を列ごとに保存するときのキー
+LISTING_COLUMNS = ("code", "name", "sector", "market")
+
+
+def _row_from_cells(href: Optional[str], texts: List[str]) -> Optional[ListingRow]:
+    """行のリンク先と各セルの文字列から一覧の1行分を組み立てる。"""
+    if not href:
+        return None
+    match = _CODE_HREF_PATTERN.search(href)
+    if not match:
+        return None
+    return (match.group(1).strip(), texts[1], texts[2], texts[3])
+
+
+def _parse_listing_bs4(html: str) -> List[ListingRow]:
+    """BeautifulSoup（html.parser）による解析。lxmlが使えない環境向けのフォールバック。"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    rows: List[ListingRow] = []
     
     # テーブルの行を取得
-    table_rows = soup.find_all('tr')
-    
-    for row in table_rows:
-        cells = row.find_all('td')
+    for tr in soup.find_all('tr'):
+        cells = tr.find_all('td')
         if len(cells) >= 4:  # コード、銘柄名、業種、市場の4列があることを確認
             # 最初のセルからコードを抽出
-            code_cell = cells[0]
-            code_link = code_cell.find('a', href=True)
-            if code_link:
-                match = re.search(r'/stock/([0-9]+[A-Z]*)', code_link['href'])
-                if match:
-                    code = match.group(1).strip()
-                    
-                    # 市場情報を取得（4番目のセル）
-                    market = cells[3].get_text(strip=True)
-                    
-                    # REITを除外（市場名に「REIT」が含まれる場合は除外）
-                    if 'REIT' not in market:
-                        codes.append(code)
+            code_link = cells[0].find('a', href=True)
+            texts = [cell.get_text(strip=True) for cell in cells[:4]]
+            row = _row_from_cells(code_link['href'] if code_link else None, texts)
+            if row:
+                rows.append(row)
     
-    return codes
+    return rows
+
+
+def _cell_text(cell) -> str:
+    return ''.join(text.strip() for text in cell.itertext())
+
+
+def _parse_listing_lxml(html: str) -> List[ListingRow]:
+    """lxmlのiterparseで行単位に1パスで解析する。処理済みの行は破棄するためメモリ使用量が一定。"""
+    from lxml import etree
+
+    data = html.encode('utf-8') if isinstance(html, str) else html
+    rows: List[ListingRow] = []
+
+    for _, tr in etree.iterparse(io.BytesIO(data), events=('end',), tag='tr', html=True, encoding='utf-8'):
+        cells = tr.findall('.//td')
+        if len(cells) >= 4:
+            href = next((a.get('href') for a in cells[0].iter('a') if a.get('href')), None)
+            texts = [_cell_text(cell) for cell in cells[:4]]
+            row = _row_from_cells(href, texts)
+            if row:
+                rows.append(row)
+
+        # 解析済みの行と、その前にある兄弟要素を解放する
+        tr.clear()
+        parent = tr.getparent()
+        if parent is not None:
+            while tr.getprevious() is not None:
+                del parent[0]
+
+    return rows
+
+
+def parse_stock_listing(html: str, backend: str = "auto") -> List[ListingRow]:
+    """
+    銘柄一覧ページのHTMLから (銘柄コード, 銘柄名, 業種, 市場) の一覧を抽出する。
+    backend は "lxml"、"bs4"、"auto"（lxmlがあればlxml、なければbs4）から選ぶ。
+    """
+    if backend not in ("auto", "lxml", "bs4"):
+        raise ValueError(f"未対応の解析バックエンドです: {backend}")
+    if backend == "bs4":
+        return _parse_listing_bs4(html)
+    try:
+        return _parse_listing_lxml(html)
+    except ImportError:
+        if backend == "lxml":
+            raise
+        return _parse_listing_bs4(html)
+
 
+@timed("listing_parse")
+def parse_stock_codes(html: str, backend: str = "auto") -> List[str]:
+    """
+    銘柄一覧ページのHTMLから銘柄コードを抽出する。
+    ページ内のテーブルから銘柄コード、銘柄名、市場情報を抽出し、
+    REITを除外した銘柄のみを返す。
+    """
+    # REITを除外（市場名に「REIT」が含まれる場合は除外）
+    return [code for code, _, _, market in parse_stock_listing(html, backend) if 'REIT' not in market]
+
+
+@timed("scrape_stock_codes")
+def scrape_stock_codes(url):
+    """
+    指定されたURLから東証の全銘柄コードをスクレイピングする。
+    ページ内のテーブルから銘柄コード、銘柄名、市場情報を抽出し、
+    REITを除外した銘柄のみを返す。
+    """
+    response = fetch_listing_page(url)
+    return parse_stock_codes(response.text)
+
+
+@timed("scrape_stock_universe")
+def scrape_stock_universe(url: str) -> "CodeUniverse":
+    """指定されたURLの銘柄一覧を、業種・市場付きの CodeUniverse として取得する。"""
+    response = fetch_listing_page(url)
+    return CodeUniverse.from_rows(parse_stock_listing(response.text))
+
+
+# 有効とみなす銘柄コードの数値部分の下限（ETF等を除外する）
+MIN_VALID_CODE = 1301
+
+
+@timed("filter_valid_codes")
 def filter_valid_codes(codes):
     """
     取得した銘柄コードのうち、数値部分が1301以上のもののみを返す。
@@ -54,12 +175,13 @@ def filter_valid_codes(codes):
         numeric_part = re.match(r'(\d+)', code)
         if numeric_part:
             numeric_value = int(numeric_part.group(1))
-            if numeric_value >= 1301:
+            if numeric_value >= MIN_VALID_CODE:
                 valid.append(code)
     return valid
 
 
 
+@timed("fetch_latest_close")
 def fetch_latest_close(code: str) -> Optional[float]:
     """yfinanceを利用して指定銘柄の直近終値を取得する。"""
     if not code:
@@ -71,50 +193,462 @@ def fetch_latest_close(code: str) -> Optional[float]:
         return None
     
     ticker = f"{numeric_part.group(1)}.T"
+    policy = get_fetch_policy()
     try:
-        history = yf.Ticker(ticker).history(period="5d", auto_adjust=False, prepost=False)
-        if history.empty:
-            history = yf.download(ticker, period="5d", progress=False)
-        if history.empty:
-            return None
-
-        closes = history["Close"].dropna()
-        if closes.empty:
-            return None
-        return float(closes.iloc[-1])
-    except Exception:
+        history = policy.call("close_history", lambda: checked_yf_call(
+            [ticker], lambda: yf.Ticker(ticker, session=get_yf_session()).history(period="5d", auto_adjust=False, prepost=False)
+        ))
+        if history is None:
+            history = policy.call("close_download", lambda: checked_yf_call(
+                [ticker], lambda: yf.download(ticker, period="5d", progress=False, session=get_yf_session())
+            ))
+    except ThrottledError:
+        history = None
+    if history is None:
+        PRICE_FETCHES.inc(method="latest_close", result="failed")
+        return None
+
+    # 終値の列がない・途中までの応答は、終値を取得できなかったものとして扱う
+    if "Close" not in history.columns.get_level_values(0):
+        PRICE_FETCHES.inc(method="latest_close", result="failed")
         return None
+    closes = history["Close"]
+    if isinstance(closes, pd.DataFrame):
+        # downloadは単一銘柄でも (項目, ティッカー) の2段カラムを返すことがある
+        closes = closes.iloc[:, 0]
+    closes = pd.to_numeric(closes, errors="coerce").dropna()
+    if closes.empty:
+        PRICE_FETCHES.inc(method="latest_close", result="failed")
+        return None
+    PRICE_FETCHES.inc(method="latest_close", result="ok")
+    return float(closes.iloc[-1])
+
+
+def format_display_code(code: str) -> str:
+    """数字部分を4桁でゼロパディングし、英字部分があれば保持した表示用コードを返す。"""
+    numeric_part = re.match(r'(\d+)', code)
+    if not numeric_part:
+        return code
+    base_code = numeric_part.group(1).zfill(4)
+    alpha_part = code[len(numeric_part.group(1)):]
+    return base_code + alpha_part
+
+
+class ScreenEvent(NamedTuple):
+    """iter_codes_by_price が返すイベント。
+
+    code / price は条件を満たした銘柄（表示用コードと終値）で、チャンクの処理完了を
+    知らせるだけの進捗イベントでは None となる。scanned / failures / hits は
+    その時点までに確認した銘柄数・終値を取得できなかった銘柄数・一致数、total は対象銘柄数。
+    """
+
+    code: Optional[str]
+    price: Optional[float]
+    scanned: int
+    failures: int
+    hits: int
+    total: int
+
 
+class PriceIndex:
+    """終値の昇順に並べた銘柄コードと終値の索引。
 
+    価格帯の検索は searchsorted による二分探索で O(log n) となり、
+    一致する銘柄は連続した区間として得られる。終値が NaN の銘柄は索引に含めない。
+    """
+
+    def __init__(self, codes: List[str], closes: "np.ndarray"):
+        closes = np.asarray(closes, dtype=float)
+        priced = np.flatnonzero(~np.isnan(closes))
+        order = priced[np.argsort(closes[priced], kind="stable")]
+        self.codes = np.asarray(codes, dtype=str)[order]
+        self.closes = closes[order]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def bounds(self, min_price: float, max_price: float) -> Tuple[int, int]:
+        """min_price 以上 max_price 以下の銘柄が占める区間 [lo, hi) を返す。"""
+        lo = int(np.searchsorted(self.closes, min_price, side="left"))
+        hi = int(np.searchsorted(self.closes, max_price, side="right"))
+        return lo, max(lo, hi)
+
+    def count_in_range(self, min_price: float, max_price: float) -> int:
+        lo, hi = self.bounds(min_price, max_price)
+        return hi - lo
+
+    def sample(
+        self,
+        count: int,
+        min_price: float,
+        max_price: float,
+        seed: Optional[int] = None,
+        within: Optional[List[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """価格帯の区間から count 件を一様に抽出し、(表示用コード, 終値) のリストを返す。
+
+        within を指定すると、区間のうちその銘柄に含まれるものだけを対象にする。
+        """
+        lo, hi = self.bounds(min_price, max_price)
+        candidates = np.arange(lo, hi)
+        if within is not None and candidates.size:
+            candidates = candidates[np.isin(self.codes[lo:hi], list(within))]
+        if count <= 0 or candidates.size == 0:
+            return []
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(candidates, size=min(count, candidates.size), replace=False)
+        return [(format_display_code(self.codes[i]), float(self.closes[i])) for i in picked]
+
+
+class CodeUniverse:
+    """銘柄一覧を列ごとの配列で保持する表。
+
+    コードの数値部分は整数配列、英字の接尾辞（130A の "A"）は別の配列に分け、
+    業種と市場はカテゴリ型で保持する。市場・業種ごとの行位置は初回の参照時に索引化するため、
+    価格を取得する前にプライム市場のみ・特定の業種のみといった絞り込みができる。
+    東証のコードは0で始まらないため、数値部分の先頭の0は保持しない。
+    """
+
+    def __init__(self, numbers, suffixes, names, sectors, markets):
+        self.numbers = np.asarray(numbers, dtype=np.int32)
+        self.suffixes = np.asarray(suffixes, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.sectors = pd.Categorical(sectors)
+        self.markets = pd.Categorical(markets)
+        self._positions: Dict[Tuple[str, str], "np.ndarray"] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List[ListingRow]) -> "CodeUniverse":
+        """parse_stock_listing の結果から表を作る。"""
+        codes, names, sectors, markets = (list(column) for column in zip(*rows)) if rows else ([], [], [], [])
+        # 先頭の数字を数値部分、残りを接尾辞とする（数字で始まらないコードは -1 として無効扱い）
+        parts = pd.Series(codes, dtype=object).str.extract(r'^(\d*)(.*)$')
+        numbers = pd.to_numeric(parts[0], errors='coerce').fillna(-1)
+        return cls(numbers.to_numpy(), parts[1].fillna('').to_numpy(), names, sectors, markets)
+
+    @classmethod
+    def from_codes(cls, codes: List[str]) -> "CodeUniverse":
+        """コードだけの一覧（業種・市場が不明）から表を作る。"""
+        return cls.from_rows([(code, '', '', '') for code in codes])
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[str]]) -> "CodeUniverse":
+        """LISTING_COLUMNS をキーとする列ごとのリストから表を作る。"""
+        return cls.from_rows(list(zip(*(columns[name] for name in LISTING_COLUMNS))))
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def codes_at(self, positions: "np.ndarray") -> List[str]:
+        """行位置に対応する銘柄コード（数値部分＋接尾辞）を返す。"""
+        return [f"{self.numbers[i]}{self.suffixes[i]}" for i in positions]
+
+    def positions(self, column: str, value: str) -> "np.ndarray":
+        """市場（column="market"）または業種（column="sector"）が value を含む行の位置を返す。
+
+        "プライム" のような部分一致で指定できる。結果は値ごとに索引として保持する。
+        """
+        key = (column, value)
+        found = self._positions.get(key)
+        if found is None:
+            categorical = {"market": self.markets, "sector": self.sectors}[column]
+            matched = [i for i, category in enumerate(categorical.categories) if value in category]
+            found = np.flatnonzero(np.isin(categorical.codes, matched))
+            self._positions[key] = found
+        return found
+
+    def mask(
+        self,
+        markets: Optional[List[str]] = None,
+        sectors: Optional[List[str]] = None,
+    ) -> "np.ndarray":
+        """有効な銘柄（数値部分が1301以上、REIT以外）のうち条件に合う行を True とする配列を返す。"""
+        mask = self.numbers >= MIN_VALID_CODE
+        mask[self.positions("market", "REIT")] = False
+        for column, values in (("market", markets), ("sector", sectors)):
+            if values:
+                selected = np.zeros(len(self), dtype=bool)
+                for value in values:
+                    selected[self.positions(column, value)] = True
+                mask &= selected
+        return mask
+
+    def select(
+        self,
+        markets: Optional[List[str]] = None,
+        sectors: Optional[List[str]] = None,
+    ) -> List[str]:
+        """条件に合う有効な銘柄コードを一覧の順に返す（条件なしは filter_valid_codes と同じ結果）。"""
+        return self.codes_at(np.flatnonzero(self.mask(markets, sectors)))
+
+    def counts(self, column: str) -> Dict[str, int]:
+        """有効な銘柄の市場別または業種別の件数を返す（不明な値は除く）。"""
+        categorical = {"market": self.markets, "sector": self.sectors}[column]
+        codes = categorical.codes[self.mask()]
+        tally = np.bincount(codes[codes >= 0], minlength=len(categorical.categories))
+        return {str(category): int(n) for category, n in zip(categorical.categories, tally) if n and category}
+
+
+def _iter_chunk_closes(
+    chunks: List[List[str]],
+    fetch_chunk: Callable[[List[str]], Dict[str, Optional[float]]],
+    workers: int,
+) -> Iterator[Tuple[List[str], Dict[str, Optional[float]]]]:
+    """チャンクごとの終値を入力順に返す。workers が2以上なら先読みして並行取得する。"""
+    if workers == 1:
+        for chunk in chunks:
+            yield chunk, fetch_chunk(chunk)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending: Dict[int, Future] = {}
+    next_submit = 0
+    try:
+        for index, chunk in enumerate(chunks):
+            # 先読みは workers 件までに制限し、打ち切り時の無駄な取得を抑える
+            while next_submit < len(chunks) and next_submit - index < workers:
+                pending[next_submit] = executor.submit(fetch_chunk, chunks[next_submit])
+                next_submit += 1
+            yield chunk, pending.pop(index).result()
+    finally:
+        # 呼び出し側が打ち切った場合も含め、未着手のチャンクは取り消し、実行中のものは待たずに戻る
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_price_chunks(
+    codes: List[str],
+    price_source: Optional[PriceSource] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    rate_limit: Optional[float] = None,
+) -> Iterator[Tuple[List[str], "np.ndarray"]]:
+    """銘柄を batch_size 件ずつまとめて取得し、(チャンク, 終値の配列) を入力順に返す。
+
+    取得できなかった銘柄の終値は NaN となる。workers が2以上の場合は最大 workers 件の
+    チャンクを並行取得し、rate_limit（1秒あたりのリクエスト数）はホスト単位で共有される。
+    """
+    if price_source is None:
+        price_source = YFinancePriceSource()
+    batch_size = max(1, int(batch_size))
+    workers = max(1, int(workers))
+
+    limiter = None
+    if rate_limit:
+        limiter = get_rate_limiter(getattr(price_source, "host", "default"), rate_limit)
+
+    def fetch_chunk(chunk: List[str]) -> Dict[str, Optional[float]]:
+        if limiter is not None:
+            limiter.acquire()
+        with span("price_fetch_chunk"):
+            return price_source.fetch_closes(chunk)
+
+    chunks = [codes[i:i + batch_size] for i in range(0, len(codes), batch_size)]
+    chunk_closes = _iter_chunk_closes(chunks, fetch_chunk, workers)
+    try:
+        for chunk, closes in chunk_closes:
+            prices = np.array(
+                [np.nan if closes.get(code) is None else closes[code] for code in chunk],
+                dtype=float,
+            )
+            failed = int(np.isnan(prices).sum())
+            PRICE_FETCHES.inc(len(chunk) - failed, method="batch", result="ok")
+            PRICE_FETCHES.inc(failed, method="batch", result="failed")
+            yield chunk, prices
+    finally:
+        chunk_closes.close()
+
+
+def iter_codes_by_price(
+    codes: List[str],
+    count: int,
+    min_price: float,
+    max_price: float,
+    price_source: Optional[PriceSource] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    rate_limit: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> Iterator[ScreenEvent]:
+    """価格条件を満たす銘柄を見つけた順に返すジェネレータ。
+
+    シャッフルした銘柄を batch_size 件ずつ price_source でまとめて取得し、
+    チャンクごとに価格条件をベクトル演算で判定する。一致した銘柄ごとにイベントを返し、
+    各チャンクの処理後には進捗イベント（code が None）を返す。count 件に達した時点で終了する。
+
+    workers が2以上の場合はスレッドプールで最大 workers 件のチャンクを並行取得し、
+    rate_limit（1秒あたりのリクエスト数）はホスト単位で全ワーカーに共有される。
+    結果はシャッフル順に確定させるため、seed を指定すれば並行数に関わらず同じ結果になる。
+    """
+    shuffled_codes = codes[:]
+    rng = random.Random(seed) if seed is not None else random
+    rng.shuffle(shuffled_codes)
+
+    total = len(shuffled_codes)
+    scanned = failures = hits = 0
+    if count <= 0:
+        return
+
+    price_chunks = iter_price_chunks(shuffled_codes, price_source, batch_size, workers, rate_limit)
+    try:
+        for chunk, prices in price_chunks:
+            scanned += len(chunk)
+            failures += int(np.isnan(prices).sum())
+            SCREEN_SCANNED.inc(len(chunk), source="live")
+            # NaN（取得失敗）は比較がすべてFalseになるため自然に除外される
+            mask = (prices >= min_price) & (prices <= max_price)
+
+            for index in np.flatnonzero(mask):
+                hits += 1
+                SCREEN_HITS.inc(source="live")
+                yield ScreenEvent(
+                    format_display_code(chunk[index]), float(prices[index]),
+                    scanned, failures, hits, total,
+                )
+                if hits >= count:
+                    return
+
+            yield ScreenEvent(None, None, scanned, failures, hits, total)
+    finally:
+        price_chunks.close()
+
+
+async def aiter_codes_by_price(
+    codes: List[str],
+    count: int,
+    min_price: float,
+    max_price: float,
+    price_source: AsyncPriceSource,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    rate_limit: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> AsyncIterator[ScreenEvent]:
+    """iter_codes_by_price の asyncio 版（ASGIアプリ用）。
+
+    チャンク内の銘柄は price_source が並行して取得し、チャンクの取得が終わるまで次へ進まない。
+    シャッフル順と判定は iter_codes_by_price と同じため、seed が同じなら同じ結果になる。
+    """
+    shuffled_codes = codes[:]
+    rng = random.Random(seed) if seed is not None else random
+    rng.shuffle(shuffled_codes)
+
+    total = len(shuffled_codes)
+    scanned = failures = hits = 0
+    if count <= 0:
+        return
+
+    limiter = None
+    if rate_limit:
+        limiter = get_rate_limiter(getattr(price_source, "host", "default"), rate_limit)
+
+    batch_size = max(1, int(batch_size))
+    for start in range(0, total, batch_size):
+        chunk = shuffled_codes[start:start + batch_size]
+        if limiter is not None:
+            await asyncio.to_thread(limiter.acquire)
+        with span("price_fetch_chunk"):
+            closes = await price_source.fetch_closes(chunk)
+        prices = np.array(
+            [np.nan if closes.get(code) is None else closes[code] for code in chunk],
+            dtype=float,
+        )
+        failed = int(np.isnan(prices).sum())
+        PRICE_FETCHES.inc(len(chunk) - failed, method="async_chart", result="ok")
+        PRICE_FETCHES.inc(failed, method="async_chart", result="failed")
+
+        scanned += len(chunk)
+        failures += failed
+        SCREEN_SCANNED.inc(len(chunk), source="live")
+        mask = (prices >= min_price) & (prices <= max_price)
+
+        for index in np.flatnonzero(mask):
+            hits += 1
+            SCREEN_HITS.inc(source="live")
+            yield ScreenEvent(
+                format_display_code(chunk[index]), float(prices[index]),
+                scanned, failures, hits, total,
+            )
+            if hits >= count:
+                return
+
+        yield ScreenEvent(None, None, scanned, failures, hits, total)
+
+
+@timed("select_codes_by_price")
 def select_codes_by_price(
-    codes: List[str], count: int, min_price: float, max_price: float
+    codes: List[str],
+    count: int,
+    min_price: float,
+    max_price: float,
+    price_source: Optional[PriceSource] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    rate_limit: Optional[float] = None,
+    seed: Optional[int] = None,
+    price_index: Optional[PriceIndex] = None,
 ) -> List[Tuple[str, float]]:
-    """価格条件を満たす銘柄コードを抽出する。"""
+    """価格条件を満たす銘柄コードを抽出する（引数は iter_codes_by_price と同じ）。
 
-    filtered: List[Tuple[str, float]] = []
-    shuffled_codes = codes[:]
-    random.shuffle(shuffled_codes)
+    price_index を指定すると価格は取得せず、索引の価格帯の区間から codes に含まれる銘柄を
+    一様に抽出する（狭い価格帯でも無駄な取得が発生しない）。
+    """
+    if price_index is not None:
+        return price_index.sample(count, min_price, max_price, seed=seed, within=codes)
+    return [
+        (event.code, event.price)
+        for event in iter_codes_by_price(
+            codes, count, min_price, max_price, price_source, batch_size, workers, rate_limit, seed
+        )
+        if event.code is not None
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ターミナル版: 条件を満たす銘柄を見つけ次第、標準出力に表示する。"""
+    parser = argparse.ArgumentParser(description="東証銘柄を終値で絞り込んで表示します")
+    parser.add_argument("--cli", action="store_true", help="ターミナル版で実行する（互換用）")
+    parser.add_argument("--count", type=int, default=30, help="抽出する銘柄数")
+    parser.add_argument("--min-price", type=float, default=100, help="終値の下限")
+    parser.add_argument("--max-price", type=float, default=500, help="終値の上限")
+    parser.add_argument("--seed", type=int, default=None, help="抽出順を固定する乱数シード")
+    parser.add_argument("--workers", type=int, default=4, help="価格取得の並行数")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="1回でまとめて取得する銘柄数")
+    parser.add_argument("--url", default="https://nikkeiyosoku.com/stock/all/", help="銘柄一覧ページのURL")
+    parser.add_argument("--market", action="append", default=None,
+                        help="対象の市場（部分一致、例: プライム。複数指定・カンマ区切り可）")
+    parser.add_argument("--sector", action="append", default=None,
+                        help="対象の業種（部分一致、例: 電気機器。複数指定・カンマ区切り可）")
+    args = parser.parse_args(argv)
 
-    for code in shuffled_codes:
-        if len(filtered) >= count:
-            break
+    if args.count <= 0:
+        parser.error("抽出銘柄数は正の整数を入力してください")
+    if args.min_price > args.max_price:
+        parser.error("終値の下限は上限以下である必要があります")
 
-        close_price = fetch_latest_close(code)
-        if close_price is None:
-            continue
+    configure_http(pool_size=args.workers)
+    markets = [m.strip() for value in args.market or [] for m in value.split(",") if m.strip()]
+    sectors = [s.strip() for value in args.sector or [] for s in value.split(",") if s.strip()]
+    # 市場・業種の絞り込みは価格を取得する前に行う
+    valid_codes = scrape_stock_universe(args.url).select(markets, sectors)
+    print(f"有効銘柄: {len(valid_codes)} 件", file=sys.stderr)
 
-        if min_price <= close_price <= max_price:
-            # 数字部分を4桁でゼロパディング、英字部分があれば保持
-            numeric_part = re.match(r'(\d+)', code)
-            if numeric_part:
-                base_code = numeric_part.group(1).zfill(4)
-                # 元のコードに英字部分があれば付加
-                alpha_part = code[len(numeric_part.group(1)):]
-                display_code = base_code + alpha_part
-            else:
-                display_code = code
-            filtered.append((display_code, close_price))
+    last = None
+    for event in iter_codes_by_price(
+        valid_codes, args.count, args.min_price, args.max_price,
+        batch_size=args.batch_size, workers=args.workers, seed=args.seed,
+    ):
+        last = event
+        if event.code is not None:
+            print(f"{event.code}\t{event.price:,.1f}", flush=True)
+        else:
+            print(
+                f"\r確認 {event.scanned}/{event.total} 件 / 一致 {event.hits} 件 / 取得失敗 {event.failures} 件",
+                end="", file=sys.stderr, flush=True,
+            )
 
-    return filtered
+    print(file=sys.stderr)
+    if last is not None:
+        print(f"{last.hits} 件の銘柄を抽出しました（確認 {last.scanned} 件）", file=sys.stderr)
 
 
+if __name__ == "__main__":
+    main()
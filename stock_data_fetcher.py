@@ -1,10 +1,37 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import yfinance as yf
-import pandas as pd
 from datetime import datetime
+import argparse
+import json
+import multiprocessing
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from stock_fetch_policy import FetchFailedError, ThrottledError, checked_yf_call, get_fetch_policy
+from stock_http import configure_http, get_yf_session
+from stock_indicators import DEFAULT_INDICATORS, compute_indicators, parse_indicator_specs
+from stock_lazy import lazy_import
+from stock_metrics import StageRecorder, peak_rss_mib
+from stock_ohlcv_store import get_default_store
+
+# pandas はデータを扱うときに、yfinance はローカルストアにない区間を取得するときに初めて読み込む
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+
+# download_history の英語カラム名と、出力する日本語カラム名
+OUTPUT_COLUMNS = {
+    'Open': '始値',
+    'High': '高値',
+    'Low': '安値',
+    'Close': '終値',
+    'Volume': '出来高'
+}
+
+# 一括取得の工程（表示順）
+BULK_STAGES = ('fetch', 'transform', 'indicators', 'serialize')
 
 def validate_ticker(ticker_code):
     """
@@ -31,15 +58,90 @@ def validate_ticker(ticker_code):
     
     return True
 
-def fetch_stock_data(ticker_code, start_date, end_date, market="TSE"):
+def download_history(ticker, start_date, end_date):
+    """
+    yfinanceから期間 [start_date, end_date) の日足データを取得する関数
+    
+    Parameters:
+    ticker (str): ティッカーシンボル（例: "7203.T"）
+    start_date (str): 開始日（YYYY-MM-DD形式）
+    end_date (str): 終了日（YYYY-MM-DD形式）
+    
+    Returns:
+    pd.DataFrame: 英語カラム名（Open, High, Low, Close, Volume）のDataFrame、データがない場合はNone
+    
+    Raises:
+    ThrottledError: レート制限により取得を打ち切った場合
+    FetchFailedError: すべての方法が失敗した場合（データがない場合と区別するため）
+    """
+    # yfinanceでデータ取得（複数の方法を試行）
+    # 各方法は共通の取得ポリシー（再試行・バックオフ・サーキットブレーカー）を通して実行する
+    policy = get_fetch_policy()
+    stock = yf.Ticker(ticker, session=get_yf_session())
+    # いずれかの方法が例外なく応答したか（空の結果を「データなし」と判断してよいか）
+    answered = []
+    
+    def history(**kwargs):
+        result = checked_yf_call([ticker], lambda: stock.history(auto_adjust=False, prepost=False, **kwargs))
+        answered.append(True)
+        return result
+    
+    def download():
+        result = checked_yf_call([ticker], lambda: yf.download(
+            ticker, start=start_date, end=end_date, progress=False, session=get_yf_session()
+        ))
+        answered.append(True)
+        return result
+    
+    try:
+        # 方法1: 通常の取得
+        df = policy.call("history", lambda: history(start=start_date, end=end_date))
+        
+        # 方法2: periodを使用した取得
+        if df is None:
+            print(f"警告: 指定期間でデータが取得できませんでした。別の方法で再試行中...")
+            # より長い期間で取得して後でフィルタリング
+            df_long = policy.call("history_2y", lambda: history(period="2y"))
+            if df_long is not None:
+                # 指定期間でフィルタリング
+                df = df_long.loc[start_date:end_date]
+        
+        # 方法3: downloadを使用した取得
+        if df is None or df.empty:
+            print(f"警告: 別の方法で再試行中...")
+            df = policy.call("download", download)
+    except ThrottledError as exc:
+        # 制限中に残りの方法を試してもリクエストが増えるだけなので打ち切る
+        print(f"警告: {ticker} の取得がレート制限により中断されました: {exc}")
+        raise
+    
+    if (df is None or df.empty) and not answered:
+        raise FetchFailedError(f"{ticker} のデータを取得できませんでした（{start_date} 〜 {end_date}）")
+    
+    if df is not None and isinstance(df.columns, pd.MultiIndex):
+        # downloadは単一銘柄でも (項目, ティッカー) の2段カラムを返すことがある
+        df.columns = df.columns.get_level_values(0)
+    
+    if df is not None and getattr(df.index, 'tz', None) is not None:
+        # Ticker.history は取引所のタイムゾーン付き、download はタイムゾーンなしの日付を返すため、
+        # 取引所の現地日付（タイムゾーンなし）にそろえる
+        df.index = df.index.tz_localize(None)
+    
+    return df
+
+def fetch_stock_data(ticker_code, start_date, end_date, market="TSE", store=None, indicators=None):
     """
     指定された銘柄コードと期間で株価データを取得する関数
     
+    取得したデータはローカルストアに保存され、次回以降は未取得の区間だけを取得する。
+    
     Parameters:
     ticker_code (str): 銘柄コード（例: "7203"）
     start_date (str): 開始日（YYYY-MM-DD形式）
     end_date (str): 終了日（YYYY-MM-DD形式）
     market (str): 市場（"TSE"=東証、"US"=米国市場）
+    store (OHLCVStore): 利用するローカルストア（None=既定のストア、False=使用しない）
+    indicators (list): 計算するテクニカル指標（例: ["sma:20", "ema:12", "rsi:14"]、None=20日移動平均のみ）
     
     Returns:
     pd.DataFrame: 株価データのDataFrame
@@ -60,95 +162,389 @@ def fetch_stock_data(ticker_code, start_date, end_date, market="TSE"):
     print(f"\n銘柄コード {ticker} のデータを取得中...")
     
     try:
-        # yfinanceでデータ取得（複数の方法を試行）
-        stock = yf.Ticker(ticker)
-        df = None
-        
-        # 方法1: 通常の取得
-        try:
-            df = stock.history(start=start_date, end=end_date, auto_adjust=False, prepost=False)
-        except:
-            pass
-        
-        # 方法2: periodを使用した取得
-        if df is None or df.empty:
-            print(f"警告: 指定期間でデータが取得できませんでした。別の方法で再試行中...")
-            try:
-                # より長い期間で取得して後でフィルタリング
-                df_long = stock.history(period="2y", auto_adjust=False, prepost=False)
-                if not df_long.empty:
-                    # 指定期間でフィルタリング
-                    df = df_long.loc[start_date:end_date]
-            except:
-                pass
-        
-        # 方法3: downloadを使用した取得
-        if df is None or df.empty:
-            print(f"警告: 別の方法で再試行中...")
-            try:
-                df = yf.download(ticker, start=start_date, end=end_date, progress=False)
-            except:
-                pass
+        df = load_history(ticker, start_date, end_date, store=store)
         
         if df is None or df.empty:
             print(f"警告: {ticker} のデータが取得できませんでした。")
             return None
         
-        # カラム名を日本語に変更
-        df = df.rename(columns={
-            'Open': '始値',
-            'High': '高値',
-            'Low': '安値',
-            'Close': '終値',
-            'Volume': '出来高'
-        })
-        
-        # 必要なカラムのみ選択
-        df = df[['始値', '高値', '安値', '終値', '出来高']]
-        
-        # 20日移動平均線を計算
-        df['20日移動平均'] = df['終値'].rolling(window=20, min_periods=1).mean()
-        
-        # 20日移動平均を小数点第2位まで丸める
-        df['20日移動平均'] = df['20日移動平均'].round(2)
-        
-        # その他の価格データも小数点第2位まで丸める
-        price_columns = ['始値', '高値', '安値', '終値']
-        for col in price_columns:
-            df[col] = df[col].round(2)
-        
-        # 出来高を整数に変換
-        df['出来高'] = df['出来高'].astype(int)
-        
-        return df
+        return prepare_stock_frame(df, indicators)
         
     except Exception as e:
         print(f"エラー: データ取得中にエラーが発生しました: {e}")
         return None
 
-def save_to_csv(df, ticker_code, start_date, end_date):
+def load_history(ticker, start_date, end_date, store=None):
     """
-    DataFrameをCSVファイルに保存する関数
+    ローカルストアを使って期間 [start_date, end_date) の日足データを読み込む関数
+    
+    Parameters:
+    ticker (str): ティッカーシンボル（例: "7203.T"）
+    start_date (str): 開始日（YYYY-MM-DD形式）
+    end_date (str): 終了日（YYYY-MM-DD形式）
+    store (OHLCVStore): 利用するローカルストア（None=既定のストア、False=使用しない）
+    
+    Returns:
+    pd.DataFrame: 英語カラム名のDataFrame、データがない場合はNone
+    
+    Raises:
+    ThrottledError, FetchFailedError: 取得に失敗した場合（download_history を参照）
+    """
+    if store is None:
+        store = get_default_store()
+    
+    if not store:
+        return download_history(ticker, start_date, end_date)
+    
+    # ローカルストアにない区間だけを取得して補完する
+    # （取得に失敗した区間は例外で抜けるため取得済みとして記録されず、次回に取得し直す）
+    for gap_start, gap_end in store.missing_ranges(ticker, start_date, end_date):
+        gap_df = download_history(ticker, gap_start, gap_end)
+        store.merge(ticker, gap_df, gap_start, gap_end)
+    return store.load(ticker, start_date, end_date)
+
+def prepare_stock_frame(df, indicators=None, stages=None):
+    """
+    英語カラム名の日足データを出力用のDataFrameに変換する関数
+    
+    列の選択とカラム名の変更で1回だけコピーし、出来高の整数化・指標の追加・丸めは
+    そのコピーをその場で更新する（工程ごとに新しいDataFrameを作らない）。
+    
+    Parameters:
+    df (pd.DataFrame): load_history の結果
+    indicators (list): 計算するテクニカル指標（None=20日移動平均のみ）
+    stages (StageRecorder): 工程ごとのCPU時間の記録先（省略可）
+    
+    Returns:
+    pd.DataFrame: 日本語カラム名・指標付きのDataFrame
+    """
+    stage = stages.stage if stages is not None else (lambda name: nullcontext())
+    
+    with stage('transform'):
+        # 必要なカラムのみ選択し、カラム名を日本語に変更（ここで作る独立したコピーを以降その場で更新する。
+        # 元のDataFrameの一部のままだと pandas 2.x で SettingWithCopyWarning になる）
+        df = df.loc[:, list(OUTPUT_COLUMNS)].set_axis(list(OUTPUT_COLUMNS.values()), axis=1).copy()
+        # 出来高を整数に変換
+        df['出来高'] = df['出来高'].astype(int)
+    
+    with stage('indicators'):
+        # テクニカル指標を計算し、価格と指標を小数点第2位まで丸める
+        df = compute_indicators(df, indicators if indicators is not None else DEFAULT_INDICATORS, copy=False)
+    
+    return df
+
+def _write_csv(df, path, compression=None):
+    # utf-8-sigでExcelでも文字化けしない
+    df.to_csv(path, encoding='utf-8-sig', compression=compression)
+
+def _write_parquet(df, path):
+    df.to_parquet(path)
+
+def _write_feather(df, path):
+    # Feather形式はインデックスを保存できないため、日付を列に戻して保存する
+    df.reset_index().to_feather(path)
+
+def _read_csv(path):
+    df = pd.read_csv(path, encoding='utf-8-sig', index_col=0)
+    df.index = pd.to_datetime(df.index, utc=False)
+    return df
+
+def _read_parquet(path):
+    return pd.read_parquet(path)
+
+def _read_feather(path):
+    df = pd.read_feather(path)
+    return df.set_index(df.columns[0])
+
+# 出力形式ごとの (拡張子, 書き込み関数, 読み込み関数, 必要なパッケージ)
+OUTPUT_FORMATS = {
+    'csv': ('.csv', _write_csv, _read_csv, None),
+    'csv.gz': ('.csv.gz', lambda df, path: _write_csv(df, path, 'gzip'), _read_csv, None),
+    'csv.zst': ('.csv.zst', lambda df, path: _write_csv(df, path, 'zstd'), _read_csv, 'zstandard'),
+    'parquet': ('.parquet', _write_parquet, _read_parquet, 'pyarrow'),
+    'feather': ('.feather', _write_feather, _read_feather, 'pyarrow'),
+}
+
+def _normalize_dtypes(df):
+    """価格を浮動小数点、出来高を整数の型に揃える（列形式で文字列を経由せずに保存するため）"""
+    price_columns = [col for col in df.columns if col not in ('出来高', '銘柄コード')]
+    df = df.astype({col: 'float64' for col in price_columns if pd.api.types.is_numeric_dtype(df[col])})
+    if '出来高' in df.columns:
+        df = df.astype({'出来高': 'int64'})
+    return df
+
+def write_stock_data(df, path, fmt='csv'):
+    """
+    DataFrameを指定した形式でファイルに書き込む関数
+    
+    Parameters:
+    df (pd.DataFrame): 保存するDataFrame
+    path (str): 保存先のパス
+    fmt (str): 出力形式（OUTPUT_FORMATS のキー）
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未対応の出力形式です: {fmt}（{', '.join(OUTPUT_FORMATS)}）")
+    _, writer, _, package = OUTPUT_FORMATS[fmt]
+    try:
+        writer(_normalize_dtypes(df), path)
+    except ImportError as e:
+        raise ImportError(f"{fmt} 形式で保存するには {package} をインストールしてください: {e}") from e
+
+def read_stock_data(path):
+    """
+    write_stock_data で保存したファイルを拡張子から形式を判定して読み込む関数
+    """
+    # 「.csv.gz」より「.csv」を後に判定するため拡張子の長い順に調べる
+    for extension, _, reader, _ in sorted(OUTPUT_FORMATS.values(), key=lambda spec: -len(spec[0])):
+        if path.endswith(extension):
+            return reader(path)
+    raise ValueError(f"形式を判定できないファイルです: {path}")
+
+def save_to_csv(df, ticker_code, start_date, end_date, output_dir=None, fmt='csv'):
+    """
+    DataFrameをCSVファイル（または指定した形式のファイル）に保存する関数
     
     Parameters:
     df (pd.DataFrame): 保存するDataFrame
     ticker_code (str): 銘柄コード
     start_date (str): 開始日
     end_date (str): 終了日
+    output_dir (str): 保存先ディレクトリ（省略時はカレントディレクトリ）
+    fmt (str): 出力形式（"csv"=Excel向けCSV、"csv.gz"、"csv.zst"、"parquet"、"feather"）
     """
     # ファイル名を生成（銘柄コード_開始日_終了日.csv）
     start_date_formatted = start_date.replace('-', '')
     end_date_formatted = end_date.replace('-', '')
-    filename = f"{ticker_code}_{start_date_formatted}_{end_date_formatted}.csv"
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未対応の出力形式です: {fmt}（{', '.join(OUTPUT_FORMATS)}）")
+    extension = OUTPUT_FORMATS[fmt][0]
+    filename = f"{ticker_code}_{start_date_formatted}_{end_date_formatted}{extension}"
+    if output_dir:
+        filename = os.path.join(output_dir, filename)
     
-    # CSVに保存
-    df.to_csv(filename, encoding='utf-8-sig')  # utf-8-sigでExcelでも文字化けしない
+    # 指定形式で保存
+    write_stock_data(df, filename, fmt)
     
     print(f"\nデータを {filename} に保存しました。")
     print(f"保存場所: {os.path.abspath(filename)}")
     
     return filename
 
+def read_ticker_list(path):
+    """
+    銘柄コードの一覧ファイルを読み込む関数
+    
+    1行に1銘柄、またはカンマ区切りで記述する。「#」以降はコメントとして無視する。
+    
+    Parameters:
+    path (str): 一覧ファイルのパス
+    
+    Returns:
+    list: 重複を除いた銘柄コードのリスト（記述順）
+    """
+    tickers = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            tickers.extend(code.strip() for code in line.split(',') if code.strip())
+    return list(dict.fromkeys(tickers))
+
+def _load_manifest(manifest_path):
+    """再開用の記録ファイルから、処理が成功した銘柄の記録を読み込む"""
+    done = {}
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 中断時に書きかけになった行は無視する
+                continue
+            if record.get('status') == 'ok':
+                done[record['ticker']] = record
+            else:
+                done.pop(record.get('ticker'), None)
+    return done
+
+def _process_export(df, ticker_code, start_date, end_date, output_dir, fmt='csv', indicators=None):
+    """
+    取得済みの日足を変換・保存し、記録ファイル用の結果を返す（プロセスプールからも呼ばれる）
+    
+    結果の "stages" には工程ごとのCPU時間と、工程終了時点のこのプロセスのピークRSSが入る。
+    """
+    stages = StageRecorder()
+    try:
+        df = prepare_stock_frame(df, indicators, stages)
+        with stages.stage('serialize'):
+            filename = save_to_csv(df, ticker_code, start_date, end_date, output_dir=output_dir, fmt=fmt)
+        record = {'ticker': ticker_code, 'status': 'ok', 'file': filename, 'rows': len(df)}
+    except Exception as e:
+        record = {'ticker': ticker_code, 'status': 'error', 'error': str(e)}
+    record['stages'] = stages.as_dict()
+    return record
+
+def _export_one(ticker_code, start_date, end_date, output_dir, fmt='csv', indicators=None, process_pool=None):
+    """
+    1銘柄を取得して保存し、記録ファイル用の結果を返す
+    
+    取得はこのスレッドで行い、process_pool を指定した場合は変換・指標計算・保存をプロセスプールで行う。
+    """
+    if not validate_ticker(ticker_code):
+        return {'ticker': ticker_code, 'status': 'error', 'error': '無効な銘柄コードです'}
+    ticker = ticker_code + ".T"
+    stages = StageRecorder()
+    try:
+        print(f"\n銘柄コード {ticker} のデータを取得中...")
+        with stages.stage('fetch'):
+            df = load_history(ticker, start_date, end_date)
+        if df is None or df.empty:
+            return {'ticker': ticker_code, 'status': 'error', 'error': 'データが取得できませんでした'}
+        
+        args = (df, ticker_code, start_date, end_date, output_dir, fmt, indicators)
+        if process_pool is None:
+            record = _process_export(*args)
+        else:
+            record = process_pool.submit(_process_export, *args).result()
+        stages.merge(record['stages'])
+        record['stages'] = stages.as_dict()
+        return record
+    except Exception as e:
+        return {'ticker': ticker_code, 'status': 'error', 'error': str(e), 'stages': stages.as_dict()}
+
+def bulk_export(tickers, start_date, end_date, output_dir='.', workers=4,
+                combined=False, resume=True, batch_size=50, fmt='csv', indicators=None,
+                cpu_workers=0, stages=None):
+    """
+    複数銘柄の株価データをまとめて取得・保存する関数
+    
+    銘柄を batch_size 件ずつのバッチに分け、各バッチをスレッドプールで並行取得する。
+    cpu_workers を指定すると、取得後の変換・指標計算・保存はその数のプロセスで並列に行う。
+    処理結果は1銘柄ごとに記録ファイル（*.manifest.jsonl）に追記されるため、
+    中断しても resume=True で再実行すれば成功済みの銘柄を飛ばして続きから処理できる。
+    出力形式や指標を変えて再実行した場合は、その銘柄を飛ばさずに作り直す。
+    
+    Parameters:
+    tickers (list): 銘柄コードのリスト
+    start_date (str): 開始日（YYYY-MM-DD形式）
+    end_date (str): 終了日（YYYY-MM-DD形式）
+    output_dir (str): 保存先ディレクトリ
+    workers (int): 並行して取得する銘柄数
+    combined (bool): Trueの場合、全銘柄を「銘柄コード」列付きの縦持ち形式で1ファイルにまとめる
+    resume (bool): 前回の記録ファイルから再開する場合True
+    batch_size (int): 1バッチあたりの銘柄数
+    fmt (str): 出力形式（save_to_csv と同じ）
+    indicators (list): 計算するテクニカル指標（fetch_stock_data と同じ）
+    cpu_workers (int): 変換・保存を行うプロセス数（0の場合は取得したスレッドで行う）
+    stages (StageRecorder): 工程ごとのCPU時間・ピークRSSの集計先（省略可）
+    
+    Returns:
+    dict: 銘柄コードごとの処理結果（status が "ok" または "error"）
+    """
+    tickers = list(dict.fromkeys(tickers))
+    start_date_formatted = start_date.replace('-', '')
+    end_date_formatted = end_date.replace('-', '')
+    base_name = f"bulk_{start_date_formatted}_{end_date_formatted}"
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 縦持ちの1ファイルにまとめる場合は、銘柄ごとの中間ファイルを作ってから最後に結合する
+    ticker_dir = os.path.join(output_dir, f".{base_name}.parts") if combined else output_dir
+    os.makedirs(ticker_dir, exist_ok=True)
+    
+    manifest_path = os.path.join(output_dir, f"{base_name}.manifest.jsonl")
+    if not resume and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    done = _load_manifest(manifest_path) if resume else {}
+    # 出力形式や指標が前回と異なる記録（以前の形式の記録を含む）は、ファイルがあっても作り直す
+    output_spec = {
+        'fmt': fmt,
+        'indicators': ','.join(f"{name}:{window}" for name, window in parse_indicator_specs(
+            indicators if indicators is not None else DEFAULT_INDICATORS)),
+    }
+    done = {t: r for t, r in done.items()
+            if os.path.exists(r.get('file', '')) and all(r.get(k) == v for k, v in output_spec.items())}
+    
+    summary = {ticker: done[ticker] for ticker in tickers if ticker in done}
+    remaining = [ticker for ticker in tickers if ticker not in done]
+    if summary:
+        print(f"前回の記録から {len(summary)} 銘柄をスキップします。")
+    
+    # 並行数に合わせてHTTP接続のプールを広げ、各ワーカーがkeep-alive接続を再利用できるようにする
+    configure_http(pool_size=max(1, workers))
+    
+    process_pool = None
+    if cpu_workers > 0 and remaining:
+        # 取得中のスレッドを抱えたまま fork しないよう、ワーカーは spawn で起動する
+        process_pool = ProcessPoolExecutor(max_workers=cpu_workers, mp_context=multiprocessing.get_context('spawn'))
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor, \
+            open(manifest_path, 'a', encoding='utf-8') as manifest:
+        for batch_start in range(0, len(remaining), batch_size):
+            batch = remaining[batch_start:batch_start + batch_size]
+            futures = [executor.submit(_export_one, ticker, start_date, end_date, ticker_dir, fmt, indicators,
+                                       process_pool)
+                       for ticker in batch]
+            for future in as_completed(futures):
+                record = future.result()
+                record_stages = record.pop('stages', None)
+                record.update(output_spec)
+                if stages is not None and record_stages:
+                    stages.merge(record_stages)
+                summary[record['ticker']] = record
+                manifest.write(json.dumps(record, ensure_ascii=False) + '\n')
+                manifest.flush()
+            processed = len(summary)
+            print(f"\n進捗: {processed}/{len(tickers)} 銘柄を処理しました。")
+    if process_pool is not None:
+        process_pool.shutdown()
+    
+    if combined:
+        frames = []
+        for ticker in tickers:
+            record = summary.get(ticker)
+            if record and record['status'] == 'ok':
+                part = read_stock_data(record['file'])
+                part.insert(0, '銘柄コード', ticker)
+                frames.append(part)
+        if frames:
+            combined_path = os.path.join(output_dir, f"{base_name}{OUTPUT_FORMATS[fmt][0]}")
+            write_stock_data(pd.concat(frames), combined_path, fmt)
+            print(f"\n{len(frames)} 銘柄のデータを {combined_path} にまとめて保存しました。")
+    
+    # 入力順に並べ替えて返す
+    return {ticker: summary[ticker] for ticker in tickers}
+
+def print_bulk_summary(summary):
+    """一括取得の銘柄ごとの成否を表示する関数"""
+    succeeded = [r for r in summary.values() if r['status'] == 'ok']
+    failed = [r for r in summary.values() if r['status'] != 'ok']
+    print("\n" + "=" * 50)
+    print(f"成功: {len(succeeded)} 銘柄 / 失敗: {len(failed)} 銘柄")
+    print("=" * 50)
+    for record in failed:
+        print(f"  ✗ {record['ticker']}: {record.get('error', '不明なエラー')}")
+    
+    # どの取得方法が実際に役立っているかを確認できるよう、方法ごとの集計も表示する
+    method_stats = get_fetch_policy().stats.format()
+    if method_stats:
+        print("取得方法ごとの結果:")
+        print(method_stats)
+
+def print_stage_report(stages):
+    """一括取得の工程ごとのCPU時間とピークRSSを表示する関数"""
+    report = stages.as_dict()
+    if not report:
+        return
+    print("工程ごとのCPU時間 / 工程終了時点のピークRSS:")
+    for name in sorted(report, key=lambda n: BULK_STAGES.index(n) if n in BULK_STAGES else len(BULK_STAGES)):
+        cpu_seconds = report[name]['cpu_seconds']
+        rss = report[name]['peak_rss_mib']
+        rss_text = f"{rss:.1f} MiB" if rss is not None else "-"
+        print(f"  {name:<12} CPU {cpu_seconds:8.2f} 秒  ピークRSS {rss_text}")
+    parent_rss, children_rss = peak_rss_mib(), peak_rss_mib(children=True)
+    if parent_rss is not None:
+        print(f"  プロセス全体のピークRSS: 本体 {parent_rss:.1f} MiB / 終了した子プロセス {children_rss:.1f} MiB")
+
 def validate_date(date_string):
     """
     日付の形式を検証する関数
@@ -165,10 +561,66 @@ def validate_date(date_string):
     except ValueError:
         return False
 
+def bulk_main(argv):
+    """
+    一括取得モードのメイン処理
+    """
+    parser = argparse.ArgumentParser(description="複数銘柄の株価データをまとめてCSVに出力します")
+    parser.add_argument("--tickers", default="", help="カンマ区切りの銘柄コード（例: 7203,6758）")
+    parser.add_argument("--tickers-file", help="銘柄コードの一覧ファイル（1行1銘柄）")
+    parser.add_argument("--start", required=True, help="開始日（YYYY-MM-DD形式）")
+    parser.add_argument("--end", required=True, help="終了日（YYYY-MM-DD形式）")
+    parser.add_argument("--output-dir", default=".", help="保存先ディレクトリ")
+    parser.add_argument("--workers", type=int, default=4, help="並行して取得する銘柄数")
+    parser.add_argument("--batch-size", type=int, default=50, help="1バッチあたりの銘柄数")
+    parser.add_argument("--cpu-workers", type=int, default=0,
+                        help="変換・指標計算・保存を並列に行うプロセス数（0=取得したスレッドで行う）")
+    parser.add_argument("--combined", action="store_true", help="全銘柄を縦持ち形式の1ファイルにまとめる")
+    parser.add_argument("--no-resume", action="store_true", help="前回の記録を使わず最初から取得する")
+    parser.add_argument("--indicators", default=None,
+                        help="計算する指標（例: sma:20,ema:12,rsi:14,bbands:20,atr:14,vwap:20）")
+    parser.add_argument("--format", default="csv", choices=list(OUTPUT_FORMATS), help="出力形式（既定: Excel向けCSV）")
+    args = parser.parse_args(argv)
+    
+    tickers = [code.strip() for code in args.tickers.split(',') if code.strip()]
+    if args.tickers_file:
+        tickers += read_ticker_list(args.tickers_file)
+    if not tickers:
+        parser.error("--tickers または --tickers-file で銘柄コードを指定してください")
+    if not validate_date(args.start) or not validate_date(args.end):
+        parser.error("日付は YYYY-MM-DD 形式で入力してください")
+    if args.start > args.end:
+        parser.error("終了日は開始日より後の日付を指定してください")
+    try:
+        indicators = parse_indicator_specs(args.indicators) if args.indicators else None
+    except ValueError as e:
+        parser.error(str(e))
+    
+    stages = StageRecorder()
+    summary = bulk_export(
+        tickers, args.start, args.end,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        combined=args.combined,
+        resume=not args.no_resume,
+        batch_size=max(1, args.batch_size),
+        fmt=args.format,
+        indicators=indicators,
+        cpu_workers=max(0, args.cpu_workers),
+        stages=stages,
+    )
+    print_bulk_summary(summary)
+    print_stage_report(stages)
+    return 0 if all(r['status'] == 'ok' for r in summary.values()) else 1
+
 def main():
     """
     メイン処理
     """
+    # 引数が指定された場合は一括取得モードで実行する
+    if len(sys.argv) > 1:
+        sys.exit(bulk_main(sys.argv[1:]))
+    
     print("=" * 50)
     print("株価データ取得ツール (YFinance)")
     print("=" * 50)
@@ -216,6 +668,16 @@ def main():
         
         break
     
+    while True:
+        # 出力形式入力（未入力ならExcel向けCSV）
+        fmt = input(f"出力形式を入力してください（{' / '.join(OUTPUT_FORMATS)}、省略時: csv）: ").strip() or 'csv'
+        
+        if fmt not in OUTPUT_FORMATS:
+            print("エラー: 一覧にある出力形式を入力してください。")
+            continue
+        
+        break
+    
     # データ取得
     df = fetch_stock_data(ticker_code, start_date, end_date)
     
@@ -228,10 +690,10 @@ def main():
         print(f"\n合計 {len(df)} 日分のデータを取得しました。")
         
         # CSVに保存
-        filename = save_to_csv(df, ticker_code, start_date, end_date)
+        filename = save_to_csv(df, ticker_code, start_date, end_date, fmt=fmt)
         
         print("\n処理が完了しました！")
-        print(f"CSVファイルには以下の情報が含まれています:")
+        print(f"出力ファイルには以下の情報が含まれています:")
         print("  - 日付（インデックス）")
         print("  - 始値")
         print("  - 高値")
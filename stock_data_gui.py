@@ -3,11 +3,136 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import threading
+import math
 import os
+import queue
+import re
 import sys
-from stock_data_fetcher import fetch_stock_data, save_to_csv
+from stock_data_fetcher import OUTPUT_FORMATS, fetch_stock_data, save_to_csv
+from stock_lazy import lazy_import
+
+# pandas は取得結果を扱うときに初めて読み込む
+pd = lazy_import("pandas")
+
+# ワーカースレッドからのUI更新を反映する間隔（ミリ秒）と、1回に反映する最大件数
+UI_POLL_INTERVAL_MS = 50
+UI_BATCH_SIZE = 500
+
+# 結果表示エリアに残す最大行数（超えた分は古い行から削除する）
+LOG_MAX_LINES = 5000
+
+# 同時に取得する銘柄数
+FETCH_WORKERS = 4
+
+# プレビューで「すべての銘柄」を表す選択肢
+ALL_TICKERS = "すべての銘柄（縦持ち）"
+
+def parse_tickers(text):
+    """カンマ・空白区切りの銘柄コードを重複を除いたリストにする"""
+    return list(dict.fromkeys(code for code in re.split(r'[\s,、]+', text.strip()) if code))
+
+def visible_window(offset, visible_rows, total):
+    """
+    表示する行の範囲 [start, stop) を返す
+    
+    offset は末尾の行が画面の下端に来る位置までに収める。
+    """
+    start = max(0, min(int(offset), total - visible_rows))
+    return start, min(start + visible_rows, total)
+
+def _format_cell(value):
+    """プレビューの1セル分の文字列"""
+    if isinstance(value, float):
+        return "" if math.isnan(value) else f"{value:.2f}"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+class DataFramePreview(ttk.Frame):
+    """
+    DataFrameのうち画面に見えている行だけをTreeviewに描画する表
+    
+    スクロールのたびに表示範囲の行だけを作り直すため、数年分・複数銘柄のDataFrameでも
+    Treeviewに載る行数は画面に収まる数に限られる。
+    """
+    
+    def __init__(self, parent, row_height=22):
+        super().__init__(parent)
+        self.df = None
+        self.offset = 0
+        self.row_height = row_height
+        self.visible_rows = 20
+        
+        ttk.Style().configure('Preview.Treeview', rowheight=row_height)
+        self.tree = ttk.Treeview(self, show='headings', selectmode='none', style='Preview.Treeview')
+        v_scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+        h_scrollbar = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        self.v_scrollbar = v_scrollbar
+        
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<MouseWheel>', self.on_wheel)
+        self.tree.bind('<Button-4>', self.on_wheel)
+        self.tree.bind('<Button-5>', self.on_wheel)
+    
+    def set_frame(self, df):
+        """表示するDataFrameを差し替える（Noneで空にする）"""
+        self.df = df
+        self.offset = 0
+        if df is None:
+            self.tree.configure(columns=())
+        else:
+            columns = [str(df.index.name or '日付')] + [str(c) for c in df.columns]
+            self.tree.configure(columns=columns)
+            for column in columns:
+                self.tree.heading(column, text=column)
+                self.tree.column(column, width=100, minwidth=60, anchor=tk.E, stretch=False)
+        self.render()
+    
+    def render(self):
+        """offset から画面に収まる行数分だけを描画する"""
+        self.tree.delete(*self.tree.get_children())
+        total = 0 if self.df is None else len(self.df)
+        if not total:
+            self.v_scrollbar.set(0, 1)
+            return
+        start, stop = visible_window(self.offset, self.visible_rows, total)
+        self.offset = start
+        window = self.df.iloc[start:stop]
+        for index, row in zip(window.index, window.itertuples(index=False, name=None)):
+            self.tree.insert('', tk.END, values=[_format_cell(index)] + [_format_cell(v) for v in row])
+        self.v_scrollbar.set(start / total, stop / total)
+    
+    def on_scroll(self, *args):
+        """スクロールバーの操作（moveto / scroll）を行の位置に変換する"""
+        if self.df is None:
+            return
+        if args[0] == 'moveto':
+            offset = float(args[1]) * len(self.df)
+        else:
+            step = self.visible_rows if args[2] == 'pages' else 1
+            offset = self.offset + int(args[1]) * step
+        self.offset = int(offset)
+        self.render()
+    
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.on_scroll('scroll', -3, 'units')
+        else:
+            self.on_scroll('scroll', 3, 'units')
+    
+    def on_resize(self, event):
+        # 見出しの分を除いて画面に収まる行数（はみ出した1行は切り取られるだけ）
+        rows = max(1, event.height // self.row_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.render()
 
 class StockDataGUI:
     def __init__(self, root):
@@ -15,8 +140,8 @@ class StockDataGUI:
         self.root.title("株価データ取得ツール")
         
         # ウィンドウサイズと位置の設定
-        window_width = 800
-        window_height = 700
+        window_width = 900
+        window_height = 800
         
         # 画面の中央に配置
         screen_width = root.winfo_screenwidth()
@@ -34,12 +159,27 @@ class StockDataGUI:
         self.ticker_var = tk.StringVar()
         self.start_date_var = tk.StringVar(value="2024-01-01")
         self.end_date_var = tk.StringVar(value="2024-12-31")
+        self.format_var = tk.StringVar(value="csv")
         self.progress_var = tk.DoubleVar()
         self.status_var = tk.StringVar(value="準備完了")
+        self.preview_var = tk.StringVar()
+        
+        # ワーカースレッドからのUI更新は必ずこのキューを通し、Tkのイベントループ上で反映する
+        self.ui_queue = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+        
+        # 取得済みのDataFrame（銘柄コード -> DataFrame）と、実行中の取得の件数（Tkのスレッドでのみ更新）
+        self.results = {}
+        self.batch_total = 0
+        self.batch_done = 0
+        self.batch_failed = 0
         
         # UI構築
         self.create_widgets()
         
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
+        self.root.after(UI_POLL_INTERVAL_MS, self.process_ui_queue)
+        
     def setup_styles(self):
         """スタイルの設定"""
         style = ttk.Style()
@@ -88,7 +228,7 @@ class StockDataGUI:
         title.pack()
         
         subtitle = ttk.Label(header_frame, 
-                           text="東証上場銘柄の株価データを取得してCSVファイルに出力します",
+                           text="東証上場銘柄の株価データを取得してCSVなどのファイルに出力します",
                            style='Subtitle.TLabel')
         subtitle.pack(pady=(5, 0))
         
@@ -106,11 +246,11 @@ class StockDataGUI:
                  style='Heading.TLabel', width=12).pack(side=tk.LEFT)
         
         ticker_entry = ttk.Entry(ticker_frame, textvariable=self.ticker_var, 
-                               width=10, font=('Hiragino Sans', 12))
+                               width=20, font=('Hiragino Sans', 12))
         ticker_entry.pack(side=tk.LEFT, padx=(0, 15))
         
         ttk.Label(ticker_frame, 
-                 text="例: 7203 (トヨタ)、6758 (ソニー)、9984 (ソフトバンク)",
+                 text="例: 7203 (トヨタ)、複数はカンマ区切り (7203,6758,9984)",
                  style='Info.TLabel').pack(side=tk.LEFT)
         
         # 開始日行
@@ -129,7 +269,7 @@ class StockDataGUI:
         
         # 終了日行
         end_frame = ttk.Frame(input_container)
-        end_frame.pack(fill=tk.X)
+        end_frame.pack(fill=tk.X, pady=(0, 15))
         
         ttk.Label(end_frame, text="終了日:", 
                  style='Heading.TLabel', width=12).pack(side=tk.LEFT)
@@ -141,6 +281,21 @@ class StockDataGUI:
         ttk.Label(end_frame, text="YYYY-MM-DD形式", 
                  style='Info.TLabel').pack(side=tk.LEFT)
         
+        # 出力形式行
+        format_frame = ttk.Frame(input_container)
+        format_frame.pack(fill=tk.X)
+        
+        ttk.Label(format_frame, text="出力形式:", 
+                 style='Heading.TLabel', width=12).pack(side=tk.LEFT)
+        
+        format_combo = ttk.Combobox(format_frame, textvariable=self.format_var,
+                                    values=list(OUTPUT_FORMATS), state='readonly',
+                                    width=13, font=('Hiragino Sans', 12))
+        format_combo.pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(format_frame, text="csv=Excel向け、parquet/feather=分析向け（要pyarrow）", 
+                 style='Info.TLabel').pack(side=tk.LEFT)
+        
     def create_button_section(self, parent):
         """ボタンセクションの作成"""
         button_frame = ttk.Frame(parent)
@@ -181,9 +336,12 @@ class StockDataGUI:
         result_container = ttk.LabelFrame(parent, text=" 取得結果 ", padding=15)
         result_container.pack(fill=tk.BOTH, expand=True)
         
-        # テキストウィジェットとスクロールバー
-        text_frame = ttk.Frame(result_container)
-        text_frame.pack(fill=tk.BOTH, expand=True)
+        notebook = ttk.Notebook(result_container)
+        notebook.pack(fill=tk.BOTH, expand=True)
+        
+        # ログのタブ（テキストウィジェットとスクロールバー）
+        text_frame = ttk.Frame(notebook)
+        notebook.add(text_frame, text="ログ")
         
         # スクロールバー
         v_scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL)
@@ -205,19 +363,35 @@ class StockDataGUI:
         v_scrollbar.config(command=self.result_text.yview)
         h_scrollbar.config(command=self.result_text.xview)
         
+        # データプレビューのタブ（取得した銘柄を選んで全行をスクロール表示する）
+        preview_frame = ttk.Frame(notebook)
+        notebook.add(preview_frame, text="データプレビュー")
+        
+        select_frame = ttk.Frame(preview_frame)
+        select_frame.pack(fill=tk.X, pady=(5, 5))
+        ttk.Label(select_frame, text="表示する銘柄:", style='Heading.TLabel').pack(side=tk.LEFT)
+        self.preview_combo = ttk.Combobox(select_frame, textvariable=self.preview_var,
+                                          state='readonly', width=30)
+        self.preview_combo.pack(side=tk.LEFT, padx=(10, 0))
+        self.preview_combo.bind('<<ComboboxSelected>>', lambda event: self.show_preview())
+        
+        self.preview = DataFramePreview(preview_frame)
+        self.preview.pack(fill=tk.BOTH, expand=True)
+        
     def validate_inputs(self):
         """入力値の検証"""
-        ticker = self.ticker_var.get().strip()
+        tickers = parse_tickers(self.ticker_var.get())
         start_date = self.start_date_var.get().strip()
         end_date = self.end_date_var.get().strip()
         
         # 銘柄コードの検証
-        if not ticker:
+        if not tickers:
             messagebox.showerror("入力エラー", "銘柄コードを入力してください。")
             return False
         
-        if not ticker.isdigit() or len(ticker) != 4:
-            messagebox.showerror("入力エラー", "銘柄コードは4桁の数字で入力してください。")
+        invalid = [ticker for ticker in tickers if not ticker.isdigit() or len(ticker) != 4]
+        if invalid:
+            messagebox.showerror("入力エラー", f"銘柄コードは4桁の数字で入力してください。（{', '.join(invalid)}）")
             return False
         
         # 日付形式の検証
@@ -240,134 +414,219 @@ class StockDataGUI:
         self.ticker_var.set("")
         self.start_date_var.set("2024-01-01")
         self.end_date_var.set("2024-12-31")
+        self.format_var.set("csv")
         self.result_text.delete(1.0, tk.END)
-        self.progress_var.set(0)
-        self.status_var.set("準備完了")
+        self.results.clear()
+        self.update_preview_choices()
+        if self.batch_done == self.batch_total:
+            self.progress_var.set(0)
+            self.status_var.set("準備完了")
     
     def log_message(self, message, newline=True):
-        """結果表示エリアにメッセージを追加"""
+        """結果表示エリアにメッセージを追加（どのスレッドからでも呼べる）"""
         if newline:
             message += "\n"
-        self.result_text.insert(tk.END, message)
+        self.ui_queue.put((None, message))
+    
+    def call_in_ui(self, func, *args):
+        """func(*args) をTkのイベントループ上で実行するよう依頼する（どのスレッドからでも呼べる）"""
+        self.ui_queue.put((func, args))
+    
+    def process_ui_queue(self):
+        """
+        キューに溜まったUI更新を最大 UI_BATCH_SIZE 件ずつまとめて反映する
+        
+        連続したログは1回の挿入にまとめ、順序を保つためにそれ以外の更新の前で書き出す。
+        """
+        lines = []
+        try:
+            for _ in range(UI_BATCH_SIZE):
+                func, payload = self.ui_queue.get_nowait()
+                if func is None:
+                    lines.append(payload)
+                    continue
+                if lines:
+                    self.append_log("".join(lines))
+                    lines = []
+                func(*payload)
+        except queue.Empty:
+            pass
+        finally:
+            if lines:
+                self.append_log("".join(lines))
+            self.root.after(UI_POLL_INTERVAL_MS, self.process_ui_queue)
+    
+    def append_log(self, text):
+        """結果表示エリアに追記し、LOG_MAX_LINES 行を超えた分は古い行から削除する"""
+        self.result_text.insert(tk.END, text)
+        line_count = int(self.result_text.index('end-1c').split('.')[0])
+        if line_count > LOG_MAX_LINES:
+            self.result_text.delete('1.0', f'{line_count - LOG_MAX_LINES + 1}.0')
         self.result_text.see(tk.END)
-        self.root.update_idletasks()
     
     def start_fetch_data(self):
-        """データ取得を開始（別スレッドで実行）"""
+        """データ取得を開始（取得中でも銘柄を追加でき、最大 FETCH_WORKERS 件を並行して取得する）"""
         if not self.validate_inputs():
             return
         
-        # UIを無効化
-        self.fetch_button.config(state='disabled')
-        self.result_text.delete(1.0, tk.END)
-        self.progress_var.set(0)
-        self.status_var.set("データ取得中...")
+        tickers = parse_tickers(self.ticker_var.get())
+        start_date = self.start_date_var.get().strip()
+        end_date = self.end_date_var.get().strip()
+        fmt = self.format_var.get()
+        
+        if self.batch_done == self.batch_total:
+            # 前回の取得がすべて終わっていれば、進行状況を数え直す
+            self.result_text.delete(1.0, tk.END)
+            self.batch_total = self.batch_done = self.batch_failed = 0
+        self.batch_total += len(tickers)
+        self.update_progress()
         
-        # 別スレッドでデータ取得を実行
-        thread = threading.Thread(target=self.fetch_data_thread)
-        thread.daemon = True
-        thread.start()
+        for ticker in tickers:
+            self.executor.submit(self.fetch_data_thread, ticker, start_date, end_date, fmt)
     
-    def fetch_data_thread(self):
-        """データ取得のメイン処理（別スレッドで実行）"""
+    def update_progress(self):
+        """完了した銘柄数から進行状況を更新する"""
+        self.progress_var.set(100 * self.batch_done / self.batch_total if self.batch_total else 0)
+        self.status_var.set(f"データ取得中... ({self.batch_done}/{self.batch_total} 銘柄完了)")
+    
+    def fetch_data_thread(self, ticker, start_date, end_date, fmt):
+        """1銘柄のデータ取得と保存（ワーカースレッドで実行、UIの更新はキュー経由）"""
+        self.log_message(f"📡 {ticker} の株価データを取得中...")
+        
+        # 銘柄ごとの報告は最後にまとめて出力し、並行して取得している他の銘柄と混ざらないようにする
+        report = [
+            f"銘柄コード: {ticker}",
+            f"期間: {start_date} ～ {end_date}",
+            "=" * 60,
+            "",
+        ]
         try:
-            ticker = self.ticker_var.get().strip()
-            start_date = self.start_date_var.get().strip()
-            end_date = self.end_date_var.get().strip()
-            
-            self.log_message(f"銘柄コード: {ticker}")
-            self.log_message(f"期間: {start_date} ～ {end_date}")
-            self.log_message("=" * 60)
-            self.log_message("")
-            
-            # プログレスバー更新
-            self.progress_var.set(20)
-            self.status_var.set("YFinanceからデータを取得中...")
-            
-            # データ取得
-            self.log_message("📡 株価データを取得中...")
             df = fetch_stock_data(ticker, start_date, end_date)
             
-            self.progress_var.set(60)
-            
             if df is not None and not df.empty:
-                self.log_message(f"✅ データ取得成功！ ({len(df)} 日分のデータ)")
-                self.log_message("")
+                report.append(f"✅ データ取得成功！ ({len(df)} 日分のデータ)")
+                report.append("")
                 
-                # データのプレビュー表示
-                self.log_message("【データプレビュー】最初の5行:")
-                self.log_message("-" * 60)
+                # データのプレビュー表示（全行は「データプレビュー」タブで確認できる）
+                report.append("【データプレビュー】最初の5行:")
+                report.append("-" * 60)
+                report.extend(df.head().to_string().split('\n'))
+                report.append("-" * 60)
+                report.append("")
                 
-                # データフレームを整形して表示
-                preview_str = df.head().to_string()
-                for line in preview_str.split('\n'):
-                    self.log_message(line)
+                # 選択した形式でファイル保存
+                filename = save_to_csv(df, ticker, start_date, end_date, fmt=fmt)
                 
-                self.log_message("-" * 60)
-                self.log_message("")
+                report.append(f"【{fmt}ファイル作成完了】")
+                report.append(f"📁 ファイル名: {filename}")
+                report.append(f"📍 保存場所: {os.path.abspath(filename)}")
+                report.append("")
+                report.append(f"【{fmt}ファイルに含まれるデータ】")
+                report.append("  ✓ 日付（インデックス）")
+                report.append("  ✓ 始値")
+                report.append("  ✓ 高値")
+                report.append("  ✓ 安値")
+                report.append("  ✓ 終値")
+                report.append("  ✓ 出来高")
+                report.append("  ✓ 20日移動平均線")
+                report.append("")
+                report.append("=" * 60)
+                report.append("処理が正常に完了しました！")
+                report.append("")
                 
-                self.progress_var.set(80)
-                self.status_var.set("CSVファイル作成中...")
+                self.log_message("\n".join(report))
+                self.call_in_ui(self.on_fetch_finished, ticker, df, filename, None)
+                
+            else:
+                report.append("❌ データ取得に失敗しました")
+                report.append("")
+                report.append("【確認事項】")
+                report.append("  1. 銘柄コードが正しいか確認してください")
+                report.append("  2. 指定した期間に取引データが存在するか確認してください")
+                report.append("  3. インターネット接続が正常か確認してください")
+                report.append("  4. 銘柄が上場廃止になっていないか確認してください")
+                report.append("")
+                report.append("※土日祝日は取引がないため、データは存在しません")
+                report.append("")
                 
-                # CSVファイル保存
-                filename = save_to_csv(df, ticker, start_date, end_date)
+                self.log_message("\n".join(report))
+                self.call_in_ui(self.on_fetch_finished, ticker, None, None,
+                                "データ取得に失敗しました。\n\n入力内容とネットワーク接続を確認してください。")
                 
+        except Exception as e:
+            error_msg = f"予期しないエラーが発生しました:\n{str(e)}"
+            report.append(f"❌ {error_msg}")
+            report.append("")
+            self.log_message("\n".join(report))
+            self.call_in_ui(self.on_fetch_finished, ticker, None, None, error_msg)
+    
+    def on_fetch_finished(self, ticker, df, filename, error):
+        """1銘柄の取得が終わったときの処理（Tkのスレッドで実行）"""
+        self.batch_done += 1
+        if df is not None:
+            self.results[ticker] = df
+            self.update_preview_choices(select=ticker)
+        else:
+            self.batch_failed += 1
+        
+        if self.batch_done < self.batch_total:
+            self.update_progress()
+            return
+        
+        # すべての取得が終わったら結果を知らせる
+        if self.batch_total == 1:
+            if df is not None:
                 self.progress_var.set(100)
                 self.status_var.set("✅ 完了しました！")
-                
-                self.log_message("【CSVファイル作成完了】")
-                self.log_message(f"📁 ファイル名: {filename}")
-                self.log_message(f"📍 保存場所: {os.path.abspath(filename)}")
-                self.log_message("")
-                self.log_message("【CSVファイルに含まれるデータ】")
-                self.log_message("  ✓ 日付（インデックス）")
-                self.log_message("  ✓ 始値")
-                self.log_message("  ✓ 高値")
-                self.log_message("  ✓ 安値")
-                self.log_message("  ✓ 終値")
-                self.log_message("  ✓ 出来高")
-                self.log_message("  ✓ 20日移動平均線")
-                self.log_message("")
-                self.log_message("=" * 60)
-                self.log_message("処理が正常に完了しました！")
-                
-                # 成功メッセージ
-                self.root.after(0, lambda: messagebox.showinfo("完了", 
+                messagebox.showinfo("完了", 
                     f"データ取得が完了しました！\n\n"
                     f"ファイル名: {filename}\n"
                     f"取得データ: {len(df)} 日分\n\n"
-                    f"CSVファイルが保存されました。"))
-                
+                    f"ファイルが保存されました。")
             else:
                 self.progress_var.set(0)
                 self.status_var.set("❌ エラーが発生しました")
-                
-                self.log_message("❌ データ取得に失敗しました")
-                self.log_message("")
-                self.log_message("【確認事項】")
-                self.log_message("  1. 銘柄コードが正しいか確認してください")
-                self.log_message("  2. 指定した期間に取引データが存在するか確認してください")
-                self.log_message("  3. インターネット接続が正常か確認してください")
-                self.log_message("  4. 銘柄が上場廃止になっていないか確認してください")
-                self.log_message("")
-                self.log_message("※土日祝日は取引がないため、データは存在しません")
-                
-                self.root.after(0, lambda: messagebox.showerror("エラー", 
-                    "データ取得に失敗しました。\n\n"
-                    "入力内容とネットワーク接続を確認してください。"))
-                
-        except Exception as e:
-            self.progress_var.set(0)
-            self.status_var.set("❌ 予期しないエラー")
-            
-            error_msg = f"予期しないエラーが発生しました:\n{str(e)}"
-            self.log_message(f"❌ {error_msg}")
-            
-            self.root.after(0, lambda: messagebox.showerror("エラー", error_msg))
+                messagebox.showerror("エラー", error)
+            return
         
-        finally:
-            # UIを再有効化
-            self.root.after(0, lambda: self.fetch_button.config(state='normal'))
+        succeeded = self.batch_total - self.batch_failed
+        self.progress_var.set(100)
+        if self.batch_failed:
+            self.status_var.set(f"⚠️ {succeeded} 銘柄成功 / {self.batch_failed} 銘柄失敗")
+            messagebox.showwarning("完了",
+                f"{self.batch_total} 銘柄のデータ取得が終わりました。\n\n"
+                f"成功: {succeeded} 銘柄 / 失敗: {self.batch_failed} 銘柄\n"
+                f"失敗した銘柄はログを確認してください。")
+        else:
+            self.status_var.set(f"✅ {succeeded} 銘柄完了しました！")
+            messagebox.showinfo("完了", f"{succeeded} 銘柄のデータ取得が完了しました！")
+    
+    def update_preview_choices(self, select=None):
+        """プレビューで選べる銘柄の一覧を更新する"""
+        choices = [f"{ticker} ({len(df)} 行)" for ticker, df in self.results.items()]
+        if len(self.results) > 1:
+            choices.append(ALL_TICKERS)
+        self.preview_combo.configure(values=choices)
+        if select is not None:
+            self.preview_var.set(f"{select} ({len(self.results[select])} 行)")
+        elif not self.results:
+            self.preview_var.set("")
+        self.show_preview()
+    
+    def show_preview(self):
+        """選択した銘柄（または全銘柄を縦に並べたもの）をプレビューに表示する"""
+        choice = self.preview_var.get()
+        if choice == ALL_TICKERS:
+            df = pd.concat(self.results.values(), keys=list(self.results), names=['銘柄コード'])
+            df = df.reset_index(level=0)
+        else:
+            df = self.results.get(choice.split(' ', 1)[0])
+        self.preview.set_frame(df)
+    
+    def on_close(self):
+        """ウィンドウを閉じるときは未着手の取得を取り消す"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
 def main():
     """メイン関数"""
@@ -0,0 +1,317 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, TypeVar
+
+from stock_lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+T = TypeVar("T")
+
+# スロットリングとみなすエラーメッセージの断片（小文字で比較する）
+_THROTTLE_MARKERS = ("429", "too many requests", "rate limit", "ratelimit")
+
+
+class ThrottledError(Exception):
+    """接続先がリクエストを制限している（HTTP 429 など）場合に送出される。"""
+
+
+class FetchFailedError(Exception):
+    """すべての取得方法が失敗した（データがないのではなく取得できなかった）場合に送出される。"""
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    """例外がスロットリング（レート制限）によるものかを判定する。"""
+    # yfinance を読み込む前の例外は yfinance のものではないため、読み込み済みの場合のみ確認する
+    rate_limit_error = getattr(sys.modules.get("yfinance.exceptions"), "YFRateLimitError", None)
+    if isinstance(exc, ThrottledError) or (rate_limit_error and isinstance(exc, rate_limit_error)):
+        return True
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in _THROTTLE_MARKERS)
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """例外が再試行で回復しうる一時的な障害（タイムアウト・接続エラー・HTTP 5xx）かを判定する。"""
+    # requests / httpx / curl_cffi は読み込み済みの場合のみ確認する（判定のために読み込まない）
+    transient_types = [ConnectionError, TimeoutError]
+    for module_name, names in (
+        ("requests.exceptions", ("ConnectionError", "Timeout")),
+        ("httpx", ("TransportError",)),
+        ("curl_cffi.requests.exceptions", ("ConnectionError", "Timeout")),
+    ):
+        module = sys.modules.get(module_name)
+        transient_types.extend(getattr(module, name) for name in names if hasattr(module, name))
+    if isinstance(exc, tuple(transient_types)):
+        return True
+    status_code = getattr(getattr(exc, "response", None), "status_code", None)
+    return isinstance(status_code, int) and status_code >= 500
+
+
+def checked_yf_call(tickers: Sequence[str], func: Callable[[], T]) -> T:
+    """
+    yfinance の取得処理を実行し、空の結果がスロットリングによるものなら ThrottledError を送出する。
+
+    yfinance は銘柄ごとのエラーを例外にせず内部（yfinance.shared._ERRORS）に記録して
+    空のデータを返すため、実行前に対象銘柄の記録を消しておき、実行後の記録を確認する。
+    """
+    errors = _yf_errors()
+    if errors is not None:
+        for ticker in tickers:
+            errors.pop(ticker, None)
+    result = func()
+    if is_empty_result(result):
+        # download は実行時に記録を作り直すため改めて参照する
+        errors = _yf_errors() or {}
+        for ticker in tickers:
+            message = str(errors.get(ticker, "")).lower()
+            if any(marker in message for marker in _THROTTLE_MARKERS):
+                raise ThrottledError(f"{ticker}: {errors[ticker]}")
+    return result
+
+
+def _yf_errors() -> Optional[Dict[str, Any]]:
+    """yf.download / history が銘柄ごとのエラーを記録する内部の辞書（yfinance.shared._ERRORS）。"""
+    try:
+        from yfinance import shared
+    except ImportError:
+        return None
+    return getattr(shared, "_ERRORS", None)
+
+
+def is_empty_result(result: Any) -> bool:
+    """取得結果が空（None / 空のDataFrame / 空の辞書など）かを判定する。"""
+    if result is None:
+        return True
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.empty
+    if isinstance(result, dict):
+        return all(value is None for value in result.values())
+    return False
+
+
+class CircuitBreaker:
+    """
+    スロットリングが続いたときに全ワーカーの取得を一時停止させるサーキットブレーカー。
+
+    連続 threshold 回のスロットリングで開き、cooldown 秒間は wait() を呼んだ全スレッドが待機する。
+    再開後もすぐにスロットリングされた場合は、次の停止時間を max_cooldown まで倍にする。
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self.trips = 0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def remaining(self) -> float:
+        """ブレーカーが閉じるまでの秒数（閉じていれば0以下）。"""
+        with self._lock:
+            return self._open_until - time.monotonic()
+
+    def wait(self) -> float:
+        """ブレーカーが開いている間待機し、待機した秒数を返す。"""
+        waited = 0.0
+        while True:
+            remaining = self.remaining()
+            if remaining <= 0:
+                return waited
+            time.sleep(remaining)
+            waited += remaining
+
+    async def wait_async(self) -> float:
+        """wait() の asyncio 版（イベントループを止めずに待機する）。"""
+        waited = 0.0
+        while True:
+            remaining = self.remaining()
+            if remaining <= 0:
+                return waited
+            await asyncio.sleep(remaining)
+            waited += remaining
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._cooldown = self.base_cooldown
+
+    def record_throttle(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._consecutive < self.threshold or time.monotonic() < self._open_until:
+                return
+            self._open_until = time.monotonic() + self._cooldown
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            self._consecutive = 0
+            self.trips += 1
+        print(f"警告: 取得先からリクエストを制限されています。{self._open_until - time.monotonic():.0f} 秒間取得を停止します")
+
+
+class MethodStats:
+    """取得方法ごとの試行回数・成功数・空の結果数・スロットリング数・エラー数・所要時間の集計。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, method: str, outcome: str, elapsed: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(method, {
+                "attempts": 0, "success": 0, "empty": 0, "throttled": 0, "error": 0, "seconds": 0.0,
+            })
+            stats["attempts"] += 1
+            stats[outcome] += 1
+            stats["seconds"] += elapsed
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """取得方法ごとの集計（成功率と平均所要時間を含む）を返す。"""
+        with self._lock:
+            result = {}
+            for method, stats in self._stats.items():
+                attempts = stats["attempts"]
+                result[method] = {
+                    **stats,
+                    "success_rate": stats["success"] / attempts if attempts else 0.0,
+                    "avg_seconds": stats["seconds"] / attempts if attempts else 0.0,
+                }
+            return result
+
+    def format(self) -> str:
+        """集計を表示用の複数行の文字列にする。"""
+        lines = []
+        for method, stats in sorted(self.snapshot().items()):
+            lines.append(
+                f"  {method}: 成功 {int(stats['success'])}/{int(stats['attempts'])} "
+                f"({stats['success_rate']:.0%}), 空 {int(stats['empty'])}, "
+                f"制限 {int(stats['throttled'])}, エラー {int(stats['error'])}, "
+                f"平均 {stats['avg_seconds'] * 1000:.0f} ms"
+            )
+        return "\n".join(lines)
+
+
+class FetchPolicy:
+    """
+    取得処理に指数バックオフ（ジッター付き）の再試行とサーキットブレーカーを適用する。
+
+    スロットリングと一時的な障害（is_transient_error）は max_attempts 回まで再試行する。
+    その他の例外と空の結果は再試行しても変わらないため、すぐに呼び出し側の次の取得方法に任せる。
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        stats: Optional[MethodStats] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = stats or MethodStats()
+
+    def backoff(self, attempt: int) -> float:
+        """attempt 回目（0始まり）の失敗後に待つ秒数（フルジッター）。"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, method: str, func: Callable[[], T],
+             is_empty: Callable[[Any], bool] = is_empty_result) -> Optional[T]:
+        """
+        func() を実行して結果を返す。空の結果と、失敗した場合（一時的な障害は再試行した後）はNoneを返す。
+        最後までスロットリングされた場合は ThrottledError を送出する（以降の代替手段で
+        リクエストを増やさないため）。
+        """
+        last_exc: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            self.breaker.wait()
+            started = time.perf_counter()
+            try:
+                result = func()
+            except Exception as exc:
+                elapsed = time.perf_counter() - started
+                last_exc = exc
+                if is_throttle_error(exc):
+                    self.stats.record(method, "throttled", elapsed)
+                    self.breaker.record_throttle()
+                else:
+                    self.stats.record(method, "error", elapsed)
+                    if not is_transient_error(exc):
+                        # 上場廃止・解析エラーなどは再試行しても結果が変わらないため、次の取得方法に任せる
+                        return None
+                if attempt + 1 < self.max_attempts:
+                    time.sleep(self.backoff(attempt))
+                continue
+
+            elapsed = time.perf_counter() - started
+            if is_empty(result):
+                self.stats.record(method, "empty", elapsed)
+                return None
+            self.stats.record(method, "success", elapsed)
+            self.breaker.record_success()
+            return result
+
+        if last_exc is not None and is_throttle_error(last_exc):
+            raise ThrottledError(str(last_exc)) from last_exc
+        return None
+
+    async def acall(self, method: str, func: Callable[[], Awaitable[T]],
+                    is_empty: Callable[[Any], bool] = is_empty_result) -> Optional[T]:
+        """call() の asyncio 版。func() はコルーチンを返す関数とする。"""
+        last_exc: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            await self.breaker.wait_async()
+            started = time.perf_counter()
+            try:
+                result = await func()
+            except Exception as exc:
+                elapsed = time.perf_counter() - started
+                last_exc = exc
+                if is_throttle_error(exc):
+                    self.stats.record(method, "throttled", elapsed)
+                    self.breaker.record_throttle()
+                else:
+                    self.stats.record(method, "error", elapsed)
+                    if not is_transient_error(exc):
+                        # 上場廃止・解析エラーなどは再試行しても結果が変わらないため、次の取得方法に任せる
+                        return None
+                if attempt + 1 < self.max_attempts:
+                    await asyncio.sleep(self.backoff(attempt))
+                continue
+
+            elapsed = time.perf_counter() - started
+            if is_empty(result):
+                self.stats.record(method, "empty", elapsed)
+                return None
+            self.stats.record(method, "success", elapsed)
+            self.breaker.record_success()
+            return result
+
+        if last_exc is not None and is_throttle_error(last_exc):
+            raise ThrottledError(str(last_exc)) from last_exc
+        return None
+
+
+_default_policy: Optional[FetchPolicy] = None
+_default_policy_lock = threading.Lock()
+
+
+def get_fetch_policy() -> FetchPolicy:
+    """プロセス内の全ワーカーで共有される既定の取得ポリシーを返す。"""
+    global _default_policy
+    with _default_policy_lock:
+        if _default_policy is None:
+            _default_policy = FetchPolicy()
+        return _default_policy
@@ -0,0 +1,106 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (接続, 読み込み) のタイムアウト秒数
+DEFAULT_TIMEOUT: Tuple[float, float] = (
+    float(os.getenv("STOCK_HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("STOCK_HTTP_READ_TIMEOUT", "30")),
+)
+
+# ホストごとに保持するkeep-alive接続数の既定値（configure_http で並行数に合わせて変更する）
+DEFAULT_POOL_SIZE = int(os.getenv("STOCK_HTTP_POOL_SIZE", "10"))
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) stock-scrayping"
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_pool_size = DEFAULT_POOL_SIZE
+_http2_client = None
+_http2_enabled = os.getenv("STOCK_HTTP2", "").strip().lower() in ("1", "true", "on", "yes")
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """keep-alive接続をホストごとに最大 pool_size 本まで再利用するセッションを作る。"""
+    session = requests.Session()
+    # 接続プールが満杯になると余った接続は捨てられ、次のリクエストでTCP/TLSの確立からやり直しになる
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def configure_http(pool_size: Optional[int] = None, http2: Optional[bool] = None) -> None:
+    """
+    共有セッションの接続プールの大きさとHTTP/2の利用を設定する。
+    pool_size は同時にリクエストを送るスレッド数以上にしておく。
+    """
+    global _session, _pool_size, _http2_enabled, _http2_client
+    with _lock:
+        if pool_size is not None and max(1, int(pool_size)) != _pool_size:
+            _pool_size = max(1, int(pool_size))
+            if _session is not None:
+                # 既存のセッションを参照中のスレッドがあるため閉じずに差し替える
+                _session = create_session(_pool_size)
+                _http2_client = None
+        if http2 is not None and http2 != _http2_enabled:
+            _http2_enabled = http2
+            _http2_client = None
+
+
+def get_session() -> requests.Session:
+    """プロセス内で共有されるセッションを返す。"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = create_session(_pool_size)
+        return _session
+
+
+def get_yf_session() -> requests.Session:
+    """yfinance に渡す共有セッション（yfinance は requests を使うためHTTP/1.1のまま）。"""
+    return get_session()
+
+
+def _httpx_timeout(timeout: Tuple[float, float]) -> Any:
+    """requests 形式の (接続, 読み込み) タイムアウトを httpx.Timeout にする。"""
+    import httpx
+    return httpx.Timeout(timeout[1], connect=timeout[0])
+
+
+def _get_http2_client():
+    """HTTP/2 用の httpx クライアント。httpx[http2] がない場合はNoneを返す。"""
+    global _http2_client, _http2_enabled
+    with _lock:
+        if not _http2_enabled:
+            return None
+        if _http2_client is None:
+            try:
+                import httpx
+                _http2_client = httpx.Client(
+                    http2=True,
+                    timeout=_httpx_timeout(DEFAULT_TIMEOUT),
+                    limits=httpx.Limits(max_connections=_pool_size, max_keepalive_connections=_pool_size),
+                    headers={"User-Agent": USER_AGENT},
+                )
+            except ImportError:
+                print("警告: HTTP/2 には httpx[http2] が必要です。HTTP/1.1 で接続します")
+                _http2_enabled = False
+                return None
+        return _http2_client
+
+
+def http_get(url: str, headers: Optional[Dict[str, str]] = None,
+             timeout: Optional[Tuple[float, float]] = None) -> Any:
+    """
+    共有の接続プールを使ってGETする。
+    戻り値は requests.Response（HTTP/2 有効時は httpx.Response）で、status_code / text / headers を持つ。
+    """
+    client = _get_http2_client()
+    if client is not None:
+        return client.get(url, headers=headers, timeout=_httpx_timeout(timeout or DEFAULT_TIMEOUT))
+    return get_session().get(url, headers=headers, timeout=timeout or DEFAULT_TIMEOUT)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from typing import Iterable, List, Optional, Tuple, Union
+
+from stock_lazy import lazy_import
+
+# pandas / numpy は指標を計算するときに初めて読み込む
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# 指標の指定: ("sma", 20) のようなタプル、または "sma:20" 形式の文字列
+IndicatorSpec = Union[str, Tuple[str, int]]
+
+# fetch_stock_data の既定（従来どおり20日移動平均のみ）
+DEFAULT_INDICATORS: List[Tuple[str, int]] = [("sma", 20)]
+
+# 指数平滑系の指標を差分更新する際に遡る本数（期間の倍数）。
+# 10倍遡れば初期値の影響は EMA で e^-20、RSI / ATR で e^-10 程度まで減衰する
+EWM_WARMUP_FACTOR = 10
+
+PRICE_COLUMNS = ['始値', '高値', '安値', '終値']
+
+
+def parse_indicator_specs(specs: Iterable[IndicatorSpec]) -> List[Tuple[str, int]]:
+    """
+    指標の指定を (名前, 期間) のリストに正規化する関数
+
+    Parameters:
+    specs: ("sma", 20) や "rsi:14" の並び（"sma,ema:12" のようなカンマ区切り文字列も可）
+
+    Returns:
+    list: (指標名, 期間) のリスト
+    """
+    if isinstance(specs, str):
+        specs = [part for part in specs.split(',') if part.strip()]
+
+    parsed = []
+    for spec in specs:
+        if isinstance(spec, str):
+            name, _, window = spec.strip().partition(':')
+            name = name.strip().lower()
+            window = int(window) if window.strip() else _DEFAULT_WINDOWS.get(name, 20)
+        else:
+            name, window = spec[0].lower(), int(spec[1])
+        if name not in _INDICATORS:
+            raise ValueError(f"未対応の指標です: {name}（{', '.join(_INDICATORS)}）")
+        if window <= 0:
+            raise ValueError(f"指標の期間は正の整数を指定してください: {name}:{window}")
+        parsed.append((name, window))
+    return parsed
+
+
+def indicator_columns(specs: Iterable[IndicatorSpec]) -> List[str]:
+    """指定した指標が追加する列名の一覧を返す関数"""
+    columns = []
+    for name, window in parse_indicator_specs(specs):
+        columns.extend(_INDICATORS[name][0](window))
+    return columns
+
+
+def compute_indicators(df: "pd.DataFrame", specs: Iterable[IndicatorSpec] = DEFAULT_INDICATORS,
+                       by: Optional[str] = None, decimals: Optional[int] = 2,
+                       copy: bool = True) -> "pd.DataFrame":
+    """
+    OHLCVのDataFrameにテクニカル指標の列を追加する関数
+
+    始値・高値・安値・終値・出来高の列（日本語名）を持つDataFrameを受け取り、
+    指定された指標をすべて pandas / NumPy のベクトル演算で計算する。
+    by に銘柄コードの列名を指定すると、複数銘柄を縦に並べたパネルを
+    銘柄ごとのPythonループなしで（groupbyのrolling / ewmで一括して）計算する。
+
+    Parameters:
+    df (pd.DataFrame): 日付順に並んだOHLCVデータ（パネルの場合は銘柄内で日付順）
+    specs: 指標の指定（sma / ema / rsi / bbands / atr / vwap）
+    by (str): パネルの場合の銘柄コード列名
+    decimals (int): 価格と指標を丸める小数点以下の桁数（Noneなら丸めない）
+    copy (bool): Falseの場合、1銘柄のDataFrameはコピーせずに列の追加と丸めをその場で行う
+
+    Returns:
+    pd.DataFrame: 指標の列を追加したDataFrame（copy=True なら元のDataFrameは変更しない）
+    """
+    specs = parse_indicator_specs(specs)
+    index = df.index
+    # パネルは日付が銘柄間で重複するため、位置で揃えられるよう計算中は連番のインデックスにする
+    work = df.reset_index(drop=True) if by else df
+    keys = work[by] if by else None
+
+    new_columns = {}
+    for name, window in specs:
+        names, func, _ = _INDICATORS[name]
+        values = func(work, keys, window)
+        for column, series in zip(names(window), values):
+            new_columns[column] = series
+
+    if work is df and copy:
+        result = work.assign(**new_columns)
+    else:
+        # 作業用のコピー（または copy=False の元のDataFrame）には列をそのまま追加する
+        result = work
+        for column, series in new_columns.items():
+            result[column] = series
+    if decimals is not None:
+        # 丸めは対象列をまとめて1回で行う
+        round_columns = [c for c in PRICE_COLUMNS if c in result.columns] + list(new_columns)
+        result[round_columns] = result[round_columns].round(decimals)
+    result.index = index
+    return result
+
+
+def update_indicators(cached: "pd.DataFrame", new_bars: "pd.DataFrame",
+                      specs: Iterable[IndicatorSpec] = DEFAULT_INDICATORS,
+                      by: Optional[str] = None, decimals: Optional[int] = 2) -> "pd.DataFrame":
+    """
+    指標計算済みのDataFrameに新しい足を追加し、追加分の指標だけを計算する関数
+
+    各銘柄の末尾から必要な本数（移動窓は期間分、指数平滑系は期間の EWM_WARMUP_FACTOR 倍）
+    だけを遡って再計算するため、長い系列に数本を追加する場合も計算量は一定になる。
+
+    Parameters:
+    cached (pd.DataFrame): compute_indicators の結果
+    new_bars (pd.DataFrame): 追加するOHLCVデータ（cached より後の日付）
+    specs / by / decimals: compute_indicators と同じ
+
+    Returns:
+    pd.DataFrame: cached の後ろに指標付きの new_bars を連結したDataFrame
+    """
+    specs = parse_indicator_specs(specs)
+    if new_bars.empty:
+        return cached
+
+    lookback = max(
+        window * (EWM_WARMUP_FACTOR if _INDICATORS[name][2] else 1) for name, window in specs
+    )
+    base_columns = list(new_bars.columns)
+    history = cached[base_columns]
+    tail = history.groupby(by, sort=False).tail(lookback) if by else history.tail(lookback)
+
+    marker = '__new__'
+    window_frame = pd.concat([tail.assign(**{marker: False}), new_bars.assign(**{marker: True})])
+    if by:
+        # 銘柄ごとに日付順を保つため、銘柄の出現順で安定ソートする
+        order = pd.Index(pd.unique(window_frame[by]))
+        window_frame = window_frame.iloc[
+            np.argsort(order.get_indexer(window_frame[by]), kind='stable')
+        ]
+
+    computed = compute_indicators(window_frame, specs, by=by, decimals=decimals)
+    appended = computed[computed[marker]].drop(columns=marker)
+    return pd.concat([cached, appended[cached.columns.intersection(appended.columns)]])
+
+
+def _rolling(series: "pd.Series", keys: Optional["pd.Series"], window: int, how: str, **kwargs) -> "pd.Series":
+    if keys is None:
+        return getattr(series.rolling(window, min_periods=1), how)(**kwargs)
+    grouped = series.groupby(keys, sort=False).rolling(window, min_periods=1)
+    return getattr(grouped, how)(**kwargs).reset_index(level=0, drop=True).sort_index()
+
+
+def _ewm_mean(series: "pd.Series", keys: Optional["pd.Series"], **kwargs) -> "pd.Series":
+    if keys is None:
+        return series.ewm(adjust=False, **kwargs).mean()
+    grouped = series.groupby(keys, sort=False).ewm(adjust=False, **kwargs)
+    return grouped.mean().reset_index(level=0, drop=True).sort_index()
+
+
+def _shift(series: "pd.Series", keys: Optional["pd.Series"]) -> "pd.Series":
+    return series.shift(1) if keys is None else series.groupby(keys, sort=False).shift(1)
+
+
+def _sma(df, keys, window):
+    return [_rolling(df['終値'], keys, window, 'mean')]
+
+
+def _ema(df, keys, window):
+    return [_ewm_mean(df['終値'], keys, span=window)]
+
+
+def _rsi(df, keys, window):
+    # Wilderの平滑化（alpha = 1 / 期間）
+    delta = df['終値'] - _shift(df['終値'], keys)
+    gain = _ewm_mean(delta.clip(lower=0), keys, alpha=1 / window)
+    loss = _ewm_mean(-delta.clip(upper=0), keys, alpha=1 / window)
+    rsi = 100 - 100 / (1 + gain / loss)
+    # 下落がない区間は100とする
+    return [rsi.where(loss != 0, 100.0).where(loss.notna())]
+
+
+def _bbands(df, keys, window):
+    middle = _rolling(df['終値'], keys, window, 'mean')
+    std = _rolling(df['終値'], keys, window, 'std', ddof=0)
+    return [middle + 2 * std, middle - 2 * std]
+
+
+def _atr(df, keys, window):
+    previous_close = _shift(df['終値'], keys)
+    true_range = pd.concat([
+        df['高値'] - df['安値'],
+        (df['高値'] - previous_close).abs(),
+        (df['安値'] - previous_close).abs(),
+    ], axis=1).max(axis=1)
+    return [_ewm_mean(true_range, keys, alpha=1 / window)]
+
+
+def _vwap(df, keys, window):
+    typical = (df['高値'] + df['安値'] + df['終値']) / 3
+    volume = df['出来高'].astype(float)
+    traded = _rolling(typical * volume, keys, window, 'sum')
+    total = _rolling(volume, keys, window, 'sum')
+    return [traded / total.where(total != 0)]
+
+
+# 指標名 -> (列名を返す関数, 計算関数, 指数平滑系かどうか)
+_INDICATORS = {
+    'sma': (lambda n: [f'{n}日移動平均'], _sma, False),
+    'ema': (lambda n: [f'{n}日指数移動平均'], _ema, True),
+    'rsi': (lambda n: [f'RSI({n})'], _rsi, True),
+    'bbands': (lambda n: [f'ボリンジャー上限({n})', f'ボリンジャー下限({n})'], _bbands, False),
+    'atr': (lambda n: [f'ATR({n})'], _atr, True),
+    'vwap': (lambda n: [f'{n}日VWAP'], _vwap, False),
+}
+
+_DEFAULT_WINDOWS = {'sma': 20, 'ema': 20, 'rsi': 14, 'bbands': 20, 'atr': 14, 'vwap': 20}
@@ -0,0 +1,394 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# 待機中・実行中とみなすジョブの状態
+ACTIVE_STATES = ("queued", "running")
+
+# この秒数以上更新のない実行中ジョブは、プロセス終了などで放棄されたものとみなす
+STALE_AFTER = 30 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    status_message TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    timings TEXT,
+    degraded INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_key_state ON jobs (key, state);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobQueueFull(Exception):
+    """ジョブの待ち行列が上限に達している場合に送出される。"""
+
+
+def job_key(params: Dict[str, Any]) -> str:
+    """同一リクエストを判定するためのキー。"""
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+class JobStore:
+    """ジョブの状態と結果をSQLiteに保存する。複数プロセスから同じファイルを共有できる。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # timings / degraded 列がない古いデータベースには列を追加する
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "timings" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN timings TEXT")
+            if "degraded" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN degraded INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create_or_attach(self, params: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        同じパラメータの実行中ジョブがあればそのIDを、なければ新しいジョブを作成してIDを返す。
+        戻り値の2番目は新規作成した場合にTrueとなる。
+        """
+        key = job_key(params)
+        now = time.time()
+        with self._connect() as conn:
+            # 判定と作成の間に他プロセスが割り込まないよう書き込みロックを取る
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND state IN (?, ?) AND updated_at >= ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (key, *ACTIVE_STATES, now - STALE_AFTER),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return row["id"], False
+
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, key, params, state, progress, status_message, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'queued', 0, ?, ?, ?)",
+                    (job_id, key, json.dumps(params, ensure_ascii=False), "待機中...", now, now),
+                )
+                conn.execute("COMMIT")
+                return job_id, True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """
+        state / progress / status_message / error / timings（区間名 -> ミリ秒の辞書）/ degraded を更新する。
+
+        degraded は取得失敗などで条件を満たす件数に届かなかった完了ジョブを示し、結果の再利用の対象外となる。
+        """
+        allowed = {"state", "progress", "status_message", "error", "timings", "degraded"}
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"更新できない項目です: {', '.join(sorted(unknown))}")
+        if "timings" in fields:
+            fields["timings"] = json.dumps(fields["timings"])
+        if "degraded" in fields:
+            fields["degraded"] = int(bool(fields["degraded"]))
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def add_results(self, job_id: str, rows: List[Tuple[str, float]]) -> None:
+        """結果を追加する。連番は既存の件数から続けて振る。"""
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                start = conn.execute(
+                    "SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)
+                ).fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO job_results (job_id, seq, code, price) VALUES (?, ?, ?, ?)",
+                    [(job_id, start + i, code, price) for i, (code, price) in enumerate(rows)],
+                )
+                conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの状態と結果を返す。存在しなければNone。"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            results = conn.execute(
+                "SELECT code, price FROM job_results WHERE job_id = ? ORDER BY seq", (job_id,)
+            ).fetchall()
+        return _job_from_row(row, results)
+
+    def get_summary(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """結果を含まないジョブの状態と、これまでの結果件数を返す。"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            total = conn.execute(
+                "SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+        job = _job_from_row(row, None)
+        job["result_count"] = total
+        return job
+
+    def results_since(self, job_id: str, seq: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """連番が seq 以上の結果を連番付きで返す（limit を指定するとその件数まで）。"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, code, price FROM job_results WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (job_id, seq, -1 if limit is None else limit),
+            ).fetchall()
+        return [{"seq": r["seq"], "code": r["code"], "price": r["price"]} for r in rows]
+
+    def find_completed(self, params: Dict[str, Any]) -> Optional[str]:
+        """同じパラメータで正常終了した最新のジョブのIDを返す（degraded のジョブは除く）。なければNone。"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND state = 'done' AND degraded = 0 "
+                "ORDER BY created_at DESC LIMIT 1",
+                (job_key(params),),
+            ).fetchone()
+        return row["id"] if row else None
+
+    def latest_id(self) -> Optional[str]:
+        """最も新しく作成されたジョブのIDを返す。"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT id FROM jobs ORDER BY created_at DESC LIMIT 1").fetchone()
+        return row["id"] if row else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """新しい順にジョブの概要（結果を除く）を返す。"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_job_from_row(row, None) for row in rows]
+
+
+def _job_from_row(row: sqlite3.Row, results: Optional[List[sqlite3.Row]]) -> Dict[str, Any]:
+    job = {
+        "job_id": row["id"],
+        "state": row["state"],
+        "params": json.loads(row["params"]),
+        "is_running": row["state"] in ACTIVE_STATES,
+        "progress": row["progress"],
+        "status_message": row["status_message"],
+        "error": row["error"],
+        "timings": json.loads(row["timings"]) if row["timings"] else None,
+        "degraded": bool(row["degraded"]),
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+    if results is not None:
+        job["results"] = [{"code": r["code"], "price": r["price"]} for r in results]
+    return job
+
+
+class ResultCache:
+    """
+    パラメータ -> 完了済みジョブID のLRUキャッシュ。
+
+    各エントリは expires_at（UNIX時刻）まで有効で、max_entries を超えると
+    最も長く参照されていないものから破棄する。
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, params: Dict[str, Any]) -> Optional[str]:
+        key = job_key(params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+
+    def invalidate(self, params: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries.pop(job_key(params), None)
+
+    def put(self, params: Dict[str, Any], job_id: str, expires_at: float) -> None:
+        key = job_key(params)
+        with self._lock:
+            self._entries[key] = (job_id, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class JobHandle:
+    """ジョブ実行関数から状態や結果を書き込むためのハンドル。"""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def update(self, **fields: Any) -> None:
+        self.store.update(self.job_id, **fields)
+
+    def add_results(self, rows: List[Tuple[str, float]]) -> None:
+        self.store.add_results(self.job_id, rows)
+
+
+class JobManager:
+    """
+    ジョブを上限付きのワーカープールで実行する。
+
+    runner(handle, params) が1件のジョブを処理する。同じパラメータのジョブが
+    待機中・実行中であれば新たに実行せず、そのジョブに合流させる。
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[JobHandle, Dict[str, Any]], None],
+        max_workers: int = 2,
+        max_pending: int = 16,
+    ):
+        self.store = store
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape-job")
+        self._lock = threading.Lock()
+        self._outstanding = 0
+
+    def submit(self, params: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        ジョブを登録してIDを返す。戻り値の2番目は既存ジョブに合流した場合にTrueとなる。
+        待ち行列が満杯の場合は JobQueueFull を送出する。
+        """
+        with self._lock:
+            if self._outstanding >= self.max_workers + self.max_pending:
+                raise JobQueueFull("実行待ちのジョブが上限に達しています")
+            job_id, created = self.store.create_or_attach(params)
+            if not created:
+                return job_id, True
+            self._outstanding += 1
+
+        self._executor.submit(self._run, job_id, params)
+        return job_id, False
+
+    def _run(self, job_id: str, params: Dict[str, Any]) -> None:
+        handle = JobHandle(self.store, job_id)
+        try:
+            handle.update(state="running")
+            self.runner(handle, params)
+        except Exception as exc:
+            handle.update(state="error", error=str(exc), status_message="エラーが発生しました", progress=0)
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+
+
+class AsyncJobHandle:
+    """JobHandle の asyncio 版。SQLiteへの書き込みはスレッドで行い、イベントループを止めない。"""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    async def update(self, **fields: Any) -> None:
+        await asyncio.to_thread(self.store.update, self.job_id, **fields)
+
+    async def add_results(self, rows: List[Tuple[str, float]]) -> None:
+        await asyncio.to_thread(self.store.add_results, self.job_id, rows)
+
+
+class AsyncJobManager:
+    """
+    JobManager の asyncio 版。ジョブはイベントループ上のタスクとして実行し、
+    同時に実行するジョブ数を max_workers 件に制限する。
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[AsyncJobHandle, Dict[str, Any]], Awaitable[None]],
+        max_workers: int = 2,
+        max_pending: int = 16,
+    ):
+        self.store = store
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._lock = asyncio.Lock()
+        self._tasks: set = set()
+
+    async def submit(self, params: Dict[str, Any]) -> Tuple[str, bool]:
+        """JobManager.submit と同じ（待ち行列が満杯の場合は JobQueueFull を送出する）。"""
+        async with self._lock:
+            if len(self._tasks) >= self.max_workers + self.max_pending:
+                raise JobQueueFull("実行待ちのジョブが上限に達しています")
+            job_id, created = await asyncio.to_thread(self.store.create_or_attach, params)
+            if not created:
+                return job_id, True
+            task = asyncio.create_task(self._run(job_id, params))
+            # タスクへの参照を保持しないと、実行中にガベージコレクションされることがある
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return job_id, False
+
+    async def _run(self, job_id: str, params: Dict[str, Any]) -> None:
+        handle = AsyncJobHandle(self.store, job_id)
+        async with self._semaphore:
+            try:
+                await handle.update(state="running")
+                await self.runner(handle, params)
+            except Exception as exc:
+                await handle.update(state="error", error=str(exc), status_message="エラーが発生しました", progress=0)
+
+    async def shutdown(self) -> None:
+        """実行中・待機中のジョブを取り消して終了を待つ。"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,71 @@
+import importlib
+import sys
+import threading
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+
+_lock = threading.RLock()
+_registry: Dict[str, "LazyModule"] = {}
+
+
+class LazyModule:
+    """
+    初回の属性参照まで import を遅らせるモジュールの代理。
+
+    属性は参照のたびに実際のモジュールから読むため、テストやベンチマークで
+    実際のモジュールの属性（yf.download など）を差し替えた場合もそのまま反映される。
+    代理自身の属性はモジュールの属性（np.load など）と重ならないよう _lazy_ で始める。
+    """
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_module", None)
+
+    def _lazy_load(self) -> ModuleType:
+        module = self._lazy_module
+        if module is None:
+            module = importlib.import_module(self._lazy_name)
+            object.__setattr__(self, "_lazy_module", module)
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._lazy_load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._lazy_load(), attr, value)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._lazy_load())
+
+    def __repr__(self) -> str:
+        loaded = self._lazy_module is not None or self._lazy_name in sys.modules
+        return f"<lazy module {self._lazy_name!r} ({'loaded' if loaded else 'not loaded'})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """name のモジュールの代理を返す（同じ名前には同じ代理を返す）。"""
+    with _lock:
+        proxy = _registry.get(name)
+        if proxy is None:
+            proxy = _registry[name] = LazyModule(name)
+        return proxy
+
+
+def preload(names: Optional[List[str]] = None) -> List[str]:
+    """
+    遅延させたモジュールを今すぐ読み込み、読み込んだモジュール名を返す（省略時は登録済みのすべて）。
+
+    gunicorn の preload_app と組み合わせ、ワーカーを fork する前の親プロセスで呼ぶと
+    各ワーカーが読み込み済みのモジュールを引き継げる。
+    """
+    with _lock:
+        proxies = [lazy_import(n) for n in names] if names else list(_registry.values())
+    loaded = []
+    for proxy in proxies:
+        try:
+            proxy._lazy_load()
+        except ImportError as exc:
+            print(f"警告: {proxy._lazy_name} を読み込めませんでした: {exc}")
+            continue
+        loaded.append(proxy._lazy_name)
+    return loaded
@@ -0,0 +1,260 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from stock_code_scrayping import (
+    DEFAULT_BATCH_SIZE,
+    filter_valid_codes,
+    PriceIndex,
+    iter_price_chunks,
+)
+from stock_http import configure_http
+from stock_lazy import lazy_import
+from stock_price_source import PriceSource
+
+np = lazy_import("numpy")
+
+JST = timezone(timedelta(hours=9))
+
+# 東証の寄り付きと大引け（大引け以降はその日の終値が確定しているとみなす）
+MARKET_OPEN = (9, 0)
+MARKET_CLOSE = (15, 30)
+
+
+class MarketOpenError(Exception):
+    """取引時間中にスナップショットを作成しようとした場合に送出される。"""
+
+
+def current_trading_date(now: Optional[datetime] = None) -> str:
+    """直近の確定した終値の日付（JST、土日は直前の金曜日）を返す。祝日は考慮しない。"""
+    now = (now or datetime.now(JST)).astimezone(JST)
+    day = now.date()
+    if (now.hour, now.minute) < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+
+def is_market_open(now: Optional[datetime] = None) -> bool:
+    """取引時間中（平日の9:00〜15:30 JST）かを返す。祝日は考慮しない。
+
+    取引時間中に取得できる価格は当日の途中の値で、直近の確定した終値ではない。
+    """
+    now = (now or datetime.now(JST)).astimezone(JST)
+    return now.weekday() < 5 and MARKET_OPEN <= (now.hour, now.minute) < MARKET_CLOSE
+
+
+def next_market_close(now: Optional[datetime] = None) -> float:
+    """now より後の最初の大引け（平日の15:30 JST）のUNIX時刻を返す。祝日は考慮しない。"""
+    now = (now or datetime.now(JST)).astimezone(JST)
+    close = now.replace(hour=MARKET_CLOSE[0], minute=MARKET_CLOSE[1], second=0, microsecond=0)
+    if close <= now:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return close.timestamp()
+
+
+class MarketSnapshot:
+    """コードユニバース全体の終値を1日分まとめて保持する列指向のテーブル。
+
+    codes と closes は同じ長さのNumPy配列で、終値を取得できなかった銘柄は NaN となる。
+    価格帯の抽出はネットワークに出ずに、終値順の索引の二分探索と無作為抽出だけで行う。
+    """
+
+    def __init__(self, trading_date: str, codes: "np.ndarray", closes: "np.ndarray",
+                 created_at: Optional[float] = None):
+        self.trading_date = trading_date
+        self.codes = np.asarray(codes, dtype=str)
+        self.closes = np.asarray(closes, dtype=float)
+        self.created_at = created_at if created_at is not None else time.time()
+        self._index: Optional[PriceIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def priced_count(self) -> int:
+        return len(self.index)
+
+    @property
+    def index(self) -> PriceIndex:
+        """終値順の索引（初回参照時に1回だけ作成する）。"""
+        if self._index is None:
+            self._index = PriceIndex(self.codes, self.closes)
+        return self._index
+
+    def screen(self, count: int, min_price: float, max_price: float,
+               seed: Optional[int] = None, within: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """価格帯に入る銘柄から count 件を無作為に選び、(表示用コード, 終値) のリストを返す。
+
+        within を指定すると、その銘柄（市場・業種で絞り込んだ一覧など）の中から選ぶ。
+        """
+        return self.index.sample(count, min_price, max_price, seed=seed, within=within)
+
+    def updated(self, remove: Iterable[str] = (), added: Optional["MarketSnapshot"] = None) -> "MarketSnapshot":
+        """remove の銘柄を除き、added の銘柄を末尾に加えた同じ取引日のスナップショットを返す。"""
+        keep = ~np.isin(self.codes, list(remove))
+        codes, closes = self.codes[keep], self.closes[keep]
+        if added is not None:
+            codes = np.concatenate([codes, added.codes])
+            closes = np.concatenate([closes, added.closes])
+        return MarketSnapshot(self.trading_date, codes, closes)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            codes=self.codes,
+            closes=self.closes,
+            trading_date=np.array(self.trading_date),
+            created_at=np.array(self.created_at),
+        )
+        # 書きかけのファイルを他プロセスが読まないよう置き換えで反映する
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MarketSnapshot":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                str(data["trading_date"]),
+                data["codes"],
+                data["closes"],
+                float(data["created_at"]),
+            )
+
+
+def build_snapshot(
+    codes: List[str],
+    price_source: Optional[PriceSource] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 4,
+    rate_limit: Optional[float] = None,
+    trading_date: Optional[str] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> MarketSnapshot:
+    """全銘柄の終値をバッチ取得してスナップショットを作る。on_progress(取得済み件数, 全件数)。
+
+    取引時間中は取得できる価格が直近の取引日の終値ではないため、MarketOpenError を送出する
+    （取得中に寄り付きを過ぎた場合も同様）。
+    """
+    if is_market_open():
+        raise MarketOpenError("取引時間中はスナップショットを作成できません（大引け後に作成してください）")
+    trading_date = trading_date or current_trading_date()
+    closes = np.full(len(codes), np.nan)
+    done = 0
+    for chunk, prices in iter_price_chunks(codes, price_source, batch_size, workers, rate_limit):
+        closes[done:done + len(chunk)] = prices
+        done += len(chunk)
+        if on_progress is not None:
+            on_progress(done, len(codes))
+    if is_market_open():
+        raise MarketOpenError("取得中に取引が始まったため、スナップショットを保存しませんでした")
+    return MarketSnapshot(trading_date, np.array(codes, dtype=str), closes)
+
+
+def _default_snapshot_dir() -> str:
+    default = os.path.join(os.path.expanduser("~"), ".cache", "stock-scrayping", "snapshots")
+    return os.getenv("STOCK_SNAPSHOT_DIR", default)
+
+
+class SnapshotStore:
+    """取引日ごとのスナップショットをメモリとディスク（.npz）で保持する。"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or _default_snapshot_dir()
+        self._memory: Dict[str, MarketSnapshot] = {}
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+
+    def path_for(self, trading_date: str) -> str:
+        return os.path.join(self.directory, f"{trading_date}.npz")
+
+    def get(self, trading_date: Optional[str] = None) -> Optional[MarketSnapshot]:
+        """指定した取引日（省略時は直近）のスナップショットを返す。なければNone。"""
+        trading_date = trading_date or current_trading_date()
+        with self._lock:
+            snapshot = self._memory.get(trading_date)
+        if snapshot is not None:
+            return snapshot
+        try:
+            snapshot = MarketSnapshot.load(self.path_for(trading_date))
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self._memory = {trading_date: snapshot}
+        return snapshot
+
+    def put(self, snapshot: MarketSnapshot) -> None:
+        snapshot.save(self.path_for(snapshot.trading_date))
+        with self._lock:
+            # メモリには最新の取引日の分だけを残す
+            self._memory = {snapshot.trading_date: snapshot}
+
+    def build(self, codes: List[str], **kwargs) -> Optional[MarketSnapshot]:
+        """スナップショットを作成して保存する。同じプロセスで作成中の場合は何もせずNoneを返す。"""
+        if not self._building.acquire(blocking=False):
+            return None
+        try:
+            snapshot = build_snapshot(codes, **kwargs)
+            self.put(snapshot)
+            return snapshot
+        finally:
+            self._building.release()
+
+    @property
+    def is_building(self) -> bool:
+        return self._building.locked()
+
+
+_default_store: Optional[SnapshotStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """プロセス内で共有される既定のスナップショットストアを返す。"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SnapshotStore()
+        return _default_store
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """全銘柄の終値スナップショットを作成する（1取引日に1回、大引け後の実行を想定）。"""
+    from stock_universe_cache import get_stock_codes
+
+    parser = argparse.ArgumentParser(description="全銘柄の終値スナップショットを作成します")
+    parser.add_argument("--workers", type=int, default=4, help="価格取得の並行数")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="1回でまとめて取得する銘柄数")
+    parser.add_argument("--rate-limit", type=float, default=None, help="1秒あたりのリクエスト数の上限")
+    parser.add_argument("--url", default="https://nikkeiyosoku.com/stock/all/", help="銘柄一覧ページのURL")
+    args = parser.parse_args(argv)
+
+    if is_market_open():
+        parser.error("取引時間中はスナップショットを作成できません（大引け後に実行してください）")
+
+    configure_http(pool_size=args.workers + 1)
+    codes = filter_valid_codes(get_stock_codes(args.url))
+    store = get_snapshot_store()
+
+    def on_progress(done: int, total: int) -> None:
+        print(f"\r価格取得中... {done}/{total} 件", end="", file=sys.stderr, flush=True)
+
+    snapshot = store.build(
+        codes, batch_size=args.batch_size, workers=args.workers,
+        rate_limit=args.rate_limit, on_progress=on_progress,
+    )
+    print(file=sys.stderr)
+    print(f"{snapshot.trading_date} のスナップショットを保存しました: "
+          f"{snapshot.priced_count}/{len(snapshot)} 件 ({store.path_for(snapshot.trading_date)})")
+
+
+if __name__ == "__main__":
+    main()
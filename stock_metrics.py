@@ -0,0 +1,245 @@
+import functools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 所要時間のヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+_INF_LABEL = 'le="+Inf"'
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """単調増加するカウンタ（ラベル付き）。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram:
+    """観測値の分布を累積バケットで集計するヒストグラム（ラベル付き）。"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル値 -> (バケットごとの件数, 合計, 件数)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(c), t, n)) for key, (c, t, n) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, _INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """メトリクスの登録先。collector には描画時に値を読み出す関数を登録する。"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, List[str]]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], List[Tuple[str, str, str, List[str]]]]) -> None:
+        """collector() は (名前, 種類, 説明, サンプル行のリスト) のリストを返す。"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式（version 0.0.4）で全メトリクスを出力する。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families = [(m.name, m.kind, m.help, m.samples()) for m in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as exc:
+                print(f"[metrics] collector failed: {exc}")
+
+        lines = []
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.histogram(
+    "stock_span_seconds", "処理区間ごとの所要時間（秒）", labels=("span",)
+)
+PRICE_FETCHES = REGISTRY.counter(
+    "stock_price_fetch_codes_total", "終値の取得を試みた銘柄数（method=batch|latest_close|async_chart, result=ok|failed）",
+    labels=("method", "result"),
+)
+SCREEN_SCANNED = REGISTRY.counter(
+    "stock_screen_scanned_total", "価格条件の判定で確認した銘柄数（source=live|snapshot）", labels=("source",)
+)
+SCREEN_HITS = REGISTRY.counter(
+    "stock_screen_hits_total", "価格条件を満たした銘柄数（source=live|snapshot）", labels=("source",)
+)
+
+
+class SpanRecorder:
+    """1件のジョブ内の区間ごとの所要時間を合計する（ジョブ状態の timings に使う）。"""
+
+    def __init__(self):
+        self._totals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._totals[name] = self._totals.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        """区間名 -> 所要時間（ミリ秒、小数点以下1桁）"""
+        with self._lock:
+            return {name: round(seconds * 1000, 1) for name, seconds in self._totals.items()}
+
+
+def peak_rss_mib(children: bool = False) -> Optional[float]:
+    """このプロセス（children=True なら終了済みの子プロセス）のピークRSS（MiB、取得できなければNone）。"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss は Linux ではKiB、macOS ではバイト単位
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return usage.ru_maxrss / divisor
+
+
+class StageRecorder:
+    """
+    工程ごとのCPU時間（呼び出したスレッド分）と、工程終了時点のピークRSSを記録する。
+    結果は as_dict() で取り出し、別プロセスで計測したものも merge() で合算できる。
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Dict[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.thread_time()
+        try:
+            yield
+        finally:
+            self.merge({name: {"cpu_seconds": time.thread_time() - started, "peak_rss_mib": peak_rss_mib()}})
+
+    def merge(self, stages: Dict[str, Dict[str, Optional[float]]]) -> None:
+        """CPU時間は合計し、ピークRSSは最大値をとる。"""
+        with self._lock:
+            for name, values in stages.items():
+                entry = self._stages.setdefault(name, {"cpu_seconds": 0.0, "peak_rss_mib": None})
+                entry["cpu_seconds"] += values["cpu_seconds"]
+                rss = values.get("peak_rss_mib")
+                if rss is not None:
+                    entry["peak_rss_mib"] = max(entry["peak_rss_mib"] or 0.0, rss)
+
+    def as_dict(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._lock:
+            return {name: dict(values) for name, values in self._stages.items()}
+
+
+@contextmanager
+def span(name: str, recorder: Optional[SpanRecorder] = None) -> Iterator[None]:
+    """区間の所要時間をヒストグラムに記録する（recorder があればそちらにも加算する）。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.observe(elapsed, span=name)
+        if recorder is not None:
+            recorder.add(name, elapsed)
+
+
+def timed(name: str) -> Callable:
+    """関数の所要時間を span として記録するデコレータ。"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
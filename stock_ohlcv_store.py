@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from stock_lazy import lazy_import
+
+# pandas は保存データを読み書きするときに初めて読み込む
+pd = lazy_import("pandas")
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# 空の取得結果でも取得済みとみなす最大日数（週末・祝日のみの区間）
+EMPTY_RANGE_MAX_DAYS = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ohlcv (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume INTEGER,
+    PRIMARY KEY (ticker, date)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    ticker TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_ticker ON coverage (ticker);
+"""
+
+
+class OHLCVStore:
+    """
+    銘柄ごとの日足OHLCVをSQLiteに保存するローカルストア
+
+    取得済みの期間を coverage テーブルに半開区間 [start, end) で記録し、
+    要求期間のうち未取得の区間だけをネットワークから補完できるようにする。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 接続は操作ごとに開くため、スレッドやプロセスをまたいで安全に共有できる
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def covered_ranges(self, ticker: str) -> List[Tuple[str, str]]:
+        """取得済みの区間を開始日順に返す"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT start, end FROM coverage WHERE ticker = ? ORDER BY start",
+                (ticker,),
+            ).fetchall()
+        return [(start, end) for start, end in rows]
+
+    def missing_ranges(self, ticker: str, start_date: str, end_date: str) -> List[Tuple[str, str]]:
+        """
+        要求期間 [start_date, end_date) のうち未取得の区間を返す
+
+        Parameters:
+        ticker (str): ティッカーシンボル（例: "7203.T"）
+        start_date (str): 開始日（YYYY-MM-DD形式）
+        end_date (str): 終了日（YYYY-MM-DD形式、この日を含まない）
+
+        Returns:
+        list: (開始日, 終了日) の半開区間のリスト
+        """
+        missing = []
+        cursor = start_date
+        for covered_start, covered_end in self.covered_ranges(ticker):
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end_date:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+            if cursor >= end_date:
+                break
+        if cursor < end_date:
+            missing.append((cursor, end_date))
+        return missing
+
+    def merge(self, ticker: str, df: Optional["pd.DataFrame"], start_date: str, end_date: str) -> None:
+        """
+        取得したデータを保存し、区間 [start_date, end_date) を取得済みとして記録する
+
+        当日以降はまだ確定していないため取得済みとしては記録しない。
+        空の結果は短い区間（休場日のみ）の場合に限り取得済みとみなす。
+        """
+        rows = []
+        if df is not None and not df.empty:
+            frame = df[OHLCV_COLUMNS]
+            for ts, values in zip(frame.index, frame.itertuples(index=False)):
+                stamp = pd.Timestamp(ts)
+                if stamp.tzinfo is not None:
+                    # UTCオフセットの異なる行（夏時間の前後など）が混在しないよう、現地時刻のみを保存する
+                    stamp = stamp.tz_localize(None)
+                volume = None if pd.isna(values[4]) else int(values[4])
+                rows.append((
+                    ticker, stamp.strftime('%Y-%m-%d'), stamp.isoformat(),
+                    _to_float(values[0]), _to_float(values[1]),
+                    _to_float(values[2]), _to_float(values[3]), volume,
+                ))
+
+        covered_end = min(end_date, datetime.now().strftime('%Y-%m-%d'))
+        span_days = (_parse_date(covered_end) - _parse_date(start_date)).days
+        mark_covered = covered_end > start_date and (rows or span_days <= EMPTY_RANGE_MAX_DAYS)
+
+        with self._lock, self._connect() as conn:
+            if rows:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO ohlcv VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+            if mark_covered:
+                ranges = conn.execute(
+                    "SELECT start, end FROM coverage WHERE ticker = ?", (ticker,)
+                ).fetchall()
+                merged = _coalesce(ranges + [(start_date, covered_end)])
+                conn.execute("DELETE FROM coverage WHERE ticker = ?", (ticker,))
+                conn.executemany(
+                    "INSERT INTO coverage VALUES (?, ?, ?)",
+                    [(ticker, start, end) for start, end in merged],
+                )
+
+    def load(self, ticker: str, start_date: str, end_date: str) -> "pd.DataFrame":
+        """保存済みのデータから期間 [start_date, end_date) を読み出す"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT date, open, high, low, close, volume FROM ohlcv "
+                "WHERE ticker = ? AND date >= ? AND date < ? ORDER BY date",
+                (ticker, start_date, end_date),
+            ).fetchall()
+        df = pd.DataFrame(rows, columns=['Date'] + OHLCV_COLUMNS)
+        # 日足は現地日付で一意に決まるため、ts ではなく date 列から索引を作る
+        # （以前の形式で保存された、オフセットの混在した ts があっても読み込める）
+        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+        return df.set_index('Date')
+
+    def invalidate(self, ticker: str) -> None:
+        """指定ティッカーの保存データと取得済み区間を削除する"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM ohlcv WHERE ticker = ?", (ticker,))
+            conn.execute("DELETE FROM coverage WHERE ticker = ?", (ticker,))
+
+
+def _to_float(value) -> Optional[float]:
+    return None if pd.isna(value) else float(value)
+
+
+def _parse_date(date_string: str) -> datetime:
+    return datetime.strptime(date_string, '%Y-%m-%d')
+
+
+def _coalesce(ranges: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """重なり合う・隣接する区間を結合する"""
+    merged: List[Tuple[str, str]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def default_store_path() -> str:
+    """環境変数 STOCK_OHLCV_STORE で上書きできる既定の保存先"""
+    default = os.path.join(os.path.expanduser('~'), '.cache', 'stock-scrayping', 'ohlcv.sqlite3')
+    return os.getenv('STOCK_OHLCV_STORE', default)
+
+
+_default_store: Optional[OHLCVStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> Optional[OHLCVStore]:
+    """
+    既定のストアを返す
+
+    STOCK_OHLCV_STORE に "off" を指定した場合や、保存先を作成できない場合はNoneを返す。
+    """
+    global _default_store
+    path = default_store_path()
+    if path.strip().lower() in ('', 'off', '0', 'none'):
+        return None
+    with _default_store_lock:
+        if _default_store is None or _default_store.path != path:
+            try:
+                _default_store = OHLCVStore(path)
+            except (OSError, sqlite3.Error) as e:
+                print(f"警告: ローカルストアを利用できません: {e}")
+                return None
+        return _default_store
+
@@ -0,0 +1,221 @@
+import asyncio
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Mapping, Optional, Protocol, Sequence
+
+from stock_fetch_policy import FetchPolicy, ThrottledError, checked_yf_call, get_fetch_policy
+from stock_http import get_yf_session
+from stock_lazy import lazy_import
+
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+
+
+def to_yahoo_ticker(code: str) -> Optional[str]:
+    """銘柄コードの数字部分に.Tを付加してYahoo Financeのティッカーに変換する。"""
+    if not code:
+        return None
+    numeric_part = re.match(r'(\d+)', code)
+    if not numeric_part:
+        return None
+    return f"{numeric_part.group(1)}.T"
+
+
+class PriceSource(Protocol):
+    """銘柄コードのまとまりから直近終値を取得する価格ソースのインターフェース。
+
+    host 属性は接続先ホスト名で、ホスト単位のレート制限に使われる。
+    """
+
+    host: str
+
+    def fetch_closes(self, codes: Sequence[str]) -> Dict[str, Optional[float]]:
+        """各銘柄コードの直近終値を返す。取得できなかった銘柄はNoneとする。"""
+        ...
+
+
+class YFinancePriceSource:
+    """yf.downloadで複数銘柄の終値を1回のリクエストでまとめて取得する。"""
+
+    host = "query2.finance.yahoo.com"
+
+    def __init__(self, period: str = "5d"):
+        self.period = period
+
+    def fetch_closes(self, codes: Sequence[str]) -> Dict[str, Optional[float]]:
+        tickers = {code: to_yahoo_ticker(code) for code in codes}
+        unique_tickers = sorted({t for t in tickers.values() if t})
+        if not unique_tickers:
+            return {code: None for code in codes}
+
+        def download() -> pd.DataFrame:
+            return checked_yf_call(unique_tickers, lambda: yf.download(
+                unique_tickers,
+                period=self.period,
+                group_by="column",
+                auto_adjust=False,
+                prepost=False,
+                threads=False,
+                progress=False,
+                session=get_yf_session(),
+            ))
+
+        try:
+            history = get_fetch_policy().call("batch_download", download)
+        except ThrottledError:
+            history = None
+        if history is None:
+            return {code: None for code in codes}
+
+        latest = _latest_closes(history, unique_tickers)
+        return {code: latest.get(ticker) if ticker else None for code, ticker in tickers.items()}
+
+
+def _latest_closes(history: "pd.DataFrame", tickers: Sequence[str]) -> Dict[str, float]:
+    """yf.downloadの結果からティッカーごとの最終有効終値を取り出す。"""
+    if history is None or history.empty or "Close" not in history.columns.get_level_values(0):
+        return {}
+
+    closes = history["Close"]
+    if isinstance(closes, pd.Series):
+        # 単一銘柄の場合は列が平坦になる
+        closes = closes.to_frame(name=tickers[0])
+
+    # 列ごとに前方補完して最終行を取ることで、最後の有効値をまとめて求める
+    last_row = closes.ffill().iloc[-1].dropna()
+    return {str(ticker): float(price) for ticker, price in last_row.items()}
+
+
+class PerCodePriceSource:
+    """1銘柄ずつ取得する関数を価格ソースとして扱うアダプタ。"""
+
+    def __init__(self, fetch: Callable[[str], Optional[float]], host: str = "query2.finance.yahoo.com"):
+        self.fetch = fetch
+        self.host = host
+
+    def fetch_closes(self, codes: Sequence[str]) -> Dict[str, Optional[float]]:
+        return {code: self.fetch(code) for code in codes}
+
+
+class StaticPriceSource:
+    """固定の価格表を返すオフライン用の価格ソース（ベンチマーク・検証用）。"""
+
+    host = "localhost"
+
+    def __init__(self, prices: Mapping[str, float], latency: float = 0.0):
+        self.prices = dict(prices)
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch_closes(self, codes: Sequence[str]) -> Dict[str, Optional[float]]:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {code: self.prices.get(code) for code in codes}
+
+
+class AsyncPriceSource(Protocol):
+    """PriceSource の asyncio 版。"""
+
+    host: str
+
+    async def fetch_closes(self, codes: Sequence[str]) -> Dict[str, Optional[float]]:
+        ...
+
+
+class AsyncYahooChartPriceSource:
+    """
+    httpx.AsyncClient で Yahoo Finance のチャートAPIを銘柄ごとに並行して呼び出す価格ソース。
+
+    1回の fetch_closes の中では最大 concurrency 件のリクエストを同時に送り、
+    すべての取得が終わるまで戻らない（asyncio.TaskGroup による構造化並行処理）。
+    """
+
+    host = "query2.finance.yahoo.com"
+    chart_url = "https://query2.finance.yahoo.com/v8/finance/chart/{ticker}"
+
+    def __init__(self, client: Any, period: str = "5d", concurrency: int = 32,
+                 policy: Optional[FetchPolicy] = None):
+        self.client = client
+        self.period = period
+        self.policy = policy or get_fetch_policy()
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch_close(self, ticker: str) -> Optional[float]:
+        async def request() -> Optional[float]:
+            async with self._semaphore:
+                response = await self.client.get(
+                    self.chart_url.format(ticker=ticker),
+                    params={"range": self.period, "interval": "1d"},
+                )
+            if response.status_code == 429:
+                raise ThrottledError(f"{ticker}: 429 Too Many Requests")
+            if response.status_code == 404:
+                # 上場廃止などで存在しない銘柄
+                return None
+            response.raise_for_status()
+            return _chart_close(response.json())
+
+        try:
+            return await self.policy.acall("async_chart", request, is_empty=lambda close: close is None)
+        except ThrottledError:
+            return None
+
+    async def fetch_closes(self, codes: Sequence[str]) -> Dict[str, Optional[float]]:
+        tickers = {code: to_yahoo_ticker(code) for code in codes}
+        unique_tickers = sorted({t for t in tickers.values() if t})
+        async with asyncio.TaskGroup() as group:
+            tasks = {t: group.create_task(self.fetch_close(t)) for t in unique_tickers}
+        return {code: tasks[ticker].result() if ticker else None for code, ticker in tickers.items()}
+
+
+def _chart_close(payload: Dict[str, Any]) -> Optional[float]:
+    """チャートAPIの応答から最後の有効な終値を取り出す。"""
+    results = (payload.get("chart") or {}).get("result") or []
+    if not results:
+        return None
+    quotes = ((results[0].get("indicators") or {}).get("quote") or [{}])[0]
+    closes = [c for c in quotes.get("close") or [] if c is not None]
+    return float(closes[-1]) if closes else None
+
+
+class RateLimiter:
+    """リクエストの開始間隔を一定以上に保つスレッドセーフなレートリミッタ。"""
+
+    def __init__(self, rate: float):
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float) -> None:
+        if rate <= 0:
+            raise ValueError("rate は正の値を指定してください")
+        self.interval = 1.0 / rate
+
+    def acquire(self) -> None:
+        """次のリクエスト枠まで待機する。"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(host: str, rate: float) -> RateLimiter:
+    """ホストごとに共有されるレートリミッタを返す（1秒あたり rate リクエスト）。"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None:
+            limiter = _rate_limiters[host] = RateLimiter(rate)
+        else:
+            limiter.set_rate(rate)
+        return limiter
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from stock_code_scrayping import LISTING_COLUMNS, CodeUniverse, ListingRow, fetch_listing_page, parse_stock_listing
+from stock_metrics import span
+from stock_universe_history import UniverseDiff, UniverseHistory, apply_universe_diff, get_universe_history
+
+# 鮮度の既定値（秒）。銘柄一覧の更新はおおむね1日1回
+DEFAULT_TTL = 6 * 60 * 60
+# TTL切れ後も古いデータを返しつつ裏で再検証してよい期間（秒）
+DEFAULT_STALE_TTL = 7 * 24 * 60 * 60
+
+_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "stock_codes_cache.json")
+
+
+def _default_cache_dir() -> str:
+    default = os.path.join(os.path.expanduser("~"), ".cache", "stock-scrayping", "universe")
+    return os.getenv("STOCK_UNIVERSE_CACHE_DIR", default)
+
+
+class CodeUniverseCache:
+    """銘柄一覧（コードユニバース）のキャッシュ。
+
+    メモリ上のLRUとディスク上のJSONの2層で保持する。TTL内はネットワークに出ず、
+    TTL切れ後は ETag / Last-Modified による条件付きリクエストで再検証する。
+    stale_ttl の間は古い一覧をすぐに返し、再検証はバックグラウンドで行う。
+    エントリには業種・市場を含む一覧を列ごとに保存し、get_universe で CodeUniverse として返す。
+    history を渡すと、取得した一覧を版として記録し、前の版から変わっていれば
+    差分を on_change に渡す（呼び出しはバックグラウンドのスレッドで行う）。
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        stale_ttl: float = DEFAULT_STALE_TTL,
+        cache_dir: Optional[str] = None,
+        max_entries: int = 8,
+        snapshot_path: Optional[str] = _SNAPSHOT_PATH,
+        history: Optional[UniverseHistory] = None,
+        on_change: Optional[Callable[[UniverseDiff], Any]] = None,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.max_entries = max_entries
+        self.snapshot_path = snapshot_path
+        self.history = history
+        self.on_change = on_change
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: Dict[str, threading.Thread] = {}
+        # URLごとに (元にした一覧の列, CodeUniverse) を保持し、一覧が変わらない間は作り直さない
+        self._universes: Dict[str, Tuple[Dict[str, List[str]], CodeUniverse]] = {}
+        self.stats = {"lookups": 0, "memory_hits": 0, "disk_hits": 0, "stale_hits": 0,
+                      "misses": 0, "not_modified": 0, "refreshes": 0}
+
+    def get_codes(self, url: str) -> List[str]:
+        """URLの銘柄コード一覧を返す。必要に応じて取得・再検証する。"""
+        return self._get_entry(url)["codes"]
+
+    def get_universe(self, url: str) -> CodeUniverse:
+        """URLの銘柄一覧を業種・市場付きの CodeUniverse として返す。"""
+        entry = self._get_entry(url)
+        if "listing" not in entry:
+            # 業種・市場を保存していない以前の形式のエントリは取得し直す
+            try:
+                entry = self.refresh(url)
+            except Exception as exc:
+                print(f"Warning: Failed to fetch stock listing for {url}: {exc}")
+                entry = dict(entry, listing=None)
+        listing = entry["listing"]
+        if listing is None:
+            return CodeUniverse.from_codes(entry["codes"])
+
+        with self._lock:
+            cached = self._universes.get(url)
+        if cached is not None and cached[0] is listing:
+            return cached[1]
+        universe = CodeUniverse.from_columns(listing)
+        with self._lock:
+            self._universes[url] = (listing, universe)
+        return universe
+
+    def _get_entry(self, url: str) -> Dict[str, Any]:
+        self._count("lookups")
+        entry = self._lookup(url)
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age < self.ttl:
+                return entry
+            if age < self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                self._refresh_in_background(url)
+                return entry
+
+        self._count("misses")
+        try:
+            return self.refresh(url)
+        except Exception:
+            # 取得に失敗した場合は古いキャッシュ、最後にリポジトリ同梱のスナップショットを使う
+            if entry is not None:
+                return entry
+            snapshot = self._load_snapshot()
+            if snapshot:
+                return {"url": url, "codes": snapshot, "listing": None}
+            raise
+
+    def refresh(self, url: str) -> Dict[str, Any]:
+        """一覧ページを条件付きで再取得し、キャッシュを更新したエントリを返す。"""
+        entry = self._lookup(url, count=False)
+        # 業種・市場を保存していないエントリは 304 では補えないため、条件を付けずに取得する
+        if entry is not None and "listing" not in entry:
+            entry = None
+        etag = entry.get("etag") if entry else None
+        last_modified = entry.get("last_modified") if entry else None
+
+        response = fetch_listing_page(url, etag=etag, last_modified=last_modified)
+        self._count("refreshes")
+        if response.status_code == 304 and entry is not None:
+            self._count("not_modified")
+            entry = dict(entry, fetched_at=time.time())
+        else:
+            with span("listing_parse"):
+                rows = parse_stock_listing(response.text)
+            self._record_version(url, rows)
+            entry = {
+                "url": url,
+                # REITを除外したコード（parse_stock_codes と同じ）
+                "codes": [code for code, _, _, market in rows if 'REIT' not in market],
+                # 業種・市場を含む一覧（CodeUniverse.from_columns の形式）
+                "listing": {name: [row[i] for row in rows] for i, name in enumerate(LISTING_COLUMNS)},
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        self._store(url, entry)
+        return entry
+
+    def _record_version(self, url: str, rows: List[ListingRow]) -> None:
+        if self.history is None:
+            return
+        try:
+            diff = self.history.record(url, rows)
+        except Exception as exc:
+            print(f"Warning: Failed to record stock listing version for {url}: {exc}")
+            return
+        if diff is None or diff.previous is None:
+            return
+        print(f"銘柄一覧が更新されました (版 {diff.version}): 新規 {len(diff.added)} 件, "
+              f"廃止 {len(diff.removed)} 件, 市場変更 {len(diff.market_changed)} 件")
+        if self.on_change is not None and diff.affected:
+            threading.Thread(target=self._notify_quietly, args=(diff,), daemon=True).start()
+
+    def _notify_quietly(self, diff: UniverseDiff) -> None:
+        try:
+            self.on_change(diff)
+        except Exception as exc:
+            print(f"Warning: Failed to apply stock listing changes (version {diff.version}): {exc}")
+
+    def invalidate(self, url: str) -> None:
+        """メモリとディスクの両方からエントリを削除する。"""
+        with self._lock:
+            self._memory.pop(url, None)
+            self._universes.pop(url, None)
+        try:
+            os.remove(self._disk_path(url))
+        except FileNotFoundError:
+            pass
+
+    def _lookup(self, url: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+                if count:
+                    self.stats["memory_hits"] += 1
+                return entry
+
+        entry = self._read_disk(url)
+        if entry is not None:
+            self._remember(url, entry)
+            if count:
+                self._count("disk_hits")
+        return entry
+
+    def _store(self, url: str, entry: Dict[str, Any]) -> None:
+        self._remember(url, entry)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._disk_path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        # 途中まで書かれたファイルを他プロセスが読まないよう置き換えで反映する
+        os.replace(tmp_path, path)
+
+    def _remember(self, url: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[url] = entry
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._disk_path(url), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or not isinstance(entry.get("codes"), list):
+            return None
+        return entry
+
+    def _disk_path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _load_snapshot(self) -> Optional[List[str]]:
+        if not self.snapshot_path:
+            return None
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                codes = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return [str(code) for code in codes] if isinstance(codes, list) else None
+
+    def _refresh_in_background(self, url: str) -> None:
+        with self._lock:
+            running = self._refreshing.get(url)
+            if running is not None and running.is_alive():
+                return
+            thread = threading.Thread(target=self._refresh_quietly, args=(url,), daemon=True)
+            self._refreshing[url] = thread
+        thread.start()
+
+    def _refresh_quietly(self, url: str) -> None:
+        try:
+            self.refresh(url)
+        except Exception as exc:
+            print(f"Warning: Failed to revalidate stock code cache for {url}: {exc}")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+
+_default_cache: Optional[CodeUniverseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_code_universe_cache() -> CodeUniverseCache:
+    """プロセス内で共有される既定のキャッシュを返す。"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CodeUniverseCache(
+                ttl=float(os.getenv("STOCK_UNIVERSE_TTL", DEFAULT_TTL)),
+                stale_ttl=float(os.getenv("STOCK_UNIVERSE_STALE_TTL", DEFAULT_STALE_TTL)),
+                history=get_universe_history(),
+                # 変わった銘柄の株価データ・スナップショットだけを更新する
+                on_change=apply_universe_diff,
+            )
+        return _default_cache
+
+
+def get_stock_codes(url: str) -> List[str]:
+    """キャッシュ経由で銘柄コード一覧を取得する（scrape_stock_codes の代替）。"""
+    return get_code_universe_cache().get_codes(url)
+
+
+def get_code_universe(url: str) -> CodeUniverse:
+    """キャッシュ経由で業種・市場付きの銘柄一覧を取得する（scrape_stock_universe の代替）。"""
+    return get_code_universe_cache().get_universe(url)
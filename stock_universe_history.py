@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from stock_code_scrayping import ListingRow, filter_valid_codes
+from stock_price_source import PriceSource
+
+# 銘柄ごとの構成を残しておく版の数（それより古い版は差分だけを残す）
+DEFAULT_KEEP_VERSIONS = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    previous INTEGER,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_url ON versions (url, id);
+CREATE TABLE IF NOT EXISTS members (
+    version INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sector TEXT NOT NULL,
+    market TEXT NOT NULL,
+    PRIMARY KEY (version, code)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    old_market TEXT,
+    new_market TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_version ON changes (version);
+"""
+
+
+class UniverseDiff(NamedTuple):
+    """ある版と直前の版との差分。previous が None の場合は最初の版（比較対象なし）。
+
+    added / removed は コード -> 市場、market_changed は コード -> (旧市場, 新市場)。
+    """
+
+    version: int
+    previous: Optional[int]
+    added: Dict[str, str]
+    removed: Dict[str, str]
+    market_changed: Dict[str, Tuple[str, str]]
+
+    @property
+    def affected(self) -> List[str]:
+        """新規上場・上場廃止・市場変更のいずれかに当たる銘柄コード"""
+        return sorted({*self.added, *self.removed, *self.market_changed})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "previous": self.previous,
+            "added": [{"code": code, "market": market} for code, market in sorted(self.added.items())],
+            "removed": [{"code": code, "market": market} for code, market in sorted(self.removed.items())],
+            "market_changed": [
+                {"code": code, "old_market": old, "new_market": new}
+                for code, (old, new) in sorted(self.market_changed.items())
+            ],
+        }
+
+
+def _digest(members: Dict[str, ListingRow]) -> str:
+    payload = json.dumps(sorted(members.values()), ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class UniverseHistory:
+    """取得した銘柄一覧を版として SQLite に保存し、版ごとの差分を記録する。
+
+    内容が前回と同じ一覧は新しい版にしない。判定と追加は書き込みロックの中で行うため、
+    複数のプロセスが同じ一覧を取得しても差分を記録するのは1回だけとなる。
+    """
+
+    def __init__(self, path: str, keep_versions: int = DEFAULT_KEEP_VERSIONS):
+        self.path = path
+        self.keep_versions = keep_versions
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, url: str, rows: List[ListingRow]) -> Optional[UniverseDiff]:
+        """一覧を新しい版として保存し、直前の版との差分を返す（内容が変わっていなければNone）。"""
+        members = {row[0]: tuple(row) for row in rows}
+        digest = _digest(members)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                latest = conn.execute(
+                    "SELECT id, digest FROM versions WHERE url = ? ORDER BY id DESC LIMIT 1", (url,)
+                ).fetchone()
+                if latest is not None and latest["digest"] == digest:
+                    conn.execute("COMMIT")
+                    return None
+
+                previous = latest["id"] if latest is not None else None
+                version = conn.execute(
+                    "INSERT INTO versions (url, digest, previous, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, digest, previous, len(members), time.time()),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO members (version, code, name, sector, market) VALUES (?, ?, ?, ?, ?)",
+                    [(version, *row) for row in members.values()],
+                )
+                diff = UniverseDiff(version, previous, {}, {}, {})
+                if previous is not None:
+                    diff = self._diff_members(conn, version, previous, members)
+                    conn.executemany(
+                        "INSERT INTO changes (version, code, kind, old_market, new_market) VALUES (?, ?, ?, ?, ?)",
+                        [(version, code, "added", None, market) for code, market in diff.added.items()]
+                        + [(version, code, "removed", market, None) for code, market in diff.removed.items()]
+                        + [(version, code, "market_changed", old, new)
+                           for code, (old, new) in diff.market_changed.items()],
+                    )
+                self._prune(conn, url)
+                conn.execute("COMMIT")
+                return diff
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _diff_members(conn: sqlite3.Connection, version: int, previous: int,
+                      members: Dict[str, ListingRow]) -> UniverseDiff:
+        before = {
+            row["code"]: row["market"]
+            for row in conn.execute("SELECT code, market FROM members WHERE version = ?", (previous,))
+        }
+        after = {code: row[3] for code, row in members.items()}
+        return UniverseDiff(
+            version,
+            previous,
+            added={code: market for code, market in after.items() if code not in before},
+            removed={code: market for code, market in before.items() if code not in after},
+            market_changed={
+                code: (before[code], market)
+                for code, market in after.items()
+                if code in before and before[code] != market
+            },
+        )
+
+    def _prune(self, conn: sqlite3.Connection, url: str) -> None:
+        """古い版の銘柄構成を削除する（版の記録と差分は残す）。"""
+        cutoff = conn.execute(
+            "SELECT id FROM versions WHERE url = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (url, self.keep_versions - 1),
+        ).fetchone()
+        if cutoff is not None:
+            conn.execute(
+                "DELETE FROM members WHERE version IN (SELECT id FROM versions WHERE url = ? AND id < ?)",
+                (url, cutoff["id"]),
+            )
+
+    def versions(self, url: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """新しい順に版の一覧（件数と差分の件数を含む）を返す。"""
+        query = (
+            "SELECT v.id AS version, v.url, v.previous, v.size, v.created_at, "
+            "SUM(c.kind = 'added') AS added, SUM(c.kind = 'removed') AS removed, "
+            "SUM(c.kind = 'market_changed') AS market_changed "
+            "FROM versions v LEFT JOIN changes c ON c.version = v.id "
+        )
+        args: List[Any] = []
+        if url is not None:
+            query += "WHERE v.url = ? "
+            args.append(url)
+        query += "GROUP BY v.id ORDER BY v.id DESC LIMIT ?"
+        args.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+        return [
+            {**dict(row), "added": row["added"] or 0, "removed": row["removed"] or 0,
+             "market_changed": row["market_changed"] or 0}
+            for row in rows
+        ]
+
+    def latest_version(self, url: str) -> Optional[int]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(id) AS id FROM versions WHERE url = ?", (url,)).fetchone()
+        return row["id"]
+
+    def diff(self, version: int) -> Optional[UniverseDiff]:
+        """記録済みの版の差分を返す。版が存在しなければNone。"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT previous FROM versions WHERE id = ?", (version,)).fetchone()
+            if row is None:
+                return None
+            changes = conn.execute(
+                "SELECT code, kind, old_market, new_market FROM changes WHERE version = ?", (version,)
+            ).fetchall()
+        diff = UniverseDiff(version, row["previous"], {}, {}, {})
+        for change in changes:
+            if change["kind"] == "added":
+                diff.added[change["code"]] = change["new_market"]
+            elif change["kind"] == "removed":
+                diff.removed[change["code"]] = change["old_market"]
+            else:
+                diff.market_changed[change["code"]] = (change["old_market"], change["new_market"])
+        return diff
+
+
+def apply_universe_diff(
+    diff: UniverseDiff,
+    snapshot_store=None,
+    ohlcv_store=None,
+    price_source: Optional[PriceSource] = None,
+) -> Dict[str, int]:
+    """
+    差分に当たる銘柄だけのキャッシュを更新し、更新した件数を返す。
+
+    - 株価データのストア: 上場廃止・新規上場の銘柄の保存データを削除する
+      （コードが別の会社に再利用された場合に古い履歴を使わないため）。市場変更のみの銘柄は残す
+    - 直近の取引日のスナップショット: 対象外になった銘柄を除き、新たに対象になった銘柄の終値だけを取得して加える
+      （取引時間中は終値が確定していないため、除外のみ行う）
+    最初の版（previous が None）は比較対象がないため何もしない。
+    """
+    from stock_market_snapshot import build_snapshot, get_snapshot_store, is_market_open
+    from stock_ohlcv_store import get_default_store
+
+    stats = {"ohlcv_invalidated": 0, "snapshot_removed": 0, "snapshot_added": 0}
+    if diff.previous is None:
+        return stats
+
+    ohlcv_store = ohlcv_store if ohlcv_store is not None else get_default_store()
+    if ohlcv_store is not None:
+        for code in sorted({*diff.added, *diff.removed}):
+            ohlcv_store.invalidate(f"{code}.T")
+            stats["ohlcv_invalidated"] += 1
+
+    snapshot_store = snapshot_store if snapshot_store is not None else get_snapshot_store()
+    snapshot = snapshot_store.get()
+    if snapshot is not None:
+        # スナップショットの対象は REIT 以外の有効銘柄（市場変更で REIT になった・REIT でなくなった銘柄を含む）
+        entering = dict(diff.added)
+        entering.update({code: new for code, (old, new) in diff.market_changed.items()})
+        leaving = set(diff.removed) | {code for code, market in entering.items() if 'REIT' in market}
+        listed = set(snapshot.codes.tolist())
+        to_add = [code for code in filter_valid_codes(sorted(set(entering) - leaving)) if code not in listed]
+        if is_market_open():
+            # 取引時間中は終値が確定していないため、追加は次回のスナップショット作成に任せる（除外のみ反映する）
+            to_add = []
+        to_remove = leaving & listed
+        if to_add or to_remove:
+            added = (build_snapshot(to_add, price_source=price_source, trading_date=snapshot.trading_date)
+                     if to_add else None)
+            snapshot_store.put(snapshot.updated(remove=to_remove, added=added))
+            stats["snapshot_removed"] = len(to_remove)
+            stats["snapshot_added"] = len(to_add)
+
+    print(f"銘柄一覧の変更を反映しました (版 {diff.version}): 株価データ削除 {stats['ohlcv_invalidated']} 件, "
+          f"スナップショット除外 {stats['snapshot_removed']} 件, 追加 {stats['snapshot_added']} 件")
+    return stats
+
+
+def default_history_path() -> str:
+    """環境変数 STOCK_UNIVERSE_HISTORY で上書きできる既定の保存先"""
+    default = os.path.join(os.path.expanduser("~"), ".cache", "stock-scrayping", "universe.sqlite3")
+    return os.getenv("STOCK_UNIVERSE_HISTORY", default)
+
+
+_default_history: Optional[UniverseHistory] = None
+_default_history_lock = threading.Lock()
+
+
+def get_universe_history() -> Optional[UniverseHistory]:
+    """
+    既定の履歴を返す
+
+    STOCK_UNIVERSE_HISTORY に "off" を指定した場合や、保存先を作成できない場合はNoneを返す。
+    """
+    global _default_history
+    path = default_history_path()
+    if path.strip().lower() in ("", "off", "0", "none"):
+        return None
+    with _default_history_lock:
+        if _default_history is None or _default_history.path != path:
+            try:
+                _default_history = UniverseHistory(path)
+            except (OSError, sqlite3.Error) as exc:
+                print(f"警告: 銘柄一覧の履歴を利用できません: {exc}")
+                return None
+        return _default_history
@@ -1,17 +1,27 @@
+import gzip
+import hashlib
+import json
 import os
 import re
-from flask import Flask, render_template, request, jsonify
-from flask_cors import CORS
 import threading
 import time
-from typing import Dict, Any
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from flask_cors import CORS
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 # 既存のスクレイピング機能をインポート
-from stock_code_scrayping import scrape_stock_codes, filter_valid_codes, select_codes_by_price
+from stock_code_scrayping import ScreenEvent, filter_valid_codes, iter_codes_by_price
+from stock_jobs import JobHandle, JobManager, JobQueueFull, JobStore, ResultCache
+from stock_fetch_policy import get_fetch_policy
+from stock_http import configure_http
+from stock_market_snapshot import current_trading_date, get_snapshot_store, is_market_open, next_market_close
+from stock_metrics import REGISTRY, SCREEN_HITS, SpanRecorder, span
+from stock_universe_cache import get_code_universe, get_code_universe_cache, get_stock_codes
+from stock_universe_history import get_universe_history
 
 app = Flask(__name__)
 
-_default_cors_origins = [
+CORS_ORIGINS = [
     "http://localhost:3000",
     re.compile(r"https://.*\.vercel\.app")
 ]
@@ -27,23 +37,51 @@ if _extra_origins_env:
             pattern = cleaned[len("regex:"):].strip()
             if pattern:
                 try:
-                    _default_cors_origins.append(re.compile(pattern))
+                    CORS_ORIGINS.append(re.compile(pattern))
                 except re.error:
                     print(f"[CORS] Invalid regex pattern ignored: {pattern}")
         else:
-            _default_cors_origins.append(cleaned)
+            CORS_ORIGINS.append(cleaned)
 
 cors_resources = {
     r"/api/*": {
-        "origins": _default_cors_origins,
-        "supports_credentials": True
+        "origins": CORS_ORIGINS,
+        "supports_credentials": True,
+        # 条件付きリクエスト（If-None-Match）のためにフロントエンドからETagを読めるようにする
+        "expose_headers": ["ETag"]
     }
 }
 
 CORS(app, resources=cors_resources)
 
-# グローバル変数でスクレイピングの状態を管理
-scraping_status: Dict[str, Any] = {
+# 価格取得の並行数とホスト単位のレート制限（1秒あたりのリクエスト数、未設定なら無制限）
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "4"))
+_rate_limit_env = os.getenv("SCRAPE_RATE_LIMIT", "").strip()
+SCRAPE_RATE_LIMIT = float(_rate_limit_env) if _rate_limit_env else None
+
+# ジョブの同時実行数と、実行待ちにできるジョブ数の上限
+SCRAPE_JOB_WORKERS = int(os.getenv("SCRAPE_JOB_WORKERS", "2"))
+SCRAPE_JOB_QUEUE = int(os.getenv("SCRAPE_JOB_QUEUE", "16"))
+
+# 同時に価格を取得するスレッド数（ジョブ数 x 並行数）に合わせて、共有HTTPセッションの接続プールを広げる
+configure_http(pool_size=SCRAPE_JOB_WORKERS * SCRAPE_WORKERS + 1)
+
+# ジョブの状態はSQLiteに保存し、gunicornの複数ワーカー間で共有する
+_default_job_db = os.path.join(os.path.expanduser("~"), ".cache", "stock-scrayping", "jobs.sqlite3")
+job_store = JobStore(os.getenv("SCRAPE_JOB_DB", _default_job_db))
+
+# 同じ条件の抽出結果を再利用するキャッシュ（同じ取引日の間、次の大引けまで有効）
+result_cache = ResultCache(int(os.getenv("SCRAPE_RESULT_CACHE_SIZE", "128")))
+
+# 銘柄一覧ページのURL
+LISTING_URL = "https://nikkeiyosoku.com/stock/all/"
+
+# SSEでジョブの状態を確認する間隔と、接続維持用コメントを送る間隔（秒）
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "0.5"))
+SSE_HEARTBEAT = 15.0
+
+# ジョブが1件もないときに返す状態
+IDLE_STATUS: Dict[str, Any] = {
     "is_running": False,
     "progress": 0,
     "status_message": "準備完了",
@@ -51,112 +89,534 @@ scraping_status: Dict[str, Any] = {
     "error": None
 }
 
+# これより小さい応答は圧縮しない（バイト）
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+# /api/status で cursor / limit を指定したときに1回で返す結果件数の上限
+STATUS_PAGE_MAX = 1000
+
+JOBS_BY_PATH = REGISTRY.counter(
+    "stock_scrape_jobs_total", "実行したスクレイピングジョブ数（path=snapshot|live）", labels=("path",)
+)
+
+def _collect_runtime_metrics():
+    """/metrics の描画時に、キャッシュと取得ポリシーの集計を読み出す"""
+    cache_stats = dict(get_code_universe_cache().stats)
+    lookups = cache_stats["lookups"]
+    hits = lookups - cache_stats["misses"]
+    
+    policy = get_fetch_policy()
+    fetch_stats = policy.stats.snapshot()
+    outcomes = ("success", "empty", "throttled", "error")
+    
+    return [
+        ("stock_universe_cache_events_total", "counter", "銘柄一覧キャッシュの参照結果",
+         [f'stock_universe_cache_events_total{{event="{k}"}} {v}' for k, v in sorted(cache_stats.items())]),
+        ("stock_universe_cache_hit_ratio", "gauge", "銘柄一覧キャッシュのヒット率（期限切れの再利用を含む）",
+         [f"stock_universe_cache_hit_ratio {hits / lookups if lookups else 0.0}"]),
+        ("stock_fetch_attempts_total", "counter", "取得方法ごとの試行回数（outcome=success|empty|throttled|error）",
+         [f'stock_fetch_attempts_total{{method="{m}",outcome="{o}"}} {int(st[o])}'
+          for m, st in sorted(fetch_stats.items()) for o in outcomes]),
+        ("stock_fetch_seconds_total", "counter", "取得方法ごとの所要時間の合計（秒）",
+         [f'stock_fetch_seconds_total{{method="{m}"}} {st["seconds"]}' for m, st in sorted(fetch_stats.items())]),
+        ("stock_circuit_breaker_trips_total", "counter", "スロットリングにより取得を一時停止した回数",
+         [f"stock_circuit_breaker_trips_total {policy.breaker.trips}"]),
+        ("stock_result_cache_lookups_total", "counter", "抽出結果キャッシュの参照結果（result=hit|miss）",
+         [f'stock_result_cache_lookups_total{{result="hit"}} {result_cache.stats["hits"]}',
+          f'stock_result_cache_lookups_total{{result="miss"}} {result_cache.stats["misses"]}']),
+        ("stock_snapshot_available", "gauge", "直近の取引日の全銘柄スナップショットがあれば1",
+         [f"stock_snapshot_available {int(get_snapshot_store().get() is not None)}"]),
+    ]
+
+REGISTRY.add_collector(_collect_runtime_metrics)
+
 @app.route('/')
 def index():
     """メインページを表示"""
     return render_template('index.html')
 
+def _parse_name_list(value: Any) -> Optional[List[str]]:
+    """市場・業種の指定（リストまたはカンマ区切りの文字列）を重複のない並び順のリストにする"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError("入力値が無効です")
+    names = sorted({v.strip() for v in value if v.strip()})
+    return names or None
+
+def parse_scrape_params(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """リクエストボディを検証してジョブのパラメータに変換する（不正な場合はValueError）"""
+    if not isinstance(data, dict):
+        raise ValueError("入力値が無効です")
+    try:
+        count = int(data.get('count', 30))
+        min_price = float(data.get('min_price', 100))
+        max_price = float(data.get('max_price', 500))
+        seed = data.get('seed')
+        seed = int(seed) if seed is not None else None
+        markets = _parse_name_list(data.get('markets'))
+        sectors = _parse_name_list(data.get('sectors'))
+    except (ValueError, TypeError):
+        raise ValueError("入力値が無効です")
+    
+    if count <= 0:
+        raise ValueError("抽出銘柄数は正の整数を入力してください")
+    
+    if min_price > max_price:
+        raise ValueError("終値の下限は上限以下である必要があります")
+    
+    params = {"count": count, "min_price": min_price, "max_price": max_price, "seed": seed}
+    # 絞り込みがない場合は以前と同じキーになるよう、指定があるときだけ含める
+    if markets:
+        params["markets"] = markets
+    if sectors:
+        params["sectors"] = sectors
+    return params
+
+def is_degraded_run(last: Optional[ScreenEvent], count: int) -> bool:
+    """
+    件数に届かなかった抽出が、取得失敗や打ち切りによるものか（結果を再利用してはいけないか）を判定する
+    
+    全銘柄を確認し、取得失敗もなく件数に届かなかった場合は条件に合う銘柄が少ないだけなので正常とみなす
+    """
+    if last is None:
+        return True
+    if last.hits >= count:
+        return False
+    return last.scanned < last.total or last.failures > 0
+
+def find_cached_result(params: Dict[str, Any]) -> Optional[str]:
+    """同じ条件・同じ取引日の完了済みジョブのIDを返す（他のワーカーが完了したものも含む）"""
+    job_id = result_cache.get(params)
+    if job_id is None:
+        job_id = job_store.find_completed(params)
+        if job_id is not None:
+            result_cache.put(params, job_id, next_market_close())
+    return job_id
+
 @app.route('/api/scrape', methods=['POST'])
+@app.route('/api/jobs', methods=['POST'])
 def start_scraping():
-    """スクレイピングを開始するAPI"""
-    global scraping_status
+    """
+    スクレイピングを開始するAPI
     
-    if scraping_status["is_running"]:
-        return jsonify({"error": "スクレイピングは既に実行中です"}), 400
+    同じ条件の結果が同じ取引日のうちにあればそのジョブを返し（"refresh": true で無視）、
+    同じ条件の実行中ジョブがあればそれに合流する
+    """
+    data = request.get_json(silent=True)
+    try:
+        params = parse_scrape_params(data)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    params["trading_date"] = current_trading_date()
+    
+    if data.get('refresh'):
+        result_cache.invalidate(params)
+    else:
+        job_id = find_cached_result(params)
+        if job_id is not None:
+            return jsonify({
+                "message": "同じ条件の抽出結果を再利用しました",
+                "job_id": job_id,
+                "coalesced": False,
+                "cached": True
+            })
     
     try:
-        data = request.get_json()
-        count = int(data.get('count', 30))
-        min_price = float(data.get('min_price', 100))
-        max_price = float(data.get('max_price', 500))
+        job_id, coalesced = job_manager.submit(params)
+    except JobQueueFull as exc:
+        return jsonify({"error": str(exc)}), 429
+    
+    message = "実行中の同じ条件のスクレイピングに合流しました" if coalesced else "スクレイピングを開始しました"
+    return jsonify({"message": message, "job_id": job_id, "coalesced": coalesced, "cached": False})
+
+@app.route('/api/jobs')
+def list_jobs():
+    """最近のジョブの一覧を取得するAPI"""
+    limit = request.args.get('limit', default=20, type=int)
+    return jsonify({"jobs": job_store.list_jobs(max(1, min(limit, 100)))})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id: str):
+    """ジョブごとの状態と結果を取得するAPI"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "ジョブが見つかりません"}), 404
+    return jsonify(job)
+
+def sse_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Server-Sent Eventsの1イベント分の文字列を作る"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+def stream_job_events(job_id: str, next_seq: int = 0):
+    """
+    ジョブの進行状況の差分と新しい結果をSSEで送り続けるジェネレータ
+    
+    progress: 状態が変わったときのみ（結果一覧は含まない）
+    result:   見つかった銘柄1件ごと（idは結果の連番で、再接続時の Last-Event-ID に使われる）
+    done:     ジョブ終了時に1回
+    """
+    last_state = None
+    last_heartbeat = time.monotonic()
+    while True:
+        job = job_store.get_summary(job_id)
+        if job is None:
+            yield sse_event("error", {"error": "ジョブが見つかりません"})
+            return
         
-        if count <= 0:
-            return jsonify({"error": "抽出銘柄数は正の整数を入力してください"}), 400
+        for row in job_store.results_since(job_id, next_seq):
+            yield sse_event("result", {"code": row["code"], "price": row["price"]}, event_id=row["seq"])
+            next_seq = row["seq"] + 1
         
-        if min_price > max_price:
-            return jsonify({"error": "終値の下限は上限以下である必要があります"}), 400
-            
-    except (ValueError, TypeError):
-        return jsonify({"error": "入力値が無効です"}), 400
+        state = (job["state"], job["progress"], job["status_message"], job["error"])
+        if state != last_state:
+            last_state = state
+            yield sse_event("progress", {key: job[key] for key in (
+                "job_id", "state", "is_running", "progress", "status_message", "error", "result_count"
+            )})
+        
+        if not job["is_running"]:
+            yield sse_event("done", {"job_id": job_id, "state": job["state"], "result_count": job["result_count"]})
+            return
+        
+        if time.monotonic() - last_heartbeat >= SSE_HEARTBEAT:
+            # 中継サーバーに接続を切られないようコメント行を送る
+            last_heartbeat = time.monotonic()
+            yield ": keep-alive\n\n"
+        time.sleep(SSE_POLL_INTERVAL)
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id: str):
+    """ジョブの進行状況と結果をServer-Sent Eventsで配信するAPI"""
+    if job_store.get_summary(job_id) is None:
+        return jsonify({"error": "ジョブが見つかりません"}), 404
+    
+    # 再接続時は最後に受け取った結果の次から送る
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    next_seq = int(last_event_id) + 1 if last_event_id.isdigit() else 0
     
-    # バックグラウンドでスクレイピングを実行
-    thread = threading.Thread(
-        target=scrape_in_background,
-        args=(count, min_price, max_price),
-        daemon=True
+    return Response(
+        stream_with_context(stream_job_events(job_id, next_seq)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
     )
-    thread.start()
+
+@app.route('/metrics')
+def metrics():
+    """Prometheusのテキスト形式でメトリクスを返す（値はこのプロセス内の集計）"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Accept-Encoding を 符号化方式 -> q値 の辞書にする"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+def compress_body(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """
+    Accept-Encoding に応じて本文を圧縮し、(本文, Content-Encoding) を返す
     
-    return jsonify({"message": "スクレイピングを開始しました"})
+    brotli パッケージがあれば br、なければ gzip を使う。小さい本文は圧縮しない
+    """
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    accepted = _accepted_encodings(accept_encoding)
+    fallback = accepted.get('*', 0.0)
+    if accepted.get('br', fallback) > 0:
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        if brotli is not None:
+            return brotli.compress(body, quality=5), 'br'
+    if accepted.get('gzip', fallback) > 0:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match に etag が含まれるか（弱い比較）"""
+    tags = [tag.strip() for tag in if_none_match.split(',') if tag.strip()]
+    return '*' in tags or any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in tags)
+
+def parse_status_query(args: Mapping[str, str]) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+    """/api/status のクエリを (job_id, cursor, limit) に変換する（不正な場合はValueError）"""
+    try:
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        limit = int(args['limit']) if args.get('limit') else None
+    except ValueError:
+        raise ValueError("入力値が無効です")
+    if (cursor is not None and cursor < 0) or (limit is not None and limit <= 0):
+        raise ValueError("入力値が無効です")
+    if limit is not None:
+        limit = min(limit, STATUS_PAGE_MAX)
+    return args.get('job_id') or None, cursor, limit
+
+def load_status(job_id: Optional[str], cursor: Optional[int] = None, limit: Optional[int] = None,
+                if_none_match: str = "") -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+    """
+    /api/status の (HTTPステータス, 本文, ETag) を返す（変化がなければ本文はNoneで304）
+    
+    ETag はジョブの更新時刻と結果件数から作るため、変化のない問い合わせでは結果を読み出さない。
+    cursor / limit を指定すると results は連番 cursor 以降（最大 limit 件）だけになる。
+    いずれの場合も次回の cursor に渡す next_cursor を含む
+    """
+    job_id = job_id or job_store.latest_id()
+    summary = job_store.get_summary(job_id) if job_id is not None else None
+    if job_id is not None and summary is None:
+        return 404, {"error": "ジョブが見つかりません"}, None
+    
+    version = f"{job_id}:{summary['updated_at']!r}:{summary['result_count']}" if summary else "idle"
+    digest = hashlib.sha1(f"{version}:{cursor}:{limit}".encode('utf-8')).hexdigest()[:20]
+    etag = f'W/"{digest}"'
+    if etag_matches(if_none_match, etag):
+        return 304, None, etag
+    
+    if summary is None:
+        return 200, dict(IDLE_STATUS, next_cursor=0), etag
+    if cursor is None and limit is None:
+        # 従来どおり全件を返す（ScrapingStatus と同じ形）
+        body = job_store.get(job_id) or dict(summary, results=[])
+        body["next_cursor"] = len(body["results"])
+        return 200, body, etag
+    
+    start = cursor or 0
+    rows = job_store.results_since(job_id, start, limit)
+    body = dict(summary, results=[{"code": row["code"], "price": row["price"]} for row in rows])
+    body["next_cursor"] = rows[-1]["seq"] + 1 if rows else start
+    body["has_more"] = body["next_cursor"] < summary["result_count"]
+    return 200, body, etag
 
 @app.route('/api/status')
 def get_status():
-    """スクレイピングの状態を取得するAPI"""
-    return jsonify(scraping_status)
+    """
+    スクレイピングの状態を取得するAPI（job_id省略時は最新のジョブ）
+    
+    If-None-Match が現在のETagと一致すれば304を返す。cursor（と limit）を指定すると
+    その連番以降の結果だけを返し、応答は Accept-Encoding に応じて圧縮する
+    """
+    try:
+        job_id, cursor, limit = parse_status_query(request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    status, body, etag = load_status(job_id, cursor, limit, request.headers.get('If-None-Match', ''))
+    
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+    if body is None:
+        return Response(status=304, headers=headers)
+    data, encoding = compress_body(app.json.dumps(body).encode('utf-8'), request.headers.get('Accept-Encoding', ''))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(data, status=status, headers=headers, mimetype='application/json')
+
+def snapshot_info() -> Dict[str, Any]:
+    """直近の取引日のスナップショットの有無と概要"""
+    store = get_snapshot_store()
+    trading_date = current_trading_date()
+    snapshot = store.get(trading_date)
+    info: Dict[str, Any] = {
+        "trading_date": trading_date,
+        "available": snapshot is not None,
+        "is_building": store.is_building,
+    }
+    if snapshot is not None:
+        info.update(
+            total=len(snapshot),
+            priced=snapshot.priced_count,
+            created_at=snapshot.created_at,
+        )
+    return info
+
+def universe_info() -> Dict[str, Any]:
+    """有効銘柄の件数と、絞り込みに使える市場・業種ごとの件数"""
+    universe = get_code_universe(LISTING_URL)
+    history = get_universe_history()
+    return {
+        "version": history.latest_version(LISTING_URL) if history is not None else None,
+        "total": int(universe.mask().sum()),
+        "markets": universe.counts("market"),
+        "sectors": universe.counts("sector"),
+    }
+
+@app.route('/api/universe', methods=['GET'])
+def code_universe():
+    """抽出対象の銘柄一覧の概要を返すAPI（markets / sectors に指定できる値と件数）"""
+    try:
+        return jsonify(universe_info())
+    except Exception as exc:
+        return jsonify({"error": f"銘柄一覧の取得に失敗しました: {str(exc)}"}), 502
+
+def parse_versions_limit(value: Optional[str]) -> int:
+    """版の一覧の件数指定（1〜200、省略時は20）"""
+    try:
+        return min(max(int(value), 1), 200) if value else 20
+    except ValueError:
+        return 20
 
-def scrape_in_background(count: int, min_price: float, max_price: float):
-    """バックグラウンドでスクレイピングを実行"""
-    global scraping_status
+@app.route('/api/universe/versions', methods=['GET'])
+def list_universe_versions():
+    """銘柄一覧の版を新しい順に返すAPI（新規上場・上場廃止・市場変更の件数を含む）"""
+    history = get_universe_history()
+    if history is None:
+        return jsonify({"error": "銘柄一覧の履歴は無効です"}), 404
+    limit = parse_versions_limit(request.args.get('limit'))
+    return jsonify({"versions": history.versions(LISTING_URL, limit=limit)})
+
+@app.route('/api/universe/versions/<int:version>', methods=['GET'])
+def get_universe_diff(version: int):
+    """指定した版と直前の版との差分（added / removed / market_changed）を返すAPI"""
+    history = get_universe_history()
+    diff = history.diff(version) if history is not None else None
+    if diff is None:
+        return jsonify({"error": "指定した版が見つかりません"}), 404
+    return jsonify(diff.as_dict())
+
+def build_snapshot_in_background():
+    """バックグラウンドで全銘柄のスナップショットを作成"""
+    try:
+        valid_codes = filter_valid_codes(get_stock_codes(LISTING_URL))
+        get_snapshot_store().build(valid_codes, workers=SCRAPE_WORKERS, rate_limit=SCRAPE_RATE_LIMIT)
+    except Exception as exc:
+        print(f"[snapshot] スナップショットの作成に失敗しました: {exc}")
+
+@app.route('/api/snapshot', methods=['GET', 'POST'])
+def market_snapshot():
+    """スナップショットの状態を取得する（POSTの場合は作成を開始する）API"""
+    if request.method == 'POST':
+        if get_snapshot_store().is_building:
+            return jsonify({"message": "スナップショットは作成中です", **snapshot_info()}), 409
+        if is_market_open():
+            return jsonify({"message": "取引時間中はスナップショットを作成できません（大引け後に作成してください）",
+                            **snapshot_info()}), 409
+        threading.Thread(target=build_snapshot_in_background, daemon=True).start()
+        return jsonify({"message": "スナップショットの作成を開始しました", **snapshot_info()}), 202
+    return jsonify(snapshot_info())
+
+def scrape_in_background(job: JobHandle, count: int, min_price: float, max_price: float,
+                         seed: Optional[int] = None, trading_date: Optional[str] = None,
+                         markets: Optional[List[str]] = None, sectors: Optional[List[str]] = None):
+    """
+    バックグラウンドでスクレイピングを実行（区間ごとの所要時間はジョブの timings に記録する）
+    
+    markets / sectors を指定すると、価格を取得する前に市場・業種で対象銘柄を絞り込む
+    """
+    timings = SpanRecorder()
+    filtered = bool(markets or sectors)
     
-    scraping_status.update({
-        "is_running": True,
-        "progress": 0,
-        "status_message": "銘柄コードを取得中...",
-        "results": [],
-        "error": None
-    })
+    # 取引日（省略時は直近）のスナップショットがあれば、ネットワークに出ずにその場で抽出する
+    with span("snapshot_lookup", timings):
+        snapshot = get_snapshot_store().get(trading_date)
+    if snapshot is not None:
+        JOBS_BY_PATH.inc(path="snapshot")
+        with span("snapshot_screen", timings):
+            within = get_code_universe(LISTING_URL).select(markets, sectors) if filtered else None
+            results = snapshot.screen(count, min_price, max_price, seed=seed, within=within)
+        SCREEN_HITS.inc(len(results), source="snapshot")
+        job.add_results(results)
+        job.update(
+            state="done",
+            progress=100,
+            status_message=(
+                f"{len(results)} 件の銘柄を抽出完了 "
+                f"(スナップショット {snapshot.trading_date}, 有効銘柄: {len(snapshot)} 件)"
+            ),
+            error=None,
+            timings=timings.as_dict()
+        )
+        return
     
-    url = "https://nikkeiyosoku.com/stock/all/"
+    JOBS_BY_PATH.inc(path="live")
+    job.update(progress=0, status_message="銘柄コードを取得中...")
     
     try:
-        # 銘柄コードの取得
-        scraping_status["status_message"] = "銘柄コードをスクレイピング中..."
-        scraping_status["progress"] = 20
+        # 銘柄コードの取得（キャッシュが新しければページの取得・解析は行わない）
+        job.update(progress=20, status_message="銘柄コードをスクレイピング中...")
         
-        codes = scrape_stock_codes(url)
-        valid_codes = filter_valid_codes(codes)
+        with span("code_universe", timings):
+            universe = get_code_universe(LISTING_URL)
+        with span("filter_codes", timings):
+            valid_codes = universe.select(markets, sectors)
         
         if not valid_codes:
-            scraping_status.update({
-                "is_running": False,
-                "error": "有効な銘柄コードが見つかりませんでした",
-                "status_message": "エラーが発生しました"
-            })
+            job.update(
+                state="error",
+                error="条件に合う銘柄が見つかりませんでした" if filtered else "有効な銘柄コードが見つかりませんでした",
+                status_message="エラーが発生しました",
+                timings=timings.as_dict()
+            )
             return
         
-        scraping_status["progress"] = 50
-        scraping_status["status_message"] = f"価格情報を取得中... (有効銘柄: {len(valid_codes)} 件)"
+        job.update(progress=50, status_message=f"価格情報を取得中... (有効銘柄: {len(valid_codes)} 件)")
         
-        # 価格条件に基づく銘柄の選択
-        results = select_codes_by_price(valid_codes, count, min_price, max_price)
+        # 価格条件に基づく銘柄の選択（見つかった銘柄はその場で結果に追加する）
+        # price_screen は価格取得を含む全体、job_store_write はそのうち結果・進捗の書き込み分
+        found = 0
+        last = None
+        with span("price_screen", timings):
+            for event in iter_codes_by_price(
+                valid_codes, count, min_price, max_price,
+                workers=SCRAPE_WORKERS, rate_limit=SCRAPE_RATE_LIMIT, seed=seed
+            ):
+                last = event
+                with span("job_store_write", timings):
+                    if event.code is not None:
+                        found = event.hits
+                        job.add_results([(str(event.code), float(event.price))])
+                    
+                    # 一致数と確認済み銘柄数のうち、より進んでいる方を実際の進捗とする
+                    ratio = max(event.hits / count, event.scanned / max(event.total, 1))
+                    job.update(
+                        progress=50 + int(49 * ratio),
+                        status_message=(
+                            f"価格情報を取得中... ({event.scanned}/{event.total} 件確認, "
+                            f"{event.hits} 件一致, 取得失敗 {event.failures} 件)"
+                        )
+                    )
         
-        # 結果を安全にJSONシリアライズできる形式に変換
-        json_results = []
-        for code, price in results:
-            try:
-                # 銘柄コードと価格を文字列として安全に処理
-                safe_code = str(code) if code else ""
-                safe_price = float(price) if price is not None else 0.0
-                json_results.append({"code": safe_code, "price": safe_price})
-            except (ValueError, TypeError) as e:
-                print(f"Warning: Failed to process result {code}, {price}: {e}")
-                continue
-        
-        scraping_status.update({
-            "is_running": False,
-            "progress": 100,
-            "status_message": f"{len(json_results)} 件の銘柄を抽出完了 (有効銘柄: {len(valid_codes)} 件)",
-            "results": json_results,
-            "error": None
-        })
+        job.update(
+            state="done",
+            progress=100,
+            status_message=f"{found} 件の銘柄を抽出完了 (有効銘柄: {len(valid_codes)} 件)",
+            error=None,
+            timings=timings.as_dict(),
+            degraded=is_degraded_run(last, count)
+        )
         
     except Exception as exc:
-        scraping_status.update({
-            "is_running": False,
-            "error": f"スクレイピングに失敗しました: {str(exc)}",
-            "status_message": "エラーが発生しました",
-            "progress": 0
-        })
+        job.update(
+            state="error",
+            error=f"スクレイピングに失敗しました: {str(exc)}",
+            status_message="エラーが発生しました",
+            progress=0,
+            timings=timings.as_dict()
+        )
+
+job_manager = JobManager(
+    job_store,
+    lambda job, params: scrape_in_background(job, **params),
+    max_workers=SCRAPE_JOB_WORKERS,
+    max_pending=SCRAPE_JOB_QUEUE
+)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# リポジトリ直下のモジュール（stock_*.py）と、ベンチマーク用の合成市場（benchmarks/fake_market.py）を読み込めるようにする
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
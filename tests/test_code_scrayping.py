@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+import yfinance as yf
+
+from stock_code_scrayping import fetch_latest_close
+
+
+class _FrameTicker:
+    def __init__(self, frame):
+        self.frame = frame
+
+    def history(self, **kwargs):
+        return self.frame
+
+
+@pytest.mark.parametrize("frame", [
+    pd.DataFrame({"Open": [100.0]}),
+    pd.DataFrame({"Open": [100.0, 101.0], "Close": [np.nan, np.nan]}),
+])
+def test_fetch_latest_close_treats_malformed_frame_as_no_price(monkeypatch, frame):
+    monkeypatch.setattr(yf, "Ticker", lambda ticker, session=None: _FrameTicker(frame))
+    monkeypatch.setattr(yf, "download", lambda *args, **kwargs: frame)
+    assert fetch_latest_close("7203") is None
@@ -0,0 +1,38 @@
+import pytest
+
+import stock_data_fetcher
+from fake_market import FakeMarket
+from stock_data_fetcher import load_history
+from stock_fetch_policy import FetchFailedError, FetchPolicy
+from stock_ohlcv_store import OHLCVStore
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    policy = FetchPolicy(base_delay=0.0)
+    monkeypatch.setattr(stock_data_fetcher, "get_fetch_policy", lambda: policy)
+    return policy
+
+
+def test_failed_fetch_is_retried_on_next_load(tmp_path, policy):
+    store = OHLCVStore(str(tmp_path / "ohlcv.sqlite3"))
+    market = FakeMarket(failure_rate=1.0)
+    with market.install():
+        with pytest.raises(FetchFailedError):
+            load_history("7203.T", "2024-06-03", "2024-06-08", store=store)
+        # 失敗した区間は取得済みとして記録しない
+        assert store.missing_ranges("7203.T", "2024-06-03", "2024-06-08") == [("2024-06-03", "2024-06-08")]
+
+        market.failure_rate = 0.0
+        df = load_history("7203.T", "2024-06-03", "2024-06-08", store=store)
+    assert len(df) == 5
+    assert store.missing_ranges("7203.T", "2024-06-03", "2024-06-08") == []
+
+
+def test_empty_short_range_is_recorded_as_covered(tmp_path, policy):
+    store = OHLCVStore(str(tmp_path / "ohlcv.sqlite3"))
+    with FakeMarket().install():
+        # 土日のみの区間はデータがなくても取得済みとする
+        df = load_history("7203.T", "2024-06-08", "2024-06-10", store=store)
+    assert df.empty
+    assert store.missing_ranges("7203.T", "2024-06-08", "2024-06-10") == []
@@ -0,0 +1,26 @@
+import pytest
+
+from stock_fetch_policy import FetchPolicy
+
+
+def _failing(exc):
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise exc
+    return func, calls
+
+
+@pytest.mark.parametrize("exc, attempts", [
+    (ConnectionError("Connection reset by peer"), 3),
+    (TimeoutError("timed out"), 3),
+    (KeyError("Close"), 1),
+    (ValueError("No data found, symbol may be delisted"), 1),
+])
+def test_call_retries_only_transient_errors(exc, attempts):
+    policy = FetchPolicy(max_attempts=3, base_delay=0.0)
+    func, calls = _failing(exc)
+    assert policy.call("history", func) is None
+    assert len(calls) == attempts
+    assert policy.stats.snapshot()["history"]["error"] == attempts
@@ -0,0 +1,22 @@
+import numpy as np
+
+import stock_market_snapshot
+from stock_market_snapshot import MarketSnapshot, SnapshotStore
+from stock_universe_history import UniverseDiff, apply_universe_diff
+
+
+def test_apply_universe_diff_removes_delisted_codes_during_session(tmp_path, monkeypatch):
+    monkeypatch.setenv("STOCK_OHLCV_STORE", "off")
+    monkeypatch.setattr(stock_market_snapshot, "is_market_open", lambda now=None: True)
+    store = SnapshotStore(str(tmp_path))
+    trading_date = stock_market_snapshot.current_trading_date()
+    store.put(MarketSnapshot(trading_date, np.array(["1301", "1332", "1333"]), np.array([100.0, 200.0, 300.0])))
+
+    diff = UniverseDiff(2, 1, added={"1334": "プライム"}, removed={"1332": "プライム"}, market_changed={})
+    stats = apply_universe_diff(diff, snapshot_store=store)
+
+    snapshot = store.get(trading_date)
+    assert snapshot.codes.tolist() == ["1301", "1333"]
+    assert snapshot.closes.tolist() == [100.0, 300.0]
+    assert stats["snapshot_removed"] == 1
+    assert stats["snapshot_added"] == 0